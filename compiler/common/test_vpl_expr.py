@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+import pytest
+
+from vpl_expr import ExprError, NonLinearExpr, compile_expr
+
+def test_scalar_evaluation():
+    assert compile_expr("2*a - (b + 3)/2").evaluate({"a": 1, "b": 1}) == 0.0
+    assert compile_expr("-2.0*PI*k/N")(k=1, N=8) == pytest.approx(-math.pi / 4)
+    assert compile_expr("math.pi + M_PI")() == pytest.approx(2 * math.pi)
+    assert compile_expr("x < 3 && !(x == 1)")(x=2)
+    assert compile_expr("7 % 4 + 2 ** 3")() == 11.0
+
+def test_caller_bindings_override_constants():
+    assert compile_expr("PI * 2")(PI=1.0) == 2.0
+
+def test_array_evaluation_matches_scalar_calls():
+    e = compile_expr("cos(-2.0*PI*k/N) + k % 3")
+    k = np.arange(16)
+    values = e(k=k, N=16)
+    assert values.shape == (16,)
+    np.testing.assert_allclose(values, [e(k=int(j), N=16) for j in k])
+
+def test_variables_in_order_without_constants():
+    assert compile_expr("b + a*b - sin(PI*c)").variables == ("b", "a", "c")
+
+def test_affine():
+    assert compile_expr("2*a - (b + 3)/2").affine() == ({"a": 2.0, "b": -0.5}, -1.5)
+    assert compile_expr("x - x + 5").affine() == ({}, 5.0)
+    assert compile_expr("n*x + 1").affine({"n": 3}) == ({"x": 3.0}, 1.0)
+    for text in ("x*y", "x/y", "sin(x)", "x % 2", "x < 1"):
+        with pytest.raises(NonLinearExpr):
+            compile_expr(text).affine()
+
+def test_polynomial():
+    assert compile_expr("x*x + 3*x + 1").polynomial("x") == {2: 1.0, 1: 3.0, 0: 1.0}
+    assert compile_expr("(x + 1)**2 / 2").polynomial("x") == {2: 0.5, 1: 1.0, 0: 0.5}
+    with pytest.raises(NonLinearExpr):
+        compile_expr("x*y").polynomial("x")
+    with pytest.raises(NonLinearExpr):
+        compile_expr("1/x").polynomial("x")
+
+@pytest.mark.parametrize("text", ["x ** 1e9", "x ** 65", "x ** 2.5", "x ** -1"])
+def test_large_or_fractional_powers_are_not_polynomial(text):
+    with pytest.raises(NonLinearExpr):
+        compile_expr(text).polynomial("x")
+
+@pytest.mark.parametrize("text", ["x + 5 % 0", "x + 0 ** -1", "x + 10 ** 400",
+                                  "x / 1e-320 * 1e10", "x + sqrt(-1)", "x + log(0)"])
+def test_folding_errors_are_not_affine(text):
+    with pytest.raises(NonLinearExpr):
+        compile_expr(text).affine()
+    with pytest.raises(NonLinearExpr):
+        compile_expr(text).polynomial("x")
+
+def test_parse_errors():
+    for text in ("", "x +", "f(x", "x @ 2", "(x"):
+        with pytest.raises(ExprError):
+            compile_expr(text)
+    with pytest.raises(ExprError):
+        compile_expr("y + 1")(x=1)
+    with pytest.raises(ExprError):
+        compile_expr("nosuch(1)")()
+
+def test_compiled_once_per_text():
+    assert compile_expr("a + 1") is compile_expr("a + 1")
@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+import pytest
+
+from vpl_ir import MIN_ARRAY, is_ir_file, load_artifact, load_ir, save_artifact, save_ir
+
+def test_round_trip_keeps_values(tmp_path):
+    path = str(tmp_path / "doc.vplb")
+    doc = {"name": "x", "short": [1, 2, 3], "ints": list(range(MIN_ARRAY)),
+           "floats": [0.5] * MIN_ARRAY, "rows": [[1.0, 2.0]] * MIN_ARRAY,
+           "complex": np.array([[1 + 2j, 0], [0, -1j]]), "nested": {"flag": True, "none": None}}
+    save_ir(path, doc)
+    loaded = load_ir(path)
+
+    assert loaded["name"] == "x"
+    assert loaded["short"] == [1, 2, 3]
+    assert loaded["nested"] == {"flag": True, "none": None}
+    assert loaded["ints"].dtype == np.int64
+    np.testing.assert_array_equal(loaded["ints"], np.arange(MIN_ARRAY))
+    np.testing.assert_array_equal(loaded["floats"], [0.5] * MIN_ARRAY)
+    assert loaded["rows"].shape == (MIN_ARRAY, 2)
+    np.testing.assert_array_equal(loaded["complex"], doc["complex"])
+
+def test_arrays_are_memory_mapped_unless_disabled(tmp_path):
+    path = str(tmp_path / "doc.vplb")
+    save_ir(path, {"v": list(range(MIN_ARRAY)), "empty": np.zeros(0)})
+    assert isinstance(load_ir(path)["v"], np.memmap)
+    assert not isinstance(load_ir(path, mmap=False)["v"], np.memmap)
+    assert load_ir(path)["empty"].shape == (0,)
+
+def test_mixed_or_ragged_lists_stay_in_the_header(tmp_path):
+    path = str(tmp_path / "doc.vplb")
+    doc = {"bools": [True] * MIN_ARRAY, "mixed": [1] * (MIN_ARRAY - 1) + ["a"],
+           "ragged": [[1.0]] * (MIN_ARRAY - 1) + [[1.0, 2.0]]}
+    save_ir(path, doc)
+    assert load_ir(path) == doc
+
+def test_artifact_format_follows_the_extension(tmp_path):
+    doc = {"c": np.array([1 + 0j, 2 + 3j]), "v": list(range(MIN_ARRAY))}
+    json_path = str(tmp_path / "doc.json")
+    vplb_path = str(tmp_path / "doc.vplb")
+    save_artifact(json_path, doc)
+    save_artifact(vplb_path, doc)
+
+    assert not is_ir_file(json_path)
+    assert is_ir_file(vplb_path)
+    with open(json_path) as f:
+        assert json.load(f)["c"] == [1.0, [2.0, 3.0]]
+    assert load_artifact(json_path)["v"] == list(range(MIN_ARRAY))
+    np.testing.assert_array_equal(load_artifact(vplb_path)["v"], np.arange(MIN_ARRAY))
+
+def test_rejects_files_without_the_magic(tmp_path):
+    path = tmp_path / "doc.vplb"
+    path.write_bytes(b"{}")
+    with pytest.raises(ValueError):
+        load_ir(str(path))
@@ -0,0 +1,396 @@
+"""
+vpl_expr.py
+Shared expression module for the VPL pipelines (expander / phasor_transformer
+in while/, d_expander_ops in fft/).
+
+An expression string is tokenized and parsed once into a small AST, which is
+compiled to a tree of Python closures. compile_expr() caches the result per
+expression text in a bounded LRU, so repeated uses of the same string cost a
+dictionary lookup.
+
+    e = compile_expr("-2.0*PI*k/N")
+    e.variables                        # ('k', 'N')
+    e(k=1, N=8)                        # scalar
+    e(k=np.arange(8), N=8)             # whole array of bindings at once
+    compile_expr("2*a - (b + 3)/2").affine()   # ({'a': 2.0, 'b': -0.5}, -1.5)
+
+Grammar (lowest precedence first):
+    or      := and ('||' and)*
+    and     := cmp ('&&' cmp)*
+    cmp     := sum (('<' | '<=' | '>' | '>=' | '==' | '!=') sum)?
+    sum     := term (('+' | '-') term)*
+    term    := unary (('*' | '/' | '%') unary)*
+    unary   := ('+' | '-' | '!') unary | power
+    power   := atom ('**' unary)?
+    atom    := NUMBER | NAME | NAME '(' args ')' | '(' or ')'
+
+Names may be dotted (math.pi, cmath.exp). PI and M_PI are built-in
+constants (math.pi / math.e with a module prefix) unless bound by the
+caller; functions (sin, cos, exp, ...) are NumPy ufuncs, so they work on
+scalars and arrays alike.
+"""
+import math
+import operator
+import re
+from functools import lru_cache
+import numpy as np
+
+class ExprError(ValueError):
+    pass
+
+class NonLinearExpr(ExprError):
+    pass
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<num>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?)
+      | (?P<name>[A-Za-z_][\w]*(?:\.[A-Za-z_]\w*)*)
+      | (?P<op>\*\*|<=|>=|==|!=|&&|\|\||[-+*/%()<>!,])
+      | (?P<bad>\S)
+    )""", re.X)
+
+_MODULES = ("math.", "cmath.", "np.", "numpy.")
+
+CONSTANTS = {"PI": math.pi, "M_PI": math.pi}
+MODULE_CONSTANTS = {"pi": math.pi, "e": math.e}
+
+# largest exponent x ** n expanded into a polynomial (larger ones are not polynomial forms)
+MAX_POWER = 64
+
+FUNCTIONS = {
+    "sin": np.sin, "cos": np.cos, "tan": np.tan, "exp": np.exp, "log": np.log,
+    "sqrt": np.sqrt, "abs": np.abs, "fabs": np.abs, "floor": np.floor, "ceil": np.ceil,
+    "atan2": np.arctan2, "pow": np.power, "min": np.minimum, "max": np.maximum,
+}
+
+_BINOPS = {
+    "+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv,
+    "%": operator.mod, "**": operator.pow,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+    "==": operator.eq, "!=": operator.ne,
+    "&&": np.logical_and, "||": np.logical_or,
+}
+
+def _strip_module(name):
+    for prefix in _MODULES:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+def _constant(name):
+    """Built-in value of a name (PI, M_PI, math.pi, ...), or None."""
+    stripped = _strip_module(name)
+    if stripped != name:
+        return MODULE_CONSTANTS.get(stripped)
+    return CONSTANTS.get(name)
+
+def tokenize(text):
+    """[(kind, value)] with kind in num / name / op."""
+    tokens = []
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind is None:
+            continue
+        if kind == "bad":
+            raise ExprError(f"Unsupported character '{m.group(kind)}' in '{text}'")
+        value = m.group(kind)
+        tokens.append((kind, float(value) if kind == "num" else value))
+    return tokens
+
+# AST nodes are tuples:
+#   ("num", value)  ("var", name)  ("un", op, a)  ("bin", op, a, b)  ("call", fname, [args])
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        tok = self.peek()
+        self.pos += 1
+        return tok
+
+    def accept(self, *ops):
+        kind, value = self.peek()
+        if kind == "op" and value in ops:
+            self.pos += 1
+            return value
+        return None
+
+    def parse(self):
+        if not self.tokens:
+            raise ExprError("Empty expression")
+        node = self.or_()
+        if self.pos != len(self.tokens):
+            raise ExprError(f"Unexpected token '{self.peek()[1]}' in '{self.text}'")
+        return node
+
+    def _left_assoc(self, sub, *ops):
+        node = sub()
+        op = self.accept(*ops)
+        while op:
+            node = ("bin", op, node, sub())
+            op = self.accept(*ops)
+        return node
+
+    def or_(self):
+        return self._left_assoc(self.and_, "||")
+
+    def and_(self):
+        return self._left_assoc(self.cmp, "&&")
+
+    def cmp(self):
+        node = self.sum()
+        op = self.accept("<", "<=", ">", ">=", "==", "!=")
+        if op:
+            node = ("bin", op, node, self.sum())
+        return node
+
+    def sum(self):
+        return self._left_assoc(self.term, "+", "-")
+
+    def term(self):
+        return self._left_assoc(self.unary, "*", "/", "%")
+
+    def unary(self):
+        op = self.accept("+", "-", "!")
+        if op:
+            return ("un", op, self.unary())
+        return self.power()
+
+    def power(self):
+        node = self.atom()
+        if self.accept("**"):
+            node = ("bin", "**", node, self.unary())
+        return node
+
+    def atom(self):
+        kind, value = self.take()
+        if kind == "num":
+            return ("num", value)
+        if kind == "name":
+            if self.accept("("):
+                args = []
+                if not self.accept(")"):
+                    args.append(self.or_())
+                    while self.accept(","):
+                        args.append(self.or_())
+                    if not self.accept(")"):
+                        raise ExprError(f"Missing ')' in '{self.text}'")
+                return ("call", _strip_module(value), args)
+            return ("var", value)
+        if (kind, value) == ("op", "("):
+            node = self.or_()
+            if not self.accept(")"):
+                raise ExprError(f"Missing ')' in '{self.text}'")
+            return node
+        raise ExprError(f"Unexpected token '{value}' in '{self.text}'")
+
+def _compile(node):
+    """AST -> closure env -> value."""
+    kind = node[0]
+    if kind == "num":
+        value = node[1]
+        return lambda env: value
+    if kind == "var":
+        name = node[1]
+        const = _constant(name)
+        def var(env):
+            if name in env:
+                return env[name]
+            if const is not None:
+                return const
+            raise ExprError(f"Unbound variable '{name}'")
+        return var
+    if kind == "un":
+        a = _compile(node[2])
+        if node[1] == "-":
+            return lambda env: -a(env)
+        if node[1] == "!":
+            return lambda env: np.logical_not(a(env))
+        return a
+    if kind == "bin":
+        fn, a, b = _BINOPS[node[1]], _compile(node[2]), _compile(node[3])
+        return lambda env: fn(a(env), b(env))
+    fname, args = node[1], [_compile(a) for a in node[2]]
+    fn = FUNCTIONS.get(fname)
+    if fn is None:
+        def unknown(env):
+            raise ExprError(f"Unknown function '{fname}'")
+        return unknown
+    return lambda env: fn(*[a(env) for a in args])
+
+def _variables(node, out):
+    kind = node[0]
+    if kind == "var":
+        if node[1] not in out and _constant(node[1]) is None:
+            out[node[1]] = None
+    elif kind == "un":
+        _variables(node[2], out)
+    elif kind == "bin":
+        _variables(node[2], out)
+        _variables(node[3], out)
+    elif kind == "call":
+        for a in node[2]:
+            _variables(a, out)
+    return out
+
+def _fold(fn, *args):
+    """
+    fn(*args) on constants while building an affine / polynomial form.
+    Arithmetic errors (5 % 0, 0 ** -1, overflow) and non-finite results
+    raise NonLinearExpr instead of escaping as ZeroDivisionError & co.
+    """
+    try:
+        with np.errstate(all="raise"):
+            value = float(fn(*args))
+    except ArithmeticError as e:
+        raise NonLinearExpr(f"Cannot fold constant: {e}") from e
+    if not math.isfinite(value):
+        raise NonLinearExpr("Cannot fold constant: result is not finite")
+    return value
+
+def _affine(node, constants):
+    """Affine form ({var: coeff}, const) of node; raises NonLinearExpr otherwise."""
+    kind = node[0]
+    if kind == "num":
+        return {}, node[1]
+    if kind == "var":
+        name = node[1]
+        if name in constants:
+            return {}, constants[name]
+        if _constant(name) is not None:
+            return {}, _constant(name)
+        return {name: 1.0}, 0.0
+    if kind == "un":
+        coeffs, const = _affine(node[2], constants)
+        if node[1] == "-":
+            return {v: -c for v, c in coeffs.items()}, -const
+        if node[1] == "!":
+            raise NonLinearExpr("Logical operator in affine expression")
+        return coeffs, const
+    if kind == "call":
+        args = [_affine(a, constants) for a in node[2]]
+        if any(c for c, _ in args) or node[1] not in FUNCTIONS:
+            raise NonLinearExpr(f"Function call '{node[1]}(...)' of variables")
+        return {}, _fold(FUNCTIONS[node[1]], *[k for _, k in args])
+
+    op = node[1]
+    lc, lk = _affine(node[2], constants)
+    rc, rk = _affine(node[3], constants)
+    if op in ("+", "-"):
+        sign = 1.0 if op == "+" else -1.0
+        coeffs = dict(lc)
+        for v, c in rc.items():
+            coeffs[v] = coeffs.get(v, 0.0) + sign * c
+        return coeffs, lk + sign * rk
+    if op == "*":
+        if not rc:
+            scale, coeffs, const = rk, lc, lk
+        elif not lc:
+            scale, coeffs, const = lk, rc, rk
+        else:
+            raise NonLinearExpr("Product of variables")
+        return {v: c * scale for v, c in coeffs.items()}, const * scale
+    if op == "/":
+        if rc:
+            raise NonLinearExpr("Division by a variable")
+        if rk == 0:
+            raise NonLinearExpr("Division by zero")
+        return ({v: _fold(operator.truediv, c, rk) for v, c in lc.items()},
+                _fold(operator.truediv, lk, rk))
+    if not lc and not rc and op in ("%", "**"):
+        return {}, _fold(_BINOPS[op], lk, rk)
+    raise NonLinearExpr(f"Operator '{op}' in affine expression")
+
+def _polynomial(node, var):
+    """{degree: coeff} of node as a polynomial in var; NonLinearExpr otherwise."""
+    kind = node[0]
+    if kind == "num":
+        return {0: node[1]}
+    if kind == "var":
+        if node[1] == var:
+            return {1: 1.0}
+        const = _constant(node[1])
+        if const is None:
+            raise NonLinearExpr(f"Free variable '{node[1]}'")
+        return {0: const}
+    if kind == "un":
+        p = _polynomial(node[2], var)
+        if node[1] == "-":
+            return {d: -c for d, c in p.items()}
+        if node[1] == "!":
+            raise NonLinearExpr("Logical operator in polynomial")
+        return p
+    if kind == "call":
+        args = [_polynomial(a, var) for a in node[2]]
+        if any(set(p) - {0} for p in args) or node[1] not in FUNCTIONS:
+            raise NonLinearExpr(f"Function call '{node[1]}(...)' of '{var}'")
+        return {0: _fold(FUNCTIONS[node[1]], *[p.get(0, 0.0) for p in args])}
+
+    op = node[1]
+    a, b = _polynomial(node[2], var), _polynomial(node[3], var)
+    if op in ("+", "-"):
+        sign = 1.0 if op == "+" else -1.0
+        out = dict(a)
+        for d, c in b.items():
+            out[d] = out.get(d, 0.0) + sign * c
+        return out
+    if op == "*":
+        return _poly_mul(a, b)
+    if op == "/" and set(b) <= {0} and b.get(0, 0.0) != 0:
+        return {d: _fold(operator.truediv, c, b[0]) for d, c in a.items()}
+    if op in ("%", "**") and set(a) <= {0} and set(b) <= {0}:
+        return {0: _fold(_BINOPS[op], a.get(0, 0.0), b.get(0, 0.0))}
+    if op == "**" and set(b) <= {0}:
+        n = b.get(0, 0.0)
+        if n == int(n) and 0 <= n <= MAX_POWER:
+            out = {0: 1.0}
+            for _ in range(int(n)):
+                out = _poly_mul(out, a)
+            return out
+    raise NonLinearExpr(f"Operator '{op}' in polynomial")
+
+def _poly_mul(a, b):
+    out = {}
+    for da, ca in a.items():
+        for db, cb in b.items():
+            out[da + db] = out.get(da + db, 0.0) + ca * cb
+    return out
+
+class Expr:
+    """A parsed and compiled expression (see compile_expr)."""
+    __slots__ = ("text", "ast", "variables", "_fn")
+
+    def __init__(self, text):
+        self.text = text
+        self.ast = _Parser(text).parse()
+        # free names in order of first appearance (built-in constants excluded)
+        self.variables = tuple(_variables(self.ast, {}))
+        self._fn = _compile(self.ast)
+
+    def evaluate(self, env=None, **bindings):
+        """Value for the bindings in env / keywords (scalars or NumPy arrays)."""
+        if bindings:
+            env = dict(env or {}, **bindings)
+        return self._fn(env or {})
+
+    __call__ = evaluate
+
+    def affine(self, constants=None):
+        """({var: coeff}, const) with zero coefficients dropped; NonLinearExpr if not affine."""
+        coeffs, const = _affine(self.ast, constants or {})
+        return {v: float(c) for v, c in coeffs.items() if c != 0.0}, float(const)
+
+    def polynomial(self, var):
+        """{degree: coeff} as a polynomial in var alone; NonLinearExpr otherwise."""
+        return _polynomial(self.ast, var)
+
+@lru_cache(maxsize=4096)
+def compile_expr(text):
+    """Parsed and compiled Expr for text, cached per text (bounded LRU)."""
+    return Expr(str(text))
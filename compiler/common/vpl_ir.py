@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+vpl_ir.py
+Binary container for the inter-stage artifacts of the VPL pipelines
+(extracted / translated / expanded / phasor_transformed / expanded_with_matrix).
+
+Layout of a .vplb file (all integers little-endian):
+
+    8 bytes   magic b"VPLIR\\x00\\x01\\x00"
+    8 bytes   uint64 length of the JSON header
+    header    UTF-8 JSON: {"doc": <document>, "arrays": [{"dtype", "shape", "offset"}, ...]}
+    padding   to a 64-byte boundary
+    arrays    raw C-ordered array data, each starting on a 64-byte boundary
+              (offsets are relative to the start of the array section)
+
+Inside "doc" every array is replaced by {"__array__": k}. NumPy arrays are
+stored as they are (complex matrices natively, no [re, im] pairs); lists
+of numbers and rectangular lists of such lists with at least MIN_ARRAY
+elements become float64/int64 arrays (shorter ones stay in the header).
+On load arrays are memory-mapped read-only, so large matrices are not read
+until they are used.
+
+save_artifact / load_artifact pick the format from the file: .vplb files
+use this container, everything else is JSON (NumPy values are converted).
+
+Usage:
+    python vpl_ir.py expanded.json expanded.vplb     # JSON -> binary
+    python vpl_ir.py expanded.vplb expanded.json     # binary -> JSON
+"""
+import json
+import numbers
+import struct
+import sys
+import numpy as np
+
+MAGIC = b"VPLIR\x00\x01\x00"
+ALIGN = 64
+EXT = ".vplb"
+MIN_ARRAY = 16
+
+def _pad(n):
+    return (-n) % ALIGN
+
+def _numeric_array(value):
+    """value as an int64/float64 array if it is a (nested, rectangular) list of numbers, else None."""
+    if len(value) == 0:
+        return None
+    flat = value
+    if isinstance(value[0], list):
+        width = len(value[0])
+        if width == 0 or any(not isinstance(r, list) or len(r) != width for r in value):
+            return None
+        flat = [v for r in value for v in r]
+    if len(flat) < MIN_ARRAY:
+        return None
+    if not all(isinstance(v, numbers.Real) and not isinstance(v, bool) for v in flat):
+        return None
+    dtype = np.int64 if all(isinstance(v, numbers.Integral) for v in flat) else np.float64
+    return np.asarray(value, dtype=dtype)
+
+def _pack(value, arrays):
+    if isinstance(value, np.ndarray):
+        arrays.append(np.ascontiguousarray(value))
+        return {"__array__": len(arrays) - 1}
+    if isinstance(value, dict):
+        return {k: _pack(v, arrays) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        arr = _numeric_array(list(value))
+        if arr is not None:
+            arrays.append(arr)
+            return {"__array__": len(arrays) - 1}
+        return [_pack(v, arrays) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _unpack(value, arrays):
+    if isinstance(value, dict):
+        if len(value) == 1 and "__array__" in value:
+            return arrays[value["__array__"]]
+        return {k: _unpack(v, arrays) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_unpack(v, arrays) for v in value]
+    return value
+
+def save_ir(path, doc):
+    """Write doc to path in the binary container format."""
+    arrays = []
+    packed = _pack(doc, arrays)
+    specs = []
+    offset = 0
+    for arr in arrays:
+        specs.append({"dtype": arr.dtype.newbyteorder("<").str, "shape": list(arr.shape), "offset": offset})
+        offset += arr.nbytes + _pad(arr.nbytes)
+    header = json.dumps({"doc": packed, "arrays": specs}, separators=(",", ":")).encode()
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.write(b"\0" * _pad(len(MAGIC) + 8 + len(header)))
+        for arr in arrays:
+            f.write(arr.astype(arr.dtype.newbyteorder("<"), copy=False).tobytes())
+            f.write(b"\0" * _pad(arr.nbytes))
+
+def load_ir(path, mmap=True):
+    """Read a binary container; arrays are read-only memory maps unless mmap=False."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a VPL binary IR file")
+        (n,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(n).decode())
+    base = len(MAGIC) + 8 + n
+    base += _pad(base)
+
+    arrays = []
+    for spec in header["arrays"]:
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        if mmap and int(np.prod(shape)) > 0:
+            arr = np.memmap(path, dtype=dtype, mode="r", offset=base + spec["offset"], shape=shape)
+        else:
+            count = int(np.prod(shape))
+            arr = np.fromfile(path, dtype=dtype, count=count, offset=base + spec["offset"]).reshape(shape)
+        arrays.append(arr)
+    return _unpack(header["doc"], arrays)
+
+def is_ir_file(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def _complex_json(value):
+    """Complex numbers as in the JSON artifacts: real if the imaginary part is ~0, else [re, im]."""
+    if isinstance(value, list):
+        return [_complex_json(v) for v in value]
+    if isinstance(value, complex):
+        return value.real if abs(value.imag) < 1e-12 else [value.real, value.imag]
+    return value
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return _complex_json(value.tolist())
+    if isinstance(value, (np.generic, complex)):
+        return _complex_json(value.item() if isinstance(value, np.generic) else value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def save_artifact(path, doc):
+    """Save doc as binary IR for .vplb paths, as indented JSON otherwise."""
+    if str(path).endswith(EXT):
+        save_ir(path, doc)
+    else:
+        with open(path, "w") as f:
+            json.dump(doc, f, indent=2, default=_json_default)
+
+def load_artifact(path):
+    """Load a binary IR or JSON artifact (detected from the file's magic bytes)."""
+    if is_ir_file(path):
+        return load_ir(path)
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python vpl_ir.py <input.json|input.vplb> <output.json|output.vplb>")
+        sys.exit(1)
+    save_artifact(sys.argv[2], load_artifact(sys.argv[1]))
+    print(f"✅ Converted {sys.argv[1]} -> {sys.argv[2]}")
@@ -7,8 +7,8 @@ class VPLExtractor(c_ast.NodeVisitor):
 
     def visit_FuncDef(self, node):
         func_name = node.decl.name
-        #params = [p.name for p in node.decl.type.args.params]
-        params = []
+        args = node.decl.type.args
+        params = [p.name for p in args.params if p.name] if args is not None else []
         body = []
         self._visit_block(node.body.block_items, body)
         self.ir["functions"].append({
@@ -25,7 +25,10 @@ class VPLExtractor(c_ast.NodeVisitor):
 
     def _visit_stmt(self, stmt, body):
         if isinstance(stmt, c_ast.Decl):
-            body.append({"decl": stmt.name})
+            decl = {"decl": stmt.name}
+            if stmt.init is not None:
+                decl["init"] = self._expr(stmt.init)
+            body.append(decl)
         elif isinstance(stmt, c_ast.Assignment):
             body.append({
                 "assign": {
@@ -51,6 +54,8 @@ class VPLExtractor(c_ast.NodeVisitor):
             }
             self._visit_block(stmt.stmt.block_items, loop["for"]["body"])
             body.append(loop)
+        elif isinstance(stmt, c_ast.Return):
+            body.append({"return": self._expr(stmt.expr)})
         elif isinstance(stmt, c_ast.Compound):
             self._visit_block(stmt.block_items, body)
         else:
@@ -82,6 +87,18 @@ class VPLExtractor(c_ast.NodeVisitor):
             return {"unop": {"op": expr.op, "expr": self._expr(expr.expr)}}
         elif isinstance(expr, c_ast.ID):
             return {"id": expr.name}
+        elif isinstance(expr, c_ast.ArrayRef):
+            return {
+                "arrayref": {
+                    "name": self._expr(expr.name),
+                    "subscript": self._expr(expr.subscript)
+                }
+            }
+        elif isinstance(expr, c_ast.Cast):
+            # (double)N -> N: the expressions are evaluated numerically anyway
+            return self._expr(expr.expr)
+        elif isinstance(expr, c_ast.InitList):
+            return {"initlist": [self._expr(e) for e in expr.exprs]}
         elif isinstance(expr, c_ast.StructRef):
             return {
                 "structref": {
@@ -1,15 +1,20 @@
 import json
+import sys
+from vpl_common import load_artifact
 
 class VPLTranslator:
     def __init__(self, ir):
         self.ir = ir
-        self.vpl = {"blocks": [], "connections": []}
+        self.vpl = {"blocks": [], "connections": [], "functions": []}
         self.block_counter = 0
+        self.func = None  # name of the function being translated
 
     def new_block(self, block_type, params=None):
         bid = f"b{self.block_counter}"
         self.block_counter += 1
         block = {"id": bid, "type": block_type, "params": params or {}}
+        if self.func is not None:
+            block["func"] = self.func
         self.vpl["blocks"].append(block)
         return bid
 
@@ -23,6 +28,8 @@ class VPLTranslator:
         return self.vpl
 
     def translate_func(self, func):
+        self.func = func["name"]
+        self.vpl["functions"].append({"name": func["name"], "params": func.get("params", [])})
         last_block = None
         for stmt in func["body"]:
             blk = self.translate_stmt(stmt)
@@ -39,7 +46,10 @@ class VPLTranslator:
         elif stmt.get("type") == "funccall":
             return self.translate_funccall(stmt)
         elif "decl" in stmt:
-            return self.new_block("var_decl", {"name": stmt["decl"]})
+            params = {"name": stmt["decl"]}
+            if "init" in stmt:
+                params["init"] = stmt["init"]
+            return self.new_block("var_decl", params)
         else:
             return self.new_block("raw_stmt", stmt)
 
@@ -78,8 +88,7 @@ class VPLTranslator:
 # Run extractor
 # ---------------------------
 if __name__ == "__main__":
- with open("ir.json", "r") as f:
-        ir = json.load(f)
+ ir = load_artifact(sys.argv[1] if len(sys.argv) > 1 else "ir.json")
  translator = VPLTranslator(ir)
  vpl_ir = translator.translate()
  print(json.dumps(vpl_ir, indent=2))
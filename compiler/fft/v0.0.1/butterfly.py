@@ -0,0 +1,125 @@
+"""
+butterfly.py
+Factored Cooley-Tukey operator.
+
+FFT_CooleyTukey in fft_cooley_tukey.c splits x into even/odd halves,
+recurses and recombines with
+
+    x[k]        = even[k] + twiddle(k, N) * odd[k]
+    x[k + half] = even[k] - twiddle(k, N) * odd[k]
+
+Instead of one dense product M_global, ButterflyOperator keeps the linear
+part of the program as the product of its stages, one sparse matrix per
+top-level loop that writes memory, in program order:
+
+    M_global = S_L ... S_2 S_1
+
+Each stage is built from the loop's own ops by d_expander_ops.factored_operator
+(the even / odd split is a 0/1 permutation stage, the recombination loop a
+butterfly stage with 2 non-zeros per written row), so the twiddles and their
+sign are the ones the program computes. apply(x) runs the stages as sparse
+products; the dense product is only built when asked for.
+
+detect_butterfly() recognizes the recombination loop (a pair of
+c_add(a, t) / c_sub(a, t) assignments in one loop body) in a c_expander
+loop nest.
+"""
+import re
+import numpy as np
+
+class ButterflyOperator:
+    def __init__(self, addr_list, stages, kinds, twiddles=()):
+        """
+        addr_list: the addresses the stages act on (M_global's addr_list)
+        stages: scipy CSR matrices S_1 ... S_L, applied first to last
+        kinds: "permutation", "butterfly" or "linear" per stage
+        twiddles: per butterfly stage, the factor of odd[k] in x[k], k < bound
+        """
+        self.addr_list = list(addr_list)
+        self.stages = list(stages)
+        self.kinds = list(kinds)
+        self.twiddles = [np.asarray(w, dtype=complex) for w in twiddles]
+
+    @property
+    def N(self):
+        return len(self.addr_list)
+
+    @property
+    def n_stages(self):
+        return len(self.stages)
+
+    @property
+    def nnz(self):
+        """Non-zeros of the factored form."""
+        return sum(s.nnz for s in self.stages)
+
+    @property
+    def sign(self):
+        """-1 for a forward transform (w = exp(-2*PI*i*k/N)), +1 for an inverse, None if unknown."""
+        for w in self.twiddles:
+            if len(w) > 1 and w[1].imag != 0:
+                return -1 if w[1].imag < 0 else 1
+        return None
+
+    def apply(self, x):
+        """M_global @ x for a vector (N,) or a batch of columns (N, m), stage by stage."""
+        y = np.asarray(x).astype(complex)
+        for s in self.stages:
+            y = s @ y
+        return y
+
+    __matmul__ = apply
+
+    def matrices(self):
+        """[S_1, ..., S_L] as scipy CSR matrices (M_global is their product, right to left)."""
+        return list(self.stages)
+
+    def to_dense(self):
+        """The dense N x N operator (only built on request)."""
+        return self.apply(np.eye(self.N))
+
+    def to_dict(self):
+        """Serializable form: the addresses, the CSR stage matrices and the twiddles."""
+        stages = []
+        for m in self.stages:
+            stages.append({"format": "csr", "shape": list(m.shape), "data": m.data,
+                           "indices": m.indices, "indptr": m.indptr})
+        return {"format": "butterfly", "addr_list": self.addr_list, "kinds": self.kinds,
+                "sign": self.sign, "twiddles": self.twiddles, "stages": stages}
+
+
+_COMBINE_RE = re.compile(r'^\s*(c_add|c_sub)\s*\((.*),\s*([A-Za-z_]\w*)\s*\)\s*$')
+
+def butterfly_pair(body):
+    """
+    (lhs, a) of the c_add(a, t) assignment of a loop body that also assigns
+    c_sub(a, t), or None.
+    """
+    seen = {}
+    for node in body:
+        if node.get("type") != "assign":
+            continue
+        m = _COMBINE_RE.match(node.get("rhs", ""))
+        if m:
+            seen.setdefault((m.group(2).strip(), m.group(3)), {})[m.group(1)] = node["lhs"]
+    for (a, _), ops in seen.items():
+        if set(ops) == {"c_add", "c_sub"}:
+            return ops["c_add"], a
+    return None
+
+def detect_butterfly(nest):
+    """
+    Butterfly recombination loops in a c_expander loop nest:
+    [{"var", "bound", "N", "lhs", "even"}] where N = 2 * bound is the
+    transform size and x[k] = c_add(even[k], t) is assigned to lhs.
+    """
+    found = []
+    for node in nest:
+        if node.get("type") != "loop":
+            continue
+        pair = butterfly_pair(node["body"])
+        if pair:
+            found.append({"var": node["var"], "bound": node["bound"], "N": 2 * node["bound"],
+                          "lhs": pair[0], "even": pair[1]})
+        found.extend(detect_butterfly(node["body"]))
+    return found
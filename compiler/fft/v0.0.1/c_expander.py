@@ -1,31 +1,34 @@
 import json
 import sys
 import re
+from functools import lru_cache
+from vpl_common import load_artifact, save_artifact
+from expr_template import fold_subscripts, template
 
 # -------- helpers --------
 
+ADDR_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\[[0-9]+\])+")
+
 def substitute_index_vars(expr: str, index_map: dict, params: dict) -> str:
     """
-    Replace loop indices and known parameters in expr with their numeric values.
+    Replace loop indices and known parameters (constants like N, N1, N2,
+    half, etc.) in expr with their numeric values; loop indices win.
+    Subscripts that become constant are folded (x[(2 * 1)] -> x[2]).
     """
     if not expr:
         return expr
+    return fold_subscripts(template(expr).substitute(index_map, params))
 
-    # Replace loop indices
-    for var, val in index_map.items():
-        expr = re.sub(rf"\b{re.escape(var)}\b", str(val), expr)
-
-    # Replace params (constants like N, N1, N2, half, etc.)
-    for var, val in params.items():
-        expr = re.sub(rf"\b{re.escape(var)}\b", str(val), expr)
-
-    return expr
+@lru_cache(maxsize=65536)
+def address_tokens(s: str):
+    """Memoized ADDR_TOKEN_RE.findall(s), as a tuple."""
+    return tuple(ADDR_TOKEN_RE.findall(s))
 
 
 def expr_to_string(node) -> str:
     """
     Convert an IR expression node into a simple string.
-    Handles ArrayRef, Id, Const, Call, BinOp, UnOp, StructRef etc.
+    Handles ArrayRef, Id, Const, Call, BinOp, UnOp, StructRef, InitList etc.
     """
     if node is None:
         return ""
@@ -54,7 +57,17 @@ def expr_to_string(node) -> str:
         if "unop" in node:
             inner = expr_to_string(node["unop"]["expr"])
             op = node["unop"]["op"]
-            return f"{inner}{op}"
+            if op in ("p++", "p--"):
+                return f"{inner}{op[1:]}"
+            if op == "sizeof":
+                return f"sizeof({inner})"
+            return f"({op}{inner})"
+        if "arrayref" in node:
+            name = expr_to_string(node["arrayref"]["name"])
+            subscript = expr_to_string(node["arrayref"]["subscript"])
+            return f"{name}[{subscript}]"
+        if "initlist" in node:
+            return "{" + ", ".join(expr_to_string(e) for e in node["initlist"]) + "}"
         if "structref" in node:
             name = expr_to_string(node["structref"]["name"])
             field = node["structref"]["field"]
@@ -69,6 +82,7 @@ class Expander:
     def __init__(self, ir_json, params=None, assume_lengths=None):
         self.blocks = ir_json.get("blocks", [])
         self.connections = ir_json.get("connections", [])
+        self.function_params = {f["name"]: f.get("params", []) for f in ir_json.get("functions", [])}
         self.params = params or {}
         self.assume_lengths = assume_lengths or {}
         self.atomic_ops = []
@@ -82,60 +96,19 @@ class Expander:
     def register_addresses_in_string(self, s: str):
         if not s:
             return
-        matches = re.findall(r"[A-Za-z_][A-Za-z0-9_]*(\[[0-9]+\])+", s)
-        for addr in matches:
+        for addr in address_tokens(s):
             if addr not in self.addr_map:
                 idx = len(self.addr_list)
                 self.addr_list.append(addr)
                 self.addr_map[addr] = idx
 
-    # --- recursive block expander ---
-    def expand_block(self, body, outer_index_map):
-        for stmt in body:
-            if "assign" in stmt:
-                lhs = self.normalize_expr_string(stmt["assign"].get("lvalue"))
-                rhs = self.normalize_expr_string(stmt["assign"].get("rvalue"))
-                lhs_c = substitute_index_vars(lhs, outer_index_map, self.params)
-                rhs_c = substitute_index_vars(rhs, outer_index_map, self.params)
-                self.atomic_ops.append({
-                    "type": "assign",
-                    "lhs": lhs_c,
-                    "rhs": rhs_c,
-                    "loop_context": dict(outer_index_map)
-                })
-                self.register_addresses_in_string(lhs_c)
-                self.register_addresses_in_string(rhs_c)
-
-            elif "call" in stmt:
-                call = stmt["call"]
-                func = expr_to_string(call["func"])
-                args_c = []
-                for a in call.get("args", []):
-                    arg_s = self.normalize_expr_string(a)
-                    arg_c = substitute_index_vars(arg_s, outer_index_map, self.params)
-                    args_c.append(arg_c)
-                    self.register_addresses_in_string(arg_c)
-                self.atomic_ops.append({
-                    "type": "call",
-                    "func": func,
-                    "args": args_c,
-                    "loop_context": dict(outer_index_map)
-                })
-
-            elif "for" in stmt:
-                self.expand_for(stmt["for"], outer_index_map)
-
-            else:
-                self.atomic_ops.append({
-                    "type": "raw",
-                    "stmt": stmt,
-                    "loop_context": dict(outer_index_map)
-                })
-
-    # --- expand a for loop (with recursion) ---
-    def expand_for(self, for_node, outer_index_map=None):
-        outer_index_map = outer_index_map or {}
+    def symbolic(self, node, loop_vars) -> str:
+        """Expression string with params substituted and loop variables kept as names."""
+        s = self.normalize_expr_string(node)
+        return substitute_index_vars(s, {v: v for v in loop_vars}, self.params)
 
+    def loop_header(self, for_node):
+        """(loop_var, upper) of 'for (var = 0; var < bound; ...)'."""
         cond = for_node.get("cond")
         loop_var = None
         upper = None
@@ -159,64 +132,224 @@ class Expander:
 
         if loop_var is None or upper is None:
             raise ValueError(f"Bad for-loop header: {for_node}")
+        return loop_var, upper
+
+    # --- symbolic loop nest ---
+    def nest_block(self, body, loop_vars):
+        """
+        Loop-nest nodes of a statement list, without unrolling:
+          {"type": "loop", "var", "bound", "body": [nodes]}
+          {"type": "assign", "lhs", "rhs"}  /  {"type": "call", "func", "args"}
+          {"type": "decl", "name", "init"}  /  {"type": "raw", "stmt"}
+        Expressions keep the enclosing loop variables symbolic.
+        """
+        nodes = []
+        for stmt in body:
+            if "assign" in stmt:
+                nodes.append({
+                    "type": "assign",
+                    "lhs": self.symbolic(stmt["assign"].get("lvalue"), loop_vars),
+                    "rhs": self.symbolic(stmt["assign"].get("rvalue"), loop_vars)
+                })
 
-        body = for_node.get("body", [])
-        for iv in range(upper):
-            index_map = dict(outer_index_map)
-            index_map[loop_var] = iv
-            self.expand_block(body, index_map)
+            elif "call" in stmt:
+                call = stmt["call"]
+                nodes.append({
+                    "type": "call",
+                    "func": expr_to_string(call["func"]),
+                    "args": [self.symbolic(a, loop_vars) for a in call.get("args", [])]
+                })
 
-    def run(self):
+            elif "for" in stmt:
+                nodes.append(self.nest_for(stmt["for"], loop_vars))
+
+            elif "decl" in stmt and stmt.get("init") is not None:
+                nodes.append({
+                    "type": "decl",
+                    "name": stmt["decl"],
+                    "init": self.symbolic(stmt["init"], loop_vars)
+                })
+
+            else:
+                nodes.append({"type": "raw", "stmt": stmt})
+        return nodes
+
+    def nest_for(self, for_node, loop_vars=()):
+        loop_var, upper = self.loop_header(for_node)
+        return {
+            "type": "loop",
+            "var": loop_var,
+            "bound": upper,
+            "body": self.nest_block(for_node.get("body", []), list(loop_vars) + [loop_var])
+        }
+
+    def loop_nest(self):
+        """
+        Compressed program: top-level blocks as loop-nest nodes, plus
+        {"type": "op", "op": {...}} for ops that are already concrete.
+        """
+        nest = []
         for blk in self.blocks:
             if blk["type"] == "raw_stmt" and "for" in blk["params"]:
-                self.expand_for(blk["params"]["for"])
+                nest.append(self.nest_for(blk["params"]["for"]))
             elif blk["type"] == "raw_stmt" and "call" in blk["params"]:
                 call = blk["params"]["call"]
                 func = expr_to_string(call["func"])
-                args_c = []
-                for a in call.get("args", []):
-                    arg_s = self.normalize_expr_string(a)
-                    arg_c = substitute_index_vars(arg_s, {}, self.params)
-                    args_c.append(arg_c)
-                    self.register_addresses_in_string(arg_c)
-                self.atomic_ops.append({"type": "call", "func": func, "args": args_c})
+                args_c = [substitute_index_vars(self.normalize_expr_string(a), {}, self.params)
+                          for a in call.get("args", [])]
+                nest.append({"type": "op", "op": {"type": "call", "func": func, "args": args_c}})
             elif blk["type"] == "var_decl":
-                name = blk["params"].get("name")
-                self.atomic_ops.append({"type": "var_decl", "name": name})
+                op = {"type": "var_decl", "name": blk["params"].get("name")}
+                if blk["params"].get("init") is not None:
+                    init_s = self.normalize_expr_string(blk["params"]["init"])
+                    op["init"] = substitute_index_vars(init_s, {}, self.params)
+                nest.append({"type": "op", "op": op})
             elif blk["type"] == "expr":
                 expr_s = self.normalize_expr_string(blk["params"].get("expr"))
                 expr_c = substitute_index_vars(expr_s, {}, self.params)
-                self.atomic_ops.append({"type": "expr", "expr": expr_c})
-                self.register_addresses_in_string(expr_c)
+                nest.append({"type": "op", "op": {"type": "expr", "expr": expr_c}})
             else:
-                self.atomic_ops.append({"type": blk["type"], "params": blk.get("params", {})})
-
+                nest.append({"type": "op", "op": {"type": blk["type"], "params": blk.get("params", {})}})
+        return nest
+
+    def functions(self):
+        """
+        Expression functions of the program, {name: {"params", "expr"}}: the
+        functions whose body is only initialized locals and a return, like
+        twiddle(k, N). expr is the returned expression with the locals
+        inlined, in the function's own parameters (params are not substituted).
+        """
+        bodies = {}
+        for blk in self.blocks:
+            if blk.get("func") in self.function_params:
+                bodies.setdefault(blk["func"], []).append(blk)
+        table = {}
+        for name, blocks in bodies.items():
+            local_exprs, expr = {}, None
+            for blk in blocks:
+                p = blk["params"]
+                if expr is not None:
+                    break
+                if blk["type"] == "var_decl" and p.get("init") is not None:
+                    init = template(self.normalize_expr_string(p["init"])).substitute(local_exprs)
+                    local_exprs[p["name"]] = init if init.startswith("{") else f"({init})"
+                elif blk["type"] == "raw_stmt" and p.get("return") is not None:
+                    expr = template(self.normalize_expr_string(p["return"])).substitute(local_exprs)
+                else:
+                    break
+            else:
+                if expr is not None:
+                    table[name] = {"params": self.function_params[name], "expr": expr}
+        return table
+
+    def iter_atomic_ops(self, nest=None):
+        """
+        Yield the unrolled atomic ops one at a time (see iter_ops), registering
+        their addresses in addr_list as they go. Consumers such as
+        d_expander_ops.stream_matrices never need the whole op list. nest
+        reuses an already built loop_nest().
+        """
+        for op in iter_ops(nest if nest is not None else self.loop_nest()):
+            if op["type"] == "assign":
+                self.register_addresses_in_string(op["lhs"])
+                self.register_addresses_in_string(op["rhs"])
+            elif op["type"] == "call":
+                for a in op["args"]:
+                    self.register_addresses_in_string(a)
+            elif op["type"] == "expr":
+                self.register_addresses_in_string(op["expr"])
+            elif op["type"] == "decl":
+                self.register_addresses_in_string(op["init"])
+            yield op
+
+    def run(self, compressed=False):
+        """
+        Fully unrolled atomic ops and their addresses, or with compressed=True
+        the loop nest and the number of ops it stands for; both with the
+        expression functions (see functions()).
+        """
+        if compressed:
+            nest = self.loop_nest()
+            return {"loop_nest": nest, "n_ops": count_ops(nest), "functions": self.functions()}
+
+        self.atomic_ops.extend(self.iter_atomic_ops())
         return {
             "atomic_ops": self.atomic_ops,
             "addr_list": self.addr_list,
+            "functions": self.functions(),
         }
 
 
+def iter_ops(nest, index_map=None):
+    """Lazily materialize the concrete atomic ops of a loop nest, in program order."""
+    index_map = index_map or {}
+    for node in nest:
+        ntype = node["type"]
+        if ntype == "loop":
+            for iv in range(node["bound"]):
+                inner = dict(index_map)
+                inner[node["var"]] = iv
+                yield from iter_ops(node["body"], inner)
+        elif ntype == "op":
+            yield node["op"]
+        elif ntype == "assign":
+            yield {
+                "type": "assign",
+                "lhs": substitute_index_vars(node["lhs"], index_map, {}),
+                "rhs": substitute_index_vars(node["rhs"], index_map, {}),
+                "rhs_template": node["rhs"],
+                "loop_context": dict(index_map)
+            }
+        elif ntype == "call":
+            yield {
+                "type": "call",
+                "func": node["func"],
+                "args": [substitute_index_vars(a, index_map, {}) for a in node["args"]],
+                "loop_context": dict(index_map)
+            }
+        elif ntype == "decl":
+            yield {
+                "type": "decl",
+                "name": node["name"],
+                "init": substitute_index_vars(node["init"], index_map, {}),
+                "init_template": node["init"],
+                "loop_context": dict(index_map)
+            }
+        else:
+            yield {"type": "raw", "stmt": node["stmt"], "loop_context": dict(index_map)}
+
+def count_ops(nest):
+    """Number of atomic ops a loop nest materializes to, without materializing it."""
+    n = 0
+    for node in nest:
+        if node["type"] == "loop":
+            n += node["bound"] * count_ops(node["body"])
+        else:
+            n += 1
+    return n
+
+
 # -------- CLI --------
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python expander.py input.json [output.json]")
+    # --compressed: write the loop nest instead of the unrolled ops
+    compressed = "--compressed" in sys.argv
+    args = [a for a in sys.argv[1:] if a != "--compressed"]
+    if len(args) < 1:
+        print("Usage: python expander.py input.json [output.json] [--compressed]")
         sys.exit(1)
 
-    with open(sys.argv[1]) as f:
-        ir_json = json.load(f)
+    ir_json = load_artifact(args[0])
 
     # Example parameters — adjust for your FFT test cases
     params = {"N": 4, "half": 2, "N1": 2, "N2": 2}
     assume_lengths = {"N": 4, "half": 2, "N1": 2, "N2": 2}
 
     expander = Expander(ir_json, params=params, assume_lengths=assume_lengths)
-    result = expander.run()
+    result = expander.run(compressed=compressed)
 
-    if len(sys.argv) > 2:
-        with open(sys.argv[2], "w") as f:
-            json.dump(result, f, indent=2)
+    if len(args) > 1:
+        save_artifact(args[1], result)
     else:
         print(json.dumps(result, indent=2))
 
@@ -0,0 +1,30 @@
+"""Shared fixtures for the FFT-pipeline tests (run with python -m pytest)."""
+import os
+
+import pytest
+from pycparser import c_parser
+
+from a_extractor import VPLExtractor
+from b_translator import VPLTranslator
+
+FFT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fft_cooley_tukey.c")
+
+def translate_source(code):
+    """C source -> b_translator output (blocks and connections)."""
+    extractor = VPLExtractor()
+    extractor.visit(c_parser.CParser().parse(code))
+    return VPLTranslator(extractor.ir).translate()
+
+@pytest.fixture
+def fft_code():
+    with open(FFT_SOURCE) as f:
+        return f.read()
+
+@pytest.fixture
+def fft_blocks(fft_code):
+    return translate_source(fft_code)
+
+@pytest.fixture
+def translate():
+    """translate_source, for tests that translate their own C code."""
+    return translate_source
@@ -2,47 +2,58 @@
 """
 postprocess_atomic_ops.py
 
-Reads expanded.json produced by expander_full.py (which contains atomic_ops),
+Reads b_translator output (blocks), expands it with c_expander.Expander and
+streams the ops through stream_matrices one at a time; a c_expander output
+(atomic_ops, or the loop_nest of --compressed) is read as is. It
 substitutes loop_context and params into expressions, discovers concrete addresses,
-and builds M_global and c_global matrices for simulation.
+and builds M_global and c_global matrices for simulation. Right-hand sides
+are evaluated as linear expressions (see linear_value): the complex_t
+helpers c_add / c_sub / c_mul, loop-body locals and calls of the program's
+expression functions such as twiddle(k, N).
 
 Usage:
-    python postprocess_atomic_ops.py expanded.json
+    python postprocess_atomic_ops.py b_translator.json|expanded.json [output] [--sparse] [--dense]
 
 Outputs:
     - expanded_with_matrix.json  (addr_list, M_global, c_global, atomic_ops_checked)
+      or any other output path; a .vplb output keeps the complex matrices
+      as native binary arrays (see compiler/common/vpl_ir.py); with --sparse
+      M_global is accumulated and written as a CSR matrix (always when the
+      ops are streamed, i.e. for translator and loop_nest input). When the
+      loop nest has a Cooley-Tukey recombination loop, M_global is also
+      emitted factored as an "operator": one sparse stage per top-level
+      loop, built from its ops (see factored_operator and butterfly.py);
+      --dense adds its dense N x N product
 """
 
-import json
 import re
 import sys
 import math
 import cmath
 import numpy as np
+from functools import lru_cache
+from vpl_common import load_artifact, save_artifact, compile_expr, ExprError, NonLinearExpr
+from expr_template import fold_subscripts, template
+from butterfly import ButterflyOperator, butterfly_pair, detect_butterfly
+from c_expander import Expander, count_ops, iter_ops
 
 # regex to find concrete array tokens like name[123] or name[12][3]
 ADDR_RE = re.compile(r'([A-Za-z_]\w*)\s*\[\s*([0-9]+)\s*\](?:\s*\[\s*([0-9]+)\s*\])?')
 
 def substitute_index_vars(s: str, index_map: dict, params: dict):
-    """Replace identifiers present in index_map or params with numbers in string s."""
+    """
+    Replace identifiers present in index_map or params with numbers in string s
+    and fold the subscripts that became constant (x[(k + 2)] -> x[3] for k = 1).
+    """
     if s is None:
         return None
-    t = str(s)
-    # tokens that look like identifiers
-    tokens = re.findall(r'[A-Za-z_]\w*', t)
-    # replace longer tokens first
-    tokens = sorted(set(tokens), key=lambda x: -len(x))
-    for tok in tokens:
-        if tok in index_map:
-            t = re.sub(r'\b' + re.escape(tok) + r'\b', str(index_map[tok]), t)
-        elif tok in params:
-            t = re.sub(r'\b' + re.escape(tok) + r'\b', str(params[tok]), t)
-    return t
+    return fold_subscripts(template(str(s)).substitute(index_map, params))
 
+@lru_cache(maxsize=65536)
 def find_addresses(s: str):
-    """Return list of concrete address strings found in s."""
+    """Return a tuple of the concrete address strings found in s (memoized)."""
     if s is None:
-        return []
+        return ()
     lst = []
     for m in ADDR_RE.finditer(s):
         name = m.group(1)
@@ -53,201 +64,510 @@ def find_addresses(s: str):
         else:
             addr = f"{name}[{int(i0)}][{int(i1)}]"
         lst.append(addr)
-    return lst
+    return tuple(lst)
 
 def eval_theta_expr(expr, params):
     """
     Evaluate a theta expression string (like '-2.0*PI*k1*k2/N') using params only.
     Note: loop variables should already be substituted into concrete numbers before calling.
+    Parameters may also be NumPy arrays, giving theta for all of them at once.
     """
-    env = {}
-    env.update(params or {})
-    env['math'] = math
-    env['cmath'] = cmath
-    if 'PI' not in env:
-        env['PI'] = math.pi
     try:
-        return eval(str(expr), {"__builtins__": {}}, env)
-    except Exception as e:
+        return compile_expr(str(expr)).evaluate(params or {})
+    except (ExprError, ArithmeticError) as e:
         raise ValueError(f"Failed to eval theta '{expr}': {e}")
 
-def build_matrices_from_atomic_ops(atomic_ops, params):
+# names that stand for PI in a theta template (never a number close to it)
+PI_NAMES = {"PI", "M_PI", "math.pi", "cmath.pi", "np.pi", "numpy.pi"}
+
+@lru_cache(maxsize=4096)
+def parse_theta(theta: str):
+    """
+    Recognize a theta template c * PI * a * b ... / (d * e ...) as
+    (num, num_names, den, den_names): theta = PI * num * a * b ... / (den * d * e ...)
+    with numbers num, den and the remaining names of either side, or None when
+    the template has another form. Parsed once per template (e.g. the
+    '-2.0*PI*k/N' of a loop body); twiddle() binds the names per iteration.
+    """
+    try:
+        ast = compile_expr(str(theta)).ast
+    except ExprError:
+        return None
+    form = {"num": 1.0, "den": 1.0, "pi": 0}
+    names = {True: [], False: []}   # numerator / denominator names
+    def walk(node, upper):
+        kind = node[0]
+        if kind == "bin" and node[1] == "*":
+            return walk(node[2], upper) and walk(node[3], upper)
+        if kind == "bin" and node[1] == "/":
+            return walk(node[2], upper) and walk(node[3], not upper)
+        if kind == "un" and node[1] in ("-", "+"):
+            if node[1] == "-":
+                form["num"] = -form["num"]
+            return walk(node[2], upper)
+        if kind == "num":
+            if upper:
+                form["num"] *= node[1]
+            elif node[1] == 0:
+                return False
+            else:
+                form["den"] *= node[1]
+            return True
+        if kind == "var" and node[1] in PI_NAMES:
+            form["pi"] += 1
+            return upper
+        if kind == "var":
+            names[upper].append(node[1])
+            return True
+        return False
+    if not walk(ast, True) or form["pi"] != 1:
+        return None
+    return form["num"], tuple(names[True]), form["den"], tuple(names[False])
+
+# largest FFT size with a twiddle table (2N complex entries, 32 MB at the cap);
+# larger N fall back to cmath.exp
+MAX_TWIDDLE_N = 1 << 20
+
+@lru_cache(maxsize=4)
+def twiddle_table(N: int):
+    """exp(i*PI*j/N) for j in [0, 2N): every twiddle factor of an N-point FFT, in one NumPy call."""
+    return np.exp(1j * np.pi * np.arange(2 * N) / N)
+
+def twiddle(theta_expr, bindings):
+    """
+    exp(1j*theta) for a theta template and the values of its names
+    (loop_context and params). When theta = PI * j / N with integer j and N
+    (see parse_theta) and N <= MAX_TWIDDLE_N the factor is looked up in the
+    table of size N.
+    """
+    form = parse_theta(theta_expr)
+    if form is not None:
+        num, num_names, den, den_names = form
+        try:
+            for name in num_names:
+                num *= bindings[name]
+            for name in den_names:
+                den *= bindings[name]
+        except KeyError:
+            form = None
+        if (form is not None and 0 < abs(den) <= MAX_TWIDDLE_N
+                and num == int(num) and den == int(den)):
+            j, N = (int(num), int(den)) if den > 0 else (-int(num), -int(den))
+            return complex(twiddle_table(N)[j % (2 * N)])
+    return cmath.exp(1j * eval_theta_expr(theta_expr, bindings))
+
+# array token with constant or symbolic subscripts, e.g. x[3] or rows[k1][(k2 + 1)]
+_ARRAY_TOKEN_RE = re.compile(r'[A-Za-z_]\w*(?:\s*\[[^\[\]]+\])+')
+
+# complex_t helpers of the C sources, linear in their arguments
+COMPLEX_OPS = {"c_add": "+", "c_sub": "-", "c_mul": "*", "multiply": "*"}
+
+def unparse(node):
+    """Expression text of a vpl_expr AST node."""
+    kind = node[0]
+    if kind == "num":
+        return repr(node[1])
+    if kind == "var":
+        return node[1]
+    if kind == "un":
+        return f"({node[1]}{unparse(node[2])})"
+    if kind == "bin":
+        return f"({unparse(node[2])} {node[1]} {unparse(node[3])})"
+    return f"{node[1]}({', '.join(unparse(a) for a in node[2])})"
+
+def _linear_node(node, tokens, fnames):
+    kind = node[0]
+    if kind == "var" and node[1].startswith("_addr"):
+        return ("addr", tokens[int(node[1][5:])])
+    if kind != "call":
+        return node[:2] + tuple(_linear_node(a, tokens, fnames) for a in node[2:])
+    fname, args = node[1], node[2]
+    if fname == "_cplx" and len(args) == 2:
+        re_, im = args
+        # {cos(theta), sin(theta)} = exp(i*theta)
+        if re_[0] == im[0] == "call" and (re_[1], im[1]) == ("cos", "sin") and re_[2] == im[2]:
+            return ("polar", ("num", 1.0), unparse(re_[2][0]))
+        return ("cplx", _linear_node(re_, tokens, fnames), _linear_node(im, tokens, fnames))
+    if fname == "conv_from_polar" and len(args) == 2:
+        return ("polar", _linear_node(args[0], tokens, fnames), unparse(args[1]))
+    args = [_linear_node(a, tokens, fnames) for a in args]
+    if fname in COMPLEX_OPS and len(args) == 2:
+        return ("bin", COMPLEX_OPS[fname], args[0], args[1])
+    return ("func" if fname in fnames else "call", fname, args)
+
+@lru_cache(maxsize=4096)
+def linear_template(text, fnames=frozenset()):
+    """
+    Tree of a right-hand side template for linear_value, parsed once per
+    template: the vpl_expr AST with array tokens as ("addr", token), complex
+    helpers as "+" / "-" / "*", exp(i*theta) as ("polar", r, theta) and
+    calls of the expression functions fnames as ("func", name, args).
+    """
+    tokens = []
+    def lift(m):
+        tokens.append(m.group(0))
+        return f"_addr{len(tokens) - 1}"
+    text = _ARRAY_TOKEN_RE.sub(lift, str(text)).replace("{", "_cplx(").replace("}", ")")
+    return _linear_node(compile_expr(text).ast, tokens, fnames)
+
+def _scalar(value, what):
+    row, const = value
+    if row:
+        raise NonLinearExpr(f"{what} of a memory value")
+    return const
+
+def _apply(text, *values):
+    """text over _x0, _x1 ... (vpl_expr) evaluated on scalar values."""
+    env = {f"_x{i}": _scalar(v, text) for i, v in enumerate(values)}
+    return {}, compile_expr(text).evaluate(env)
+
+def _add(a, b, sign=1.0):
+    row = dict(a[0])
+    for j, v in b[0].items():
+        row[j] = row.get(j, 0.0) + sign * v
+    return row, a[1] + sign * b[1]
+
+def _scale(a, s):
+    return {j: s * v for j, v in a[0].items()}, s * a[1]
+
+def linear_value(tree, bindings, lookup, functions=None, local_vals=None):
+    """
+    Value of a linear_template tree as a form (row, const) = row . x0 + const,
+    row {col: coeff} over the start-of-program addresses x0. lookup(token)
+    gives the form of a concrete array token, bindings the numbers of the
+    names (loop_context and params), local_vals the forms of loop-body locals
+    and functions the expression functions (see c_expander.Expander.functions).
+    Raises ExprError (NonLinearExpr) when the value is not linear.
+    """
+    functions = functions or {}
+    local_vals = local_vals or {}
+    kind = tree[0]
+    value = lambda t: linear_value(t, bindings, lookup, functions, local_vals)
+    if kind == "num":
+        return {}, tree[1]
+    if kind == "var":
+        if tree[1] in local_vals:
+            return local_vals[tree[1]]
+        return {}, compile_expr(tree[1]).evaluate(bindings)
+    if kind == "addr":
+        token = substitute_index_vars(tree[1], bindings, {})
+        form = lookup(token)
+        if form is None:
+            raise ExprError(f"Unknown address '{token}'")
+        return form
+    if kind == "un":
+        if tree[1] == "-":
+            return _scale(value(tree[2]), -1.0)
+        if tree[1] == "+":
+            return value(tree[2])
+        return _apply(f"{tree[1]}_x0", value(tree[2]))
+    if kind == "bin":
+        op, a, b = tree[1], value(tree[2]), value(tree[3])
+        if op in ("+", "-"):
+            return _add(a, b, 1.0 if op == "+" else -1.0)
+        if op == "*" and not b[0]:
+            return _scale(a, b[1])
+        if op == "*" and not a[0]:
+            return _scale(b, a[1])
+        if op == "/" and not b[0] and b[1] != 0:
+            return _scale(a, 1.0 / b[1])
+        return _apply(f"_x0 {op} _x1", a, b)
+    if kind == "cplx":
+        return _add(value(tree[1]), _scale(value(tree[2]), 1j))
+    if kind == "polar":
+        r = _scalar(value(tree[1]), "conv_from_polar")
+        env = dict(bindings)
+        env.update((n, v[1]) for n, v in local_vals.items() if not v[0])
+        return {}, r * twiddle(tree[2], env)
+    args = [value(a) for a in tree[2]]
+    if kind == "func":
+        fn = functions[tree[1]]
+        env = dict(bindings)
+        env.update(zip(fn["params"], (_scalar(a, tree[1]) for a in args)))
+        body = linear_template(fn["expr"], frozenset(functions))
+        return linear_value(body, env, lookup, functions)
+    return _apply(f"{tree[1]}({', '.join(f'_x{i}' for i in range(len(args)))})", *args)
+
+def op_bindings(op, params):
+    """Values of the names in an op's templates: params, then its loop_context."""
+    bindings = dict(params)
+    bindings.update(op.get('loop_context') or {})
+    return bindings
+
+def process_op(op, params, register):
+    """
+    Copy of op with its loop_context and params substituted into the
+    *_concrete fields; every concrete address it mentions is passed to register.
+    """
+    # copy op and create textual fields
+    op2 = dict(op)
+    # collect loop_context if any
+    index_map = op.get('loop_context', {}) or {}
+    # if op is assign or call, take lhs/rhs/args
+    if op.get('type') == 'assign':
+        lhs = op.get('lhs')
+        rhs = op.get('rhs')
+        lhs_c = substitute_index_vars(lhs, index_map, params)
+        rhs_c = substitute_index_vars(rhs, index_map, params)
+        op2['lhs_concrete'] = lhs_c
+        op2['rhs_concrete'] = rhs_c
+        for a in find_addresses(lhs_c) + find_addresses(rhs_c):
+            register(a)
+    elif op.get('type') == 'call':
+        # args already in list of strings; substitute each
+        args_conc = []
+        for a in op.get('args', []):
+            a_c = substitute_index_vars(a, index_map, params)
+            args_conc.append(a_c)
+            # if arg is array token with numeric index register it
+            for addr in find_addresses(a_c):
+                register(addr)
+        op2['args_concrete'] = args_conc
+    elif op.get('type') == 'expr':
+        expr_s = substitute_index_vars(op.get('expr'), index_map, params)
+        op2['expr_concrete'] = expr_s
+        for addr in find_addresses(expr_s):
+            register(addr)
+    else:
+        # other types: register any textual tokens we can
+        # try to find addresses in any string fields
+        for k,v in op.items():
+            if isinstance(v, str):
+                for addr in find_addresses(v):
+                    register(addr)
+    return op2
+
+def resolve_addr_token(token, addr_index):
+    """Map a token like "rows[1][0]" to its integer index in addr_index (or None)."""
+    m = ADDR_RE.search(token or "")
+    if not m:
+        return None
+    name = m.group(1)
+    i0 = int(m.group(2))
+    i1 = m.group(3)
+    if i1 is None:
+        addr = f"{name}[{i0}]"
+    else:
+        addr = f"{name}[{i0}][{int(i1)}]"
+    return addr_index.get(addr)
+
+def build_matrices_from_atomic_ops(atomic_ops, params, sparse=False, functions=None):
     """
     atomic_ops: list as produced by expander_full.atomic_ops
     params: dict of numeric params (N,N1,N2,...)
-    Returns: addr_list, M_global (numpy array), c_global (numpy vector), ops_checked
+    sparse: return M_global as a scipy.sparse CSR matrix
+    functions: expression functions called by the ops (c_expander output "functions")
+    Returns: addr_list, M_global (numpy array, or CSR if sparse), c_global (numpy vector), ops_checked
     """
-    # 1) Discover concrete addresses (walk ops in order, substitute loop_context)
+    addr_order, M_global, c_global, processed_ops = stream_matrices(atomic_ops, params, keep_ops=True,
+                                                                    functions=functions)
+    if not sparse:
+        M_global = M_global.toarray()
+    return addr_order, M_global, c_global, processed_ops
+
+def stream_matrices(ops, params, keep_ops=False, functions=None, addr_list=None):
+    """
+    Single pass over an op stream (any iterable, e.g. c_expander's
+    Expander.iter_atomic_ops() generator): each op is substituted, its
+    addresses are registered on the fly (a new address starts as an
+    identity row) and each assignment replaces the row of its target by the
+    value of its right-hand side (see linear_value); a right-hand side that
+    is not linear leaves the target unchanged. Loop-body locals (decl ops,
+    and assignments to them) keep their value for the ops after them. addr_list starts from
+    these addresses, e.g. to build the matrix of one part of a program over
+    the addresses of all of it.
+    Returns addr_list, M_global (scipy CSR), c_global, and the processed
+    ops if keep_ops (None otherwise, so the stream is never held in memory).
+    """
+    from scipy import sparse as sp
+
     addr_order = []
     addr_index = {}
+    rows = []       # growable sparse matrix: one {col: value} dict per address
+    c_rows = []
     def register(addr):
         if addr not in addr_index:
-            addr_index[addr] = len(addr_order)
+            k = len(addr_order)
+            addr_index[addr] = k
             addr_order.append(addr)
+            rows.append({k: 1.0 + 0j})
+            c_rows.append(0j)
+    for addr in addr_list or ():
+        register(addr)
+    def lookup(token):
+        k = resolve_addr_token(token, addr_index)
+        return None if k is None else (rows[k], c_rows[k])
+    fnames = frozenset(functions or ())
 
-    # first pass: substitute and collect addresses
-    processed_ops = []
-    for op in atomic_ops:
-        # copy op and create textual fields
-        op2 = dict(op)
-        # collect loop_context if any
-        index_map = op.get('loop_context', {}) or {}
-        # if op is assign or call, take lhs/rhs/args
-        if op.get('type') == 'assign':
-            lhs = op.get('lhs')
-            rhs = op.get('rhs')
-            lhs_c = substitute_index_vars(lhs, index_map, params)
-            rhs_c = substitute_index_vars(rhs, index_map, params)
-            op2['lhs_concrete'] = lhs_c
-            op2['rhs_concrete'] = rhs_c
-            for a in find_addresses(lhs_c) + find_addresses(rhs_c):
-                register(a)
-        elif op.get('type') == 'call':
-            # args already in list of strings; substitute each
-            args_conc = []
-            for a in op.get('args', []):
-                a_c = substitute_index_vars(a, index_map, params)
-                args_conc.append(a_c)
-                # if arg is array token with numeric index register it
-                for addr in find_addresses(a_c):
-                    register(addr)
-            op2['args_concrete'] = args_conc
-        elif op.get('type') == 'expr':
-            expr_s = substitute_index_vars(op.get('expr'), index_map, params)
-            op2['expr_concrete'] = expr_s
-            for addr in find_addresses(expr_s):
-                register(addr)
+    processed_ops = [] if keep_ops else None
+    local_vals = {}
+    for op in ops:
+        op = process_op(op, params, register)
+        if keep_ops:
+            processed_ops.append(op)
+        if op['type'] == 'decl':
+            template_s = op.get('init_template', op.get('init'))
+        elif op['type'] == 'assign':
+            template_s = op.get('rhs_template', op.get('rhs'))
         else:
-            # other types: register any textual tokens we can
-            # try to find addresses in any string fields
-            for k,v in op.items():
-                if isinstance(v, str):
-                    for addr in find_addresses(v):
-                        register(addr)
-        processed_ops.append(op2)
-
-    # if no addresses found, nothing to build
-    if len(addr_order) == 0:
-        return addr_order, np.zeros((0,0), dtype=complex), np.zeros((0,), dtype=complex), processed_ops
+            continue
+        # a decl, or an assignment to a loop-body local, sets local_vals[name]
+        lhs = (op.get('lhs_concrete') or '').strip()
+        name = op['name'] if op['type'] == 'decl' else (lhs if lhs in local_vals else None)
+        try:
+            tree = linear_template(template_s, fnames)
+            value = linear_value(tree, op_bindings(op, params), lookup, functions, local_vals)
+        except ExprError:
+            # not linear: a local is forgotten, an assigned address keeps its row
+            local_vals.pop(name, None)
+            continue
+        if name is not None:
+            local_vals[name] = value
+            continue
+        tgt_idx = resolve_addr_token(lhs, addr_index) if ADDR_RE.fullmatch(lhs) else None
+        if tgt_idx is None:
+            # not a whole address (a struct field, a scalar variable)
+            continue
+        row, const = value
+        rows[tgt_idx] = {j: v for j, v in row.items() if v != 0}
+        c_rows[tgt_idx] = const
 
     K = len(addr_order)
-    M_global = np.eye(K, dtype=complex)   # start as identity
-    c_global = np.zeros((K,), dtype=complex)
-
-    # helper to map token like "rows[1][0]" -> integer index in addr_order
-    def resolve_addr_token(token):
-        m = ADDR_RE.search(token)
-        if not m:
-            return None
-        name = m.group(1)
-        i0 = int(m.group(2))
-        i1 = m.group(3)
-        if i1 is None:
-            addr = f"{name}[{i0}]"
-        else:
-            addr = f"{name}[{i0}][{int(i1)}]"
-        return addr_index.get(addr)
-
-    # 2) Build M_global by composing per-op M_assign
-    for op in processed_ops:
-        if op['type'] == 'assign':
-            lhs = op.get('lhs_concrete')
-            rhs = op.get('rhs_concrete')
-            tgt_idx = resolve_addr_token(lhs)
-            if tgt_idx is None:
-                # skip non-address assignments
-                continue
-            # create M_assign
-            M_assign = np.eye(K, dtype=complex)
-            M_assign[tgt_idx, :] = 0.0
-            # handle rhs patterns:
-            rhs_s = (rhs or "").strip()
-            # pattern multiply(conv_from_polar(1, theta), ARR)
-            m = re.match(r'\s*multiply\s*\(\s*conv_from_polar\s*\(\s*1\s*,\s*(.+?)\s*\)\s*,\s*([A-Za-z_]\w*(?:\s*\[\s*\d+\s*\])(?:\s*\[\s*\d+\s*\])?)\s*\)\s*$', rhs_s)
-            if m:
-                theta_expr = m.group(1)
-                arr_token = m.group(2)
-                src_idx = resolve_addr_token(arr_token)
-                if src_idx is not None:
-                    theta_val = eval(substitute_index_vars(theta_expr, {}, params), {"__builtins__": {}}, {'math': math, 'PI': math.pi, **params})
-                    mult_val = cmath.exp(1j * theta_val)
-                    M_assign[tgt_idx, src_idx] += mult_val
-            else:
-                # try direct array copy
-                m2 = re.match(r'^\s*([A-Za-z_]\w*(?:\s*\[\s*\d+\s*\])(?:\s*\[\s*\d+\s*\])?)\s*$', rhs_s)
-                if m2:
-                    arr_token = m2.group(1)
-                    src_idx = resolve_addr_token(arr_token)
-                    if src_idx is not None:
-                        M_assign[tgt_idx, src_idx] += 1.0
-                else:
-                    # try c_add/c_sub pattern: find first concrete array token in rhs and map it
-                    arrm = re.search(r'([A-Za-z_]\w*\s*\[\s*\d+\s*\](?:\s*\[\s*\d+\s*\])?)', rhs_s)
-                    if arrm:
-                        src_idx = resolve_addr_token(arrm.group(1))
-                        if src_idx is not None:
-                            # for simplicity assume coefficient 1
-                            M_assign[tgt_idx, src_idx] += 1.0
-                    else:
-                        # RHS unsupported; skip
-                        continue
-            # compose M_global = M_assign @ M_global ; c_global likewise
-            M_global = M_assign @ M_global
-            c_global = M_assign @ c_global
+    data, indices, indptr = [], [], [0]
+    for row in rows:
+        for j in sorted(row):
+            indices.append(j)
+            data.append(row[j])
+        indptr.append(len(indices))
+    M_global = sp.csr_matrix((np.array(data, dtype=complex), np.array(indices, dtype=np.int64),
+                              np.array(indptr, dtype=np.int64)), shape=(K, K))
+    return addr_order, M_global, np.array(c_rows, dtype=complex), processed_ops
+
+def stage_twiddles(found, stage, params, addr_index):
+    """
+    Factor of odd[k] in x[k] = c_add(even[k], t) for each k of a butterfly
+    loop (see detect_butterfly), read off its stage matrix.
+    """
+    w = []
+    for k in range(found['bound']):
+        bindings = dict(params, **{found['var']: k})
+        tgt = resolve_addr_token(substitute_index_vars(found['lhs'], bindings, {}), addr_index)
+        even = resolve_addr_token(substitute_index_vars(found['even'], bindings, {}), addr_index)
+        if tgt is None or even is None:
+            return []
+        row = stage.getrow(tgt)
+        others = [v for j, v in zip(row.indices, row.data) if j != even]
+        if len(others) != 1:
+            return []
+        w.append(others[0])
+    return w
+
+def factored_operator(loop_nest, params, addr_list, functions=None):
+    """
+    The linear part of a c_expander loop nest as a ButterflyOperator: one
+    sparse stage per top-level loop (or run of top-level ops) that writes
+    memory, each built from the nest's own ops over addr_list (see
+    stream_matrices). None when the nest has no butterfly loop.
+    """
+    from scipy import sparse as sp
+
+    if not detect_butterfly(loop_nest):
+        return None
+    groups = []
+    for node in loop_nest:
+        if node['type'] == 'loop' or not groups or groups[-1][-1]['type'] == 'loop':
+            groups.append([node])
         else:
-            # calls/expr/other: no direct matrix effect (printf/free), so skip
-            continue
+            groups[-1].append(node)
 
-    return addr_order, M_global, c_global, processed_ops
+    addr_index = {a: i for i, a in enumerate(addr_list)}
+    identity = sp.identity(len(addr_list), dtype=complex, format='csr')
+    stages, kinds, twiddles = [], [], []
+    for group in groups:
+        _, stage, _, _ = stream_matrices(iter_ops(group), params, functions=functions, addr_list=addr_list)
+        if stage.shape != identity.shape:
+            raise ValueError("addr_list does not cover the addresses of the loop nest")
+        if (stage != identity).nnz == 0:
+            continue
+        pair = butterfly_pair(group[0]['body']) if group[0]['type'] == 'loop' else None
+        if pair:
+            kinds.append('butterfly')
+            found = {'var': group[0]['var'], 'bound': group[0]['bound'], 'lhs': pair[0], 'even': pair[1]}
+            twiddles.append(stage_twiddles(found, stage, params, addr_index))
+        elif np.all(np.diff(stage.indptr) == 1) and np.all(stage.data == 1):
+            kinds.append('permutation')
+        else:
+            kinds.append('linear')
+        stages.append(stage)
+    return ButterflyOperator(addr_list, stages, kinds, twiddles)
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python postprocess_atomic_ops.py expanded.json")
+    flags = {'--sparse', '--dense'}
+    args = [a for a in sys.argv[1:] if a not in flags]
+    sparse = '--sparse' in sys.argv
+    if len(args) < 1:
+        print("Usage: python postprocess_atomic_ops.py expanded.json [output] [--sparse] [--dense]")
         sys.exit(1)
-    infile = sys.argv[1]
-    with open(infile, 'r') as f:
-        expanded = json.load(f)
-
-    atomic_ops = expanded.get('atomic_ops', [])
+    infile = args[0]
+    outfile = args[1] if len(args) > 1 else 'expanded_with_matrix.json'
+    expanded = load_artifact(infile)
     # Provide numeric parameters and assume lengths for your run:
     params = {
         'N': 8,
+        'half': 4,
         'N1': 2,
         'N2': 4,
         'PI': math.pi,
         # add other constants as needed
     }
 
-    addr_list, M_global, c_global, processed_ops = build_matrices_from_atomic_ops(atomic_ops, params)
+    functions = expanded.get('functions') or {}
+    if 'blocks' in expanded:
+        # translator output: expand and stream the ops, never as a list
+        expander = Expander(expanded, params=params, assume_lengths=params)
+        loop_nest = expander.loop_nest()
+        atomic_ops = expander.iter_atomic_ops(loop_nest)
+        functions = expander.functions()
+    elif 'loop_nest' in expanded:
+        # compressed c_expander output: stream the ops straight out of the nest
+        loop_nest = expanded['loop_nest']
+        atomic_ops = iter_ops(loop_nest)
+    else:
+        loop_nest = None
+        atomic_ops = expanded.get('atomic_ops', [])
+    streamed = loop_nest is not None
 
-    # serialize M_global into JSON-friendly form
-    M_ser = []
-    for row in M_global:
-        r = []
-        for v in row:
-            if abs(v.imag) < 1e-12:
-                r.append(v.real)
-            else:
-                r.append([v.real, v.imag])
-        M_ser.append(r)
-    c_ser = []
-    for v in c_global:
-        if abs(v.imag) < 1e-12:
-            c_ser.append(v.real)
-        else:
-            c_ser.append([v.real, v.imag])
+    if streamed:
+        sparse = True
+        addr_list, M_global, c_global, processed_ops = stream_matrices(atomic_ops, params, functions=functions)
+        print(f"Streamed {count_ops(loop_nest)} ops")
+    else:
+        addr_list, M_global, c_global, processed_ops = build_matrices_from_atomic_ops(atomic_ops, params, sparse, functions)
+    # keep the butterfly network factored; the dense product only with --dense
+    op = factored_operator(loop_nest, params, addr_list, functions) if streamed else None
+    shape = M_global.shape
+    if sparse:
+        M_global = {'format': 'csr', 'shape': list(shape), 'data': M_global.data,
+                    'indices': M_global.indices, 'indptr': M_global.indptr}
 
+    # complex arrays are written natively to .vplb and as real / [re, im]
+    # entries to JSON
     out = {
         'addr_list': addr_list,
-        'M_global': M_ser,
-        'c_global': c_ser,
-        'atomic_ops_checked': processed_ops
+        'M_global': M_global,
+        'c_global': c_global,
+        'atomic_ops_checked': processed_ops if processed_ops is not None else []
     }
-    with open('expanded_with_matrix.json', 'w') as f:
-        json.dump(out, f, indent=2)
-    print("Wrote expanded_with_matrix.json")
+    if op is not None:
+        out['operator'] = op.to_dict()
+        if '--dense' in sys.argv:
+            out['operator_dense'] = op.to_dense()
+        print(f"Butterfly operator: {op.n_stages} stages ({', '.join(op.kinds)}), "
+              f"{op.nnz} non-zeros, sign {op.sign}")
+    save_artifact(outfile, out)
+    print(f"Wrote {outfile}")
     print("Addresses:", len(addr_list))
-    print("M_global shape:", M_global.shape)
+    print("M_global shape:", shape)
 
 if __name__ == "__main__":
     main()
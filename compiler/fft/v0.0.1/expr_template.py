@@ -0,0 +1,75 @@
+"""
+expr_template.py
+Expression templates for the FFT expanders.
+
+Unrolling substitutes loop indices and parameters into the same few
+expression strings over and over. Instead of one re.sub per variable per
+call, an expression is split once (cached per string) into literal text and
+identifier slots; instantiating it for an index map is then a plain join.
+
+    t = template("x[i + half] * W(k, N)")
+    t.substitute({"i": 3}, {"half": 2, "N": 4})   # 'x[3 + 2] * W(k, 4)'
+
+Identifiers are matched with the same word boundaries as re.sub(r"\bvar\b"),
+and the first map that defines an identifier wins.
+
+fold_subscripts() then reduces array subscripts that became pure arithmetic
+to integers, so x[(2 * 3) + 1] reads x[7] as a concrete address.
+"""
+import re
+from functools import lru_cache
+from vpl_common import compile_expr, ExprError
+
+_IDENT_RE = re.compile(r'\b[A-Za-z_]\w*')
+# innermost [...] whose contents are not already a plain integer
+_SUBSCRIPT_RE = re.compile(r'\[(?!\s*\d+\s*\])([^\[\]]+)\]')
+
+class ExprTemplate:
+    __slots__ = ("parts", "names")
+
+    def __init__(self, expr):
+        # parts[0] name[0] parts[1] name[1] ... parts[-1]
+        self.parts = []
+        self.names = []
+        pos = 0
+        for m in _IDENT_RE.finditer(expr):
+            self.parts.append(expr[pos:m.start()])
+            self.names.append(m.group())
+            pos = m.end()
+        self.parts.append(expr[pos:])
+
+    def substitute(self, *maps):
+        parts = self.parts
+        out = [parts[0]]
+        for k, name in enumerate(self.names):
+            for m in maps:
+                if name in m:
+                    out.append(str(m[name]))
+                    break
+            else:
+                out.append(name)
+            out.append(parts[k + 1])
+        return "".join(out)
+
+@lru_cache(maxsize=65536)
+def template(expr):
+    """Cached ExprTemplate for an expression string."""
+    return ExprTemplate(expr)
+
+def _fold_subscript(m):
+    inner = m.group(1)
+    if _IDENT_RE.search(inner):
+        return m.group(0)
+    try:
+        value = compile_expr(inner).evaluate()
+    except (ExprError, ArithmeticError):
+        return m.group(0)
+    if value != int(value):
+        return m.group(0)
+    return f"[{int(value)}]"
+
+def fold_subscripts(s):
+    """s with every constant subscript expression [(2 * 3) + 1] replaced by its integer [7]."""
+    if "[" not in s:
+        return s
+    return _SUBSCRIPT_RE.sub(_fold_subscript, s)
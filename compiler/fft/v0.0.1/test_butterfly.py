@@ -0,0 +1,69 @@
+import math
+
+import numpy as np
+
+from butterfly import detect_butterfly
+from c_expander import Expander
+from d_expander_ops import factored_operator, stream_matrices
+
+PARAMS = {"N": 8, "half": 4, "PI": math.pi}
+
+def factor(blocks, params=PARAMS):
+    expander = Expander(blocks, params=params, assume_lengths=params)
+    nest = expander.loop_nest()
+    functions = expander.functions()
+    addr, M, c, _ = stream_matrices(expander.iter_atomic_ops(nest), params, functions=functions)
+    return addr, M.toarray(), factored_operator(nest, params, addr, functions)
+
+def test_stages_multiply_to_the_dense_matrix(fft_blocks):
+    addr, M, op = factor(fft_blocks)
+    assert op.kinds == ["permutation", "butterfly"]
+    np.testing.assert_allclose(op.to_dense(), M, atol=1e-12)
+    product = np.eye(len(addr))
+    for s in op.matrices():
+        product = s.toarray() @ product
+    np.testing.assert_allclose(product, M, atol=1e-12)
+
+    X = np.random.default_rng(0).standard_normal((len(addr), 3))
+    np.testing.assert_allclose(op @ X, M @ X, atol=1e-12)
+
+def test_twiddles_and_sign_come_from_the_program(fft_blocks):
+    addr, M, op = factor(fft_blocks)
+    k = np.arange(4)
+    np.testing.assert_allclose(op.twiddles[0], np.exp(-2j * np.pi * k / 8), atol=1e-12)
+    assert op.sign == -1
+    # the recombination x[k] = x[2k] + w^k x[2k + 1] of the one unrolled level
+    x = [addr.index(f"x[{i}]") for i in range(8)]
+    for j in range(4):
+        assert M[x[j], x[2 * j]] == 1.0
+        assert M[x[j + 4], x[2 * j + 1]] == -op.twiddles[0][j]
+
+def test_inverse_sign(fft_code, translate):
+    addr, M, op = factor(translate(fft_code.replace("-2.0 * M_PI * k", "2.0 * M_PI * k")))
+    assert op.sign == 1
+    np.testing.assert_allclose(op.twiddles[0], np.exp(2j * np.pi * np.arange(4) / 8), atol=1e-12)
+    np.testing.assert_allclose(op.to_dense(), M, atol=1e-12)
+
+def test_no_operator_without_a_butterfly_loop(translate):
+    blocks = translate("""
+        void copy(double* x, double* y, int N) {
+            for (int i = 0; i < N; i++) {
+                y[i] = x[i];
+            }
+        }
+        """)
+    addr, M, op = factor(blocks)
+    assert op is None
+    assert M[addr.index("y[3]"), addr.index("x[3]")] == 1.0
+
+def test_detect_butterfly_reads_the_recombination_loop(fft_blocks):
+    nest = Expander(fft_blocks, params=PARAMS, assume_lengths=PARAMS).loop_nest()
+    assert detect_butterfly(nest) == [{"var": "k", "bound": 4, "N": 8, "lhs": "x[k]", "even": "even[k]"}]
+
+def test_to_dict_keeps_the_stages(fft_blocks):
+    addr, M, op = factor(fft_blocks)
+    d = op.to_dict()
+    assert d["addr_list"] == addr and d["kinds"] == op.kinds and d["sign"] == -1
+    for s, stage in zip(op.matrices(), d["stages"]):
+        np.testing.assert_array_equal(stage["data"], s.data)
+        np.testing.assert_array_equal(stage["indptr"], s.indptr)
@@ -0,0 +1,77 @@
+import sys
+
+import numpy as np
+from scipy import sparse as sp
+
+import d_expander_ops
+from vpl_common import load_artifact, save_artifact
+from c_expander import Expander, count_ops, expr_to_string, iter_ops
+from d_expander_ops import build_matrices_from_atomic_ops, stream_matrices
+
+PARAMS = {"N": 4, "half": 2}
+
+def loops(nest):
+    return [node for node in nest if node["type"] == "loop"]
+
+def test_expressions_keep_array_refs_and_prefix_operators():
+    assert expr_to_string({"arrayref": {"name": {"id": "x"},
+                                        "subscript": {"binop": {"op": "+", "left": {"id": "k"},
+                                                                "right": {"id": "half"}}}}}) == "x[(k + half)]"
+    assert expr_to_string({"unop": {"op": "-", "expr": {"const": "2.0"}}}) == "(-2.0)"
+    assert expr_to_string({"unop": {"op": "p++", "expr": {"id": "i"}}}) == "i++"
+    assert expr_to_string({"initlist": [{"id": "a"}, {"const": "0"}]}) == "{a, 0}"
+
+def test_loop_nest_keeps_loops_symbolic(fft_blocks):
+    nest = Expander(fft_blocks, params=PARAMS, assume_lengths=PARAMS).loop_nest()
+    split, combine = loops(nest)[:2]
+    assert (split["var"], split["bound"]) == ("i", 2)
+    assert [(n["lhs"], n["rhs"]) for n in split["body"]] == [("even[i]", "x[(2 * i)]"),
+                                                             ("odd[i]", "x[((2 * i) + 1)]")]
+    assert combine["body"][0] == {"type": "decl", "name": "t", "init": "c_mul(twiddle(k, 4), odd[k])"}
+    assert combine["body"][2]["lhs"] == "x[(k + 2)]"
+
+def test_functions_inline_locals_in_their_own_parameters(fft_blocks):
+    functions = Expander(fft_blocks, params=PARAMS, assume_lengths=PARAMS).functions()
+    assert set(functions) == {"c_add", "c_sub", "c_mul", "twiddle"}
+    angle = "((((-2.0) * M_PI) * k) / N)"
+    assert functions["twiddle"] == {"params": ["k", "N"], "expr": f"{{cos(({angle})), sin(({angle}))}}"}
+
+def test_iter_ops_materializes_the_unrolled_program(fft_blocks):
+    expander = Expander(fft_blocks, params=PARAMS, assume_lengths=PARAMS)
+    nest = expander.loop_nest()
+    ops = list(iter_ops(nest))
+    assert count_ops(nest) == len(ops)
+    unrolled = Expander(fft_blocks, params=PARAMS, assume_lengths=PARAMS).run()
+    assert unrolled["atomic_ops"] == ops
+    assert unrolled["addr_list"] == ["even[0]", "x[0]", "odd[0]", "x[1]",
+                                     "even[1]", "x[2]", "odd[1]", "x[3]"]
+    recombine = [op for op in ops if op["type"] == "assign" and op["loop_context"] == {"k": 1}]
+    assert [(op["lhs"], op["rhs"]) for op in recombine] == [("x[1]", "c_add(even[1], t)"),
+                                                            ("x[3]", "c_sub(even[1], t)")]
+
+def test_compressed_nest_streams_to_the_unrolled_matrices(fft_blocks):
+    expander = Expander(fft_blocks, params=PARAMS, assume_lengths=PARAMS)
+    nest = expander.loop_nest()
+    addr, M, c, checked = build_matrices_from_atomic_ops(list(iter_ops(nest)), PARAMS)
+    addr_s, M_s, c_s, _ = stream_matrices(iter_ops(nest), PARAMS)
+    assert addr_s == addr == expander.run()["addr_list"]
+    np.testing.assert_allclose(M_s.toarray(), M)
+    # the split loop copies x into even / odd
+    assert M[addr.index("odd[1]"), addr.index("x[3]")] == 1.0
+
+def test_translator_input_is_streamed_through_the_expander(fft_blocks, tmp_path, monkeypatch):
+    infile, outfile = str(tmp_path / "b_translator.json"), str(tmp_path / "out.vplb")
+    save_artifact(infile, fft_blocks)
+    monkeypatch.setattr(sys, "argv", ["d_expander_ops.py", infile, outfile])
+    d_expander_ops.main()
+    out = load_artifact(outfile)
+
+    params = {"N": 8, "half": 4, "N1": 2, "N2": 4}
+    unrolled = Expander(fft_blocks, params=params, assume_lengths=params).run()
+    addr, M, c, _ = build_matrices_from_atomic_ops(unrolled["atomic_ops"], params,
+                                                   functions=unrolled["functions"])
+    assert out["addr_list"] == addr
+    assert out["atomic_ops_checked"] == []
+    csr = out["M_global"]
+    M_s = sp.csr_matrix((csr["data"], csr["indices"], csr["indptr"]), shape=tuple(csr["shape"]))
+    np.testing.assert_allclose(M_s.toarray(), M)
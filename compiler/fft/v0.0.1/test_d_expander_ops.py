@@ -0,0 +1,178 @@
+import cmath
+import math
+import re
+
+import numpy as np
+import pytest
+
+from d_expander_ops import (MAX_TWIDDLE_N, build_matrices_from_atomic_ops, eval_theta_expr, parse_theta,
+                            process_op, resolve_addr_token, stream_matrices, twiddle, twiddle_table)
+
+def eval_theta_builtin(expr, params):
+    """The eval()-based eval_theta_expr this module used before vpl_expr."""
+    env = dict(params)
+    env.update({"math": math, "cmath": cmath})
+    env.setdefault("PI", math.pi)
+    return eval(str(expr), {"__builtins__": {}}, env)
+
+PARAMS = {"N": 8, "N1": 2, "N2": 4}
+
+@pytest.mark.parametrize("expr", ["-2.0*PI*3*1/8", "-2.0*PI*k1*k2/N", "2*math.pi*N1/N2",
+                                  "-(PI/4)", "PI*(k1 + 1)/N", "math.cos(PI/N)"])
+def test_theta_eval_matches_builtin_eval(expr):
+    params = dict(PARAMS, k1=3, k2=1)
+    assert eval_theta_expr(expr, params) == pytest.approx(eval_theta_builtin(expr, params))
+
+def test_theta_eval_takes_arrays():
+    k = np.arange(8)
+    np.testing.assert_allclose(eval_theta_expr("-2.0*PI*k/N", dict(PARAMS, k=k)), -2 * np.pi * k / 8)
+
+def test_theta_eval_errors_are_value_errors():
+    for expr in ("1/0", "PI*", "__import__('os')"):
+        with pytest.raises(ValueError):
+            eval_theta_expr(expr, PARAMS)
+
+def test_parse_theta_reads_the_template():
+    assert parse_theta("-2.0*PI*k/N") == (-2.0, ("k",), 1.0, ("N",))
+    assert parse_theta("-(M_PI/4) * k1 * k2") == (-1.0, ("k1", "k2"), 4.0, ())
+    assert parse_theta("2*math.pi*k/(N1*N2)") == (2.0, ("k",), 1.0, ("N1", "N2"))
+    for text in ("3.141592653589793*k/N", "PI*PI*k", "k/PI", "sin(PI*k)", "PI*k/0", "PI*k+1"):
+        assert parse_theta(text) is None
+
+def test_twiddle_uses_one_table_per_size():
+    twiddle_table.cache_clear()
+    parse_theta.cache_clear()
+    for k in range(8):
+        w = twiddle("-2.0*PI*k/N", {"k": k, "N": 8})
+        assert w == twiddle_table(8)[-2 * k % 16]
+        assert w == pytest.approx(cmath.exp(-2j * math.pi * k / 8))
+    assert twiddle_table.cache_info().currsize == 1
+    assert parse_theta.cache_info().currsize == 1
+    assert twiddle("PI*k/4", {"k": 9}) == twiddle_table(4)[1]
+
+def test_no_table_for_huge_sizes():
+    twiddle_table.cache_clear()
+    for N in (MAX_TWIDDLE_N + 2, 10 ** 9):
+        assert twiddle("PI*t/N", {"t": 3, "N": N}) == pytest.approx(cmath.exp(3j * math.pi / N))
+    assert twiddle("PI*t/1000000000", {"t": 1}) == pytest.approx(cmath.exp(1j * math.pi / 1e9))
+    assert twiddle_table.cache_info().currsize == 0
+
+def test_twiddle_falls_back_to_the_exact_angle():
+    # a number close to PI is not PI, and neither is a non-integer multiple
+    for theta, bindings in (("3.14159*k/N", {"k": 1, "N": 4}), ("PI*k/N", {"k": 0.5, "N": 4}),
+                            ("PI/math.sqrt(N)", {"N": 4})):
+        assert twiddle(theta, bindings) == pytest.approx(cmath.exp(1j * eval_theta_builtin(theta, bindings)))
+
+def twiddle_ops(n1, n2):
+    """Ops in the expander_full format: symbolic lhs / rhs plus loop_context."""
+    ops = [{"type": "call", "func": "printf", "args": ['"start"']}]
+    for k1 in range(n1):
+        for k2 in range(n2):
+            ops.append({"type": "assign", "lhs": "y[k1][k2]",
+                        "rhs": "multiply(conv_from_polar(1, -2.0*PI*k1*k2/N), x[k1][k2])",
+                        "loop_context": {"k1": k1, "k2": k2}})
+    for k1 in range(n1):
+        for k2 in range(n2):
+            ops.append({"type": "assign", "lhs": "z[k2][k1]", "rhs": "y[k1][k2]",
+                        "loop_context": {"k1": k1, "k2": k2}})
+    # chained updates read rows that earlier ops already replaced
+    ops.append({"type": "assign", "lhs": "x[0][0]", "rhs": "z[1][0]", "loop_context": {}})
+    ops.append({"type": "assign", "lhs": "z[1][0]", "rhs": "x[0][0]", "loop_context": {}})
+    ops.append({"type": "assign", "lhs": "x[0][1]", "rhs": "sin(1)", "loop_context": {}})
+    return ops
+
+def dense_product_matrices(ops, params):
+    """
+    M_global = M_assign @ M_global, c_global = M_assign @ c_global + b_assign
+    with a K x K M_assign per op, as before the row updates.
+    """
+    index = {}
+    processed = [process_op(op, params, lambda a: index.setdefault(a, len(index))) for op in ops]
+    K = len(index)
+    M = np.eye(K, dtype=complex)
+    c = np.zeros(K, dtype=complex)
+    for op in processed:
+        if op["type"] != "assign":
+            continue
+        tgt = resolve_addr_token(op["lhs_concrete"], index)
+        m = re.match(r"multiply\(conv_from_polar\(1, (.+)\), (\w+\[\d+\]\[\d+\])\)$", op["rhs_concrete"])
+        src = resolve_addr_token(m.group(2) if m else op["rhs_concrete"], index)
+        M_assign = np.eye(K, dtype=complex)
+        b_assign = np.zeros(K, dtype=complex)
+        M_assign[tgt, :] = 0.0
+        if src is None:
+            # a constant right-hand side
+            b_assign[tgt] = eval_theta_builtin(op["rhs_concrete"], dict(params, sin=math.sin))
+        else:
+            M_assign[tgt, src] = cmath.exp(1j * eval_theta_builtin(m.group(1), params)) if m else 1.0
+        M = M_assign @ M
+        c = M_assign @ c + b_assign
+    return list(index), M, c
+
+def test_row_updates_match_dense_products():
+    params = {"N": 8}
+    ops = twiddle_ops(2, 4)
+    addr_ref, M_ref, c_ref = dense_product_matrices(ops, params)
+    addr, M, c, checked = build_matrices_from_atomic_ops(ops, params)
+    assert addr == addr_ref
+    np.testing.assert_allclose(M, M_ref, atol=1e-12)
+    np.testing.assert_allclose(c, c_ref, atol=1e-12)
+    assert c[addr.index("x[0][1]")] == pytest.approx(math.sin(1))
+    assert len(checked) == len(ops)
+
+    addr_s, M_s, c_s, checked_s = build_matrices_from_atomic_ops(ops, params, sparse=True)
+    assert addr_s == addr
+    np.testing.assert_allclose(M_s.toarray(), M_ref, atol=1e-12)
+    assert checked_s == checked
+
+def test_theta_templates_are_parsed_once_per_loop():
+    parse_theta.cache_clear()
+    build_matrices_from_atomic_ops(twiddle_ops(4, 8), {"N": 32})
+    assert parse_theta.cache_info().currsize == 1
+
+def assign(lhs, rhs, **loop_context):
+    return {"type": "assign", "lhs": lhs, "rhs": rhs, "loop_context": loop_context}
+
+def test_complex_helpers_are_linear_in_every_argument():
+    functions = {"twiddle": {"params": ["k", "N"],
+                             "expr": "{cos(((-2.0 * M_PI) * k) / N), sin(((-2.0 * M_PI) * k) / N)}"}}
+    ops = [assign("a[0]", "a[0]"), assign("b[0]", "b[0]"),
+           {"type": "decl", "name": "t", "init": "c_mul(twiddle(k, 8), b[0])", "loop_context": {"k": 1}},
+           assign("y[0]", "c_add(a[0], t)"), assign("y[1]", "c_sub(a[0], t)"),
+           assign("y[2]", "2 * a[0] - b[0] / 4 + 1"), assign("y[3]", "{a[0], b[0]}")]
+    addr, M, c, _ = build_matrices_from_atomic_ops(ops, {}, functions=functions)
+    a, b = addr.index("a[0]"), addr.index("b[0]")
+    w = cmath.exp(-2j * math.pi / 8)
+    np.testing.assert_allclose(M[addr.index("y[0]"), [a, b]], [1, w])
+    np.testing.assert_allclose(M[addr.index("y[1]"), [a, b]], [1, -w])
+    np.testing.assert_allclose(M[addr.index("y[2]"), [a, b]], [2, -0.25])
+    assert c[addr.index("y[2]")] == 1.0
+    np.testing.assert_allclose(M[addr.index("y[3]"), [a, b]], [1, 1j])
+
+def test_non_linear_right_hand_sides_leave_the_target():
+    ops = [assign("y[0]", "x[0]"), assign("y[0]", "c_mul(x[0], x[1])"), assign("y[0]", "x[1] % 2"),
+           assign("y[0]", "unknown(x[1])"), assign("y[0].re", "x[1]")]
+    addr, M, c, _ = build_matrices_from_atomic_ops(ops, {})
+    y, x0 = addr.index("y[0]"), addr.index("x[0]")
+    assert M[y].tolist() == np.eye(len(addr))[x0].tolist()
+
+def test_assignments_update_locals():
+    ops = [assign("a[0]", "a[0]"), {"type": "decl", "name": "t", "init": "a[0]"},
+           assign("t", "2 * t"), assign("y[0]", "t"),
+           assign("t", "c_mul(t, a[0])"), assign("y[1]", "t")]
+    addr, M, c, _ = build_matrices_from_atomic_ops(ops, {})
+    a = addr.index("a[0]")
+    assert M[addr.index("y[0]"), a] == 2.0
+    # a local that became non-linear is forgotten, so y[1] keeps its row
+    np.testing.assert_array_equal(M[addr.index("y[1]")], np.eye(len(addr))[addr.index("y[1]")])
+
+def test_streamed_ops_are_not_kept():
+    ops = twiddle_ops(2, 2)
+    addr, M, c, checked = stream_matrices(iter(ops), {"N": 4})
+    assert checked is None
+    _, M_list, _, _ = build_matrices_from_atomic_ops(ops, {"N": 4})
+    np.testing.assert_allclose(M.toarray(), M_list, atol=1e-12)
+
+def test_no_addresses_gives_empty_matrices():
+    addr, M, c, checked = build_matrices_from_atomic_ops([{"type": "var_decl", "name": "r"}], {})
+    assert addr == [] and M.shape == (0, 0) and c.shape == (0,)
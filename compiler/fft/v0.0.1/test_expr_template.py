@@ -0,0 +1,63 @@
+import re
+
+import pytest
+
+from c_expander import address_tokens, substitute_index_vars
+from d_expander_ops import find_addresses
+from expr_template import fold_subscripts, template
+
+def resub_sequential(expr, index_map, params):
+    """c_expander's substitution before expr_template: one re.sub per variable."""
+    for mapping in (index_map, params):
+        for var, val in mapping.items():
+            expr = re.sub(rf"\b{re.escape(var)}\b", str(val), expr)
+    return expr
+
+def resub_longest_first(s, index_map, params):
+    """d_expander_ops's substitution before expr_template."""
+    for tok in sorted(set(re.findall(r'[A-Za-z_]\w*', s)), key=lambda x: -len(x)):
+        if tok in index_map:
+            s = re.sub(r'\b' + re.escape(tok) + r'\b', str(index_map[tok]), s)
+        elif tok in params:
+            s = re.sub(r'\b' + re.escape(tok) + r'\b', str(params[tok]), s)
+    return s
+
+EXPRS = ["x[i + half]", "multiply(conv_from_polar(1, -2.0*PI*k1*k2/N), x[k1][k2])",
+         "x[k].re + odd[2*k]", "ii + i + i_2 + 2i", "c_add(even[k], t)", "", "N1*N2 - N"]
+MAPS = [({"i": 3, "k": 0, "k1": 1, "k2": 2}, {"N": 8, "N1": 2, "N2": 4, "half": 4}),
+        ({}, {"N": 8}),
+        ({"N": 2}, {"N": 8, "t": 5})]
+
+@pytest.mark.parametrize("expr", EXPRS)
+@pytest.mark.parametrize("maps", MAPS)
+def test_substitution_matches_regex_versions(expr, maps):
+    index_map, params = maps
+    expected = resub_sequential(expr, index_map, params)
+    assert expected == resub_longest_first(expr, index_map, params)
+    assert template(expr).substitute(index_map, params) == expected
+    # c_expander also folds the subscripts that became constant
+    assert substitute_index_vars(expr, index_map, params) == fold_subscripts(expected)
+
+def test_template_slots():
+    t = template("x[i + half] * W(k, N)")
+    assert t.names == ["x", "i", "half", "W", "k", "N"]
+    assert t.parts == ["", "[", " + ", "] * ", "(", ", ", ")"]
+    assert t.substitute({"i": 3}, {"half": 2, "N": 4}) == "x[3 + 2] * W(k, 4)"
+
+def test_first_map_wins_and_templates_are_cached():
+    assert template("i + N").substitute({"i": 1, "N": 2}, {"N": 8}) == "1 + 2"
+    assert template("i + N") is template("i + N")
+
+def test_fold_subscripts():
+    assert fold_subscripts("x[(2 * 3) + 1] + y[1][(0 + 2)].re") == "x[7] + y[1][2].re"
+    assert fold_subscripts("a[b[(1 + 1)]]") == "a[b[2]]"
+    # symbolic, fractional or undefined subscripts stay as they are
+    assert fold_subscripts("x[k + 1] + x[1/2] + x[1/0]") == "x[k + 1] + x[1/2] + x[1/0]"
+    assert substitute_index_vars("x[(k + half)]", {"k": 1}, {"half": 4}) == "x[5]"
+
+def test_address_scans():
+    s = "c_add(x[0], y[1][2]) + x [3]"
+    assert address_tokens(s) == ("x[0]", "y[1][2]")
+    assert find_addresses(s) == ("x[0]", "y[1][2]", "x[3]")
+    assert find_addresses(s) is find_addresses(s)
+    assert find_addresses(None) == ()
@@ -0,0 +1,19 @@
+"""
+vpl_common.py
+Puts compiler/common on sys.path and re-exports the shared modules, so the
+stages in this directory import them from one place:
+
+    from vpl_common import load_artifact, save_artifact
+"""
+import os
+import sys
+
+COMMON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common")
+if COMMON_DIR not in sys.path:
+    sys.path.insert(0, COMMON_DIR)
+
+from vpl_ir import load_artifact, save_artifact, load_ir, save_ir, is_ir_file  # noqa: E402
+from vpl_expr import compile_expr, Expr, ExprError, NonLinearExpr  # noqa: E402
+
+__all__ = ["load_artifact", "save_artifact", "load_ir", "save_ir", "is_ir_file",
+           "compile_expr", "Expr", "ExprError", "NonLinearExpr"]
@@ -0,0 +1,124 @@
+"""
+block_graph.py
+Compact control-flow block graph shared by the translator and the expander.
+
+Blocks get consecutive integer indices in insertion order (the control
+dimension index used by the phasor model); string ids are resolved once
+through a dict. Edges are kept as two flat integer arrays and turned into a
+CSR adjacency (successor lists) on demand.
+
+JSON form (translated.json) is unchanged:
+    {"blocks": [{"id", "type", "params"}, ...],
+     "connections": [{"from": id, "to": id}, ...]}
+"""
+
+class Block:
+    __slots__ = ("idx", "id", "type", "params")
+
+    def __init__(self, idx, block_id, block_type, params):
+        self.idx = idx
+        self.id = block_id
+        self.type = block_type
+        self.params = params
+
+    def to_dict(self):
+        return {"id": self.id, "type": self.type, "params": self.params}
+
+class BlockGraph:
+    def __init__(self):
+        self.blocks = []
+        self.index = {}        # block id -> idx
+        self.src = []
+        self.dst = []
+        self._csr = None
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __contains__(self, block_id):
+        return block_id in self.index
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def get(self, block_id):
+        idx = self.index.get(block_id)
+        return None if idx is None else self.blocks[idx]
+
+    def unique_id(self, block_id):
+        """block_id, or block_id_1, block_id_2, ... if it is already taken."""
+        if block_id not in self.index:
+            return block_id
+        k = 1
+        while f"{block_id}_{k}" in self.index:
+            k += 1
+        return f"{block_id}_{k}"
+
+    def add(self, block_id, block_type, params):
+        """
+        Append a block and return its id. A repeated id (e.g. init_x of a
+        redeclared variable) is suffixed with _1, _2, ... to stay unique.
+        """
+        block_id = self.unique_id(block_id)
+        idx = len(self.blocks)
+        self.index[block_id] = idx
+        self.blocks.append(Block(idx, block_id, block_type, params))
+        self._csr = None
+        return block_id
+
+    def connect(self, from_id, to_id):
+        self.src.append(self.index[from_id])
+        self.dst.append(self.index[to_id])
+        self._csr = None
+
+    def adjacency(self):
+        """
+        (indptr, indices) of the successor lists: the successors of block i
+        are indices[indptr[i]:indptr[i+1]], sorted, without duplicates.
+        """
+        if self._csr is None:
+            n = len(self.blocks)
+            rows = [[] for _ in range(n)]
+            for s, d in zip(self.src, self.dst):
+                rows[s].append(d)
+            indptr = [0]
+            indices = []
+            for row in rows:
+                indices.extend(sorted(set(row)))
+                indptr.append(len(indices))
+            self._csr = (indptr, indices)
+        return self._csr
+
+    def successors(self, block_id):
+        """Ids of the blocks block_id connects to."""
+        indptr, indices = self.adjacency()
+        i = self.index[block_id]
+        return [self.blocks[j].id for j in indices[indptr[i]:indptr[i + 1]]]
+
+    def control_matrix(self):
+        """Adjacency as a CSR matrix dict (see phasor_matrix), M[src][dst] = 1."""
+        indptr, indices = self.adjacency()
+        n = len(self.blocks)
+        return {
+            "format": "csr",
+            "shape": [n, n],
+            "data": [1.0] * len(indices),
+            "indices": list(indices),
+            "indptr": list(indptr)
+        }
+
+    def to_dict(self):
+        return {
+            "blocks": [b.to_dict() for b in self.blocks],
+            "connections": [{"from": self.blocks[s].id, "to": self.blocks[d].id}
+                            for s, d in zip(self.src, self.dst)]
+        }
+
+    @classmethod
+    def from_dict(cls, translated):
+        graph = cls()
+        for blk in translated.get("blocks", []):
+            graph.add(blk["id"], blk["type"], blk.get("params", {}))
+        for conn in translated.get("connections", []):
+            graph.connect(conn["from"], conn["to"])
+        return graph
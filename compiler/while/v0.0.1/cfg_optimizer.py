@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+cfg_optimizer.py
+Control-flow optimizations on expanded.json, run between expander.py and
+phasor_transformer.py to shrink the control part of the phasor state vector.
+
+  1. init_var blocks are folded away: their values already reach c_full
+     through the "init" atomic ops, so they need no control dimension.
+     The entry becomes the block the init chain hands control to.
+  2. Blocks unreachable from the entry are dropped, with their atomic ops.
+  3. Straight-line chains (a -> b where a is b's only predecessor and b is
+     a's only successor) are merged into one basic block, named after its
+     first block.
+
+The output has the same layout as expanded.json, with the entry block at
+control index 0, plus "merged_into" (original block id -> basic block id,
+null for removed blocks). Atomic ops refer to their basic block.
+
+Usage:
+    python cfg_optimizer.py expanded.json optimized.json
+"""
+import sys
+from vpl_common import load_artifact, save_artifact
+from phasor_matrix import csr_from_rows, iter_nonzeros
+
+def optimize_cfg(expanded):
+    id_to_idx = expanded["id_to_idx"]
+    c_global = expanded["c_global"]
+    atomic_ops = expanded["atomic_ops"]
+    ids = sorted(id_to_idx, key=id_to_idx.get)
+    n = len(ids)
+
+    succ = [[] for _ in range(n)]
+    for i, j, v in iter_nonzeros(expanded["M_global"]):
+        if v != 0:
+            succ[i].append(j)
+
+    # 1. Fold init blocks, find the entry
+    init_ids = {op["block"] for op in atomic_ops if op["op"] == "init" and "block" in op}
+    init_ids |= {bid for bid in ids if bid.startswith("init_")}
+    is_init = [bid in init_ids for bid in ids]
+    entry = None
+    for i in range(n):
+        if not is_init[i]:
+            break
+        for j in succ[i]:
+            if not is_init[j]:
+                entry = j
+    if entry is None:
+        entry = next((i for i in range(n) if not is_init[i]), None)
+
+    # 2. Reachability from the entry
+    reachable = [False] * n
+    if entry is not None:
+        reachable[entry] = True
+        stack = [entry]
+        while stack:
+            i = stack.pop()
+            for j in succ[i]:
+                if not reachable[j] and not is_init[j]:
+                    reachable[j] = True
+                    stack.append(j)
+
+    preds = [set() for _ in range(n)]
+    for i in range(n):
+        if reachable[i]:
+            for j in succ[i]:
+                if reachable[j]:
+                    preds[j].add(i)
+
+    # 3. Merge straight-line chains: b joins its only predecessor a when b is
+    # also a's only successor; head[i] is the first block of i's chain
+    link = [None] * n
+    for j in range(n):
+        if reachable[j] and j != entry and len(preds[j]) == 1:
+            (i,) = preds[j]
+            if i != j and set(succ[i]) == {j}:
+                link[j] = i
+    head = list(range(n))
+    for j in range(n):
+        k = j
+        while link[k] is not None:
+            k = link[k]
+        head[j] = k
+
+    # New control indices: entry first, then the remaining heads in order
+    heads = [i for i in range(n) if reachable[i] and head[i] == i]
+    if entry is not None:
+        heads.remove(entry)
+        heads.insert(0, entry)
+    new_idx = {h: k for k, h in enumerate(heads)}
+
+    merged_into = {}
+    for i, bid in enumerate(ids):
+        merged_into[bid] = ids[head[i]] if reachable[i] else None
+
+    rows = {}
+    for i in range(n):
+        if not reachable[i]:
+            continue
+        src = new_idx[head[i]]
+        for j in succ[i]:
+            # edges into chain members are internal to their basic block
+            if reachable[j] and head[j] == j:
+                rows.setdefault(src, {})[new_idx[j]] = 1.0
+
+    new_c_global = [[] for _ in heads]
+    for i in range(n):
+        if reachable[i] and c_global[i]:
+            new_c_global[new_idx[head[i]]].append(c_global[i])
+    new_c_global = ["; ".join(exprs) for exprs in new_c_global]
+
+    new_ops = []
+    for op in atomic_ops:
+        if "block" in op and op["op"] != "init":
+            target = merged_into.get(op["block"], op["block"])
+            if target is None:
+                continue
+            op = dict(op, block=target)
+        new_ops.append(op)
+
+    m = len(heads)
+    optimized = dict(expanded)
+    optimized.update({
+        "M_global": csr_from_rows(rows, m, m),
+        "c_global": new_c_global,
+        "atomic_ops": new_ops,
+        "id_to_idx": {ids[h]: k for k, h in enumerate(heads)},
+        "merged_into": merged_into
+    })
+    return optimized
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python cfg_optimizer.py <expanded.json> <optimized.json>")
+        sys.exit(1)
+
+    expanded = load_artifact(sys.argv[1])
+    optimized = optimize_cfg(expanded)
+    save_artifact(sys.argv[2], optimized)
+
+    print(f"✅ CFG optimized: {len(expanded['id_to_idx'])} -> {len(optimized['id_to_idx'])} "
+          f"control blocks. Output saved to {sys.argv[2]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Shared fixtures for the while-pipeline tests (run with python -m pytest)."""
+import pytest
+
+from extractor import extract_from_source
+from translator import translate_program
+from expander import expand_blocks
+from cfg_optimizer import optimize_cfg
+from dataflow import optimize_dataflow
+from phasor_transformer import transform_to_phasor
+
+COUNTER = """
+#include <stdio.h>
+
+int main() {
+    int x = 0;
+    while (x < 5) {
+        x = x + 2;
+    }
+    printf("%d\\n", x);
+    return 0;
+}
+"""
+
+def compile_source(source, optimize=True):
+    """C source -> phasor_transformed dict, through every compiler stage."""
+    expanded = expand_blocks(translate_program(extract_from_source(source)))
+    if optimize:
+        expanded = optimize_dataflow(optimize_cfg(expanded))
+    return transform_to_phasor(expanded)
+
+@pytest.fixture
+def compile_program():
+    return compile_source
+
+@pytest.fixture
+def counter_phasor():
+    return compile_source(COUNTER, optimize=False)
+
+@pytest.fixture
+def counter_source():
+    return COUNTER
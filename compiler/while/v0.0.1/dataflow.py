@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+dataflow.py
+Data-space optimizations on expanded.json (after cfg_optimizer.py, before
+phasor_transformer.py), so that only variables the program really needs
+become data dimensions of M_full and registers of the generated Verilog.
+
+  1. Invariant hoisting: a variable that is never assigned and has a numeric
+     init value is a constant. Its uses in expressions and conditions are
+     replaced by the value and it leaves addr_list.
+  2. Dead-variable elimination: a variable is live when a loop condition or
+     a print reads it, or when a live variable's assignment reads it.
+     Assignments to dead variables are dropped and dead variables leave
+     addr_list.
+
+The output keeps the expanded.json layout and adds "constants"
+({name: value}) and "dead_vars".
+
+Usage:
+    python dataflow.py expanded.json optimized.json
+"""
+import re
+import sys
+from vpl_common import load_artifact, save_artifact
+from expander import parse_expr
+
+_NUMBER_RE = re.compile(r'^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$')
+
+def find_constants(atomic_ops):
+    """{name: init text} for variables with a numeric init that are never assigned."""
+    assigned = {op["target"] for op in atomic_ops if op["op"] == "assign"}
+    consts = {}
+    for op in atomic_ops:
+        if op["op"] == "init" and op["var"] not in assigned:
+            value = str(op["value"]).strip()
+            if _NUMBER_RE.match(value):
+                consts[op["var"]] = value
+    return consts
+
+def substituter(consts):
+    """Function replacing every constant name in an expression by its value, in one pass."""
+    if not consts:
+        return lambda expr: expr
+    names = sorted(consts, key=len, reverse=True)
+    pattern = re.compile(r'\b(' + '|'.join(map(re.escape, names)) + r')\b')
+    values = {name: (f"({v})" if v[0] in "+-" else v) for name, v in consts.items()}
+    return lambda expr: pattern.sub(lambda m: values[m.group(1)], expr)
+
+def live_variables(atomic_ops):
+    """Variables read by conditions and prints, closed over the assignments feeding them."""
+    live = set()
+    for op in atomic_ops:
+        if op["op"] == "while_cond":
+            live.update(parse_expr(op["cond"]))
+        elif op["op"] == "print":
+            live.add(op["var"])
+
+    reads = {}
+    for op in atomic_ops:
+        if op["op"] == "assign":
+            reads.setdefault(op["target"], set()).update(parse_expr(op["expr"]))
+
+    stack = list(live)
+    while stack:
+        for v in reads.get(stack.pop(), ()):
+            if v not in live:
+                live.add(v)
+                stack.append(v)
+    return live
+
+def optimize_dataflow(expanded):
+    atomic_ops = expanded["atomic_ops"]
+
+    consts = find_constants(atomic_ops)
+    subst = substituter(consts)
+
+    ops = []
+    for op in atomic_ops:
+        if op["op"] == "init" and op["var"] in consts:
+            continue
+        if op["op"] == "assign":
+            op = dict(op, expr=subst(op["expr"]))
+        elif op["op"] == "while_cond":
+            op = dict(op, cond=subst(op["cond"]))
+        ops.append(op)
+
+    live = live_variables(ops)
+    dead = [v for v in expanded["addr_list"] if v not in live and v not in consts]
+    ops = [op for op in ops
+           if not (op["op"] == "assign" and op["target"] not in live)
+           and not (op["op"] == "init" and op["var"] not in live)]
+
+    optimized = dict(expanded)
+    optimized.update({
+        "addr_list": [v for v in expanded["addr_list"] if v in live and v not in consts],
+        "c_global": [subst(c) for c in expanded["c_global"]],
+        "atomic_ops": ops,
+        "constants": {name: float(v) for name, v in consts.items()},
+        "dead_vars": dead
+    })
+    return optimized
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python dataflow.py <expanded.json> <optimized.json>")
+        sys.exit(1)
+
+    expanded = load_artifact(sys.argv[1])
+    optimized = optimize_dataflow(expanded)
+    save_artifact(sys.argv[2], optimized)
+
+    print(f"✅ Dataflow optimized: {len(expanded['addr_list'])} -> {len(optimized['addr_list'])} "
+          f"data variables. Output saved to {sys.argv[2]}")
+
+if __name__ == "__main__":
+    main()
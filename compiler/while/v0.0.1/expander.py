@@ -1,113 +1,112 @@
-import json
 import sys
 import re
+from vpl_common import load_artifact, save_artifact, compile_expr, ExprError
+
+from block_graph import BlockGraph
 
 def load_translated(file_path):
-    with open(file_path, 'r') as f:
-        return json.load(f)
+    return load_artifact(file_path)
 
 def save_expanded(output_path, expanded):
-    with open(output_path, 'w') as f:
-        json.dump(expanded, f, indent=2)
+    save_artifact(output_path, expanded)
 
 def parse_expr(expr):
     """Extract variables used in an expression like 'x + 2'."""
-    # crude parse for identifiers
-    tokens = re.findall(r'[a-zA-Z_]\w*', expr)
-    return tokens
+    try:
+        return list(compile_expr(expr).variables)
+    except ExprError:
+        # not in the expression grammar: crude parse for identifiers
+        return re.findall(r'[a-zA-Z_]\w*', expr)
 
 def expand_blocks(translated):
-    blocks = translated.get("blocks", [])
-    connections = translated.get("connections", [])
+    graph = BlockGraph.from_dict(translated)
 
     addr_list = []          # All variable names encountered
-    M_global = []           # Control matrix rows
+    addr_index = {}         # name -> position in addr_list
     c_global = []           # Constants or expressions
     atomic_ops = []         # Expanded low-level ops
 
-    # Map each block ID to index for control matrix
-    id_to_idx = {blk["id"]: idx for idx, blk in enumerate(blocks)}
+    def use(varname):
+        if varname not in addr_index:
+            addr_index[varname] = len(addr_list)
+            addr_list.append(varname)
 
     # Create initial variable space
-    for blk in blocks:
-        if blk["type"] == "init_var":
-            varname = blk["params"]["name"]
-            if varname not in addr_list:
-                addr_list.append(varname)
+    for blk in graph:
+        if blk.type == "init_var":
+            varname = blk.params["name"]
+            use(varname)
             atomic_ops.append({
                 "op": "init",
                 "var": varname,
-                "value": blk["params"]["init"]
+                "value": blk.params["init"],
+                "block": blk.id
             })
 
     # Now handle assign and while
-    for blk in blocks:
-        btype = blk["type"]
-        bid = blk["id"]
+    for blk in graph:
+        btype = blk.type
+        bid = blk.id
         if btype == "assign":
-            target = blk["params"]["target"]
-            expr = blk["params"]["expr"]
-
-            # ensure target in addr_list
-            if target not in addr_list:
-                addr_list.append(target)
+            target = blk.params["target"]
+            expr = blk.params["expr"]
 
-            # ensure variables in expr in addr_list
+            # ensure target and variables in expr in addr_list
+            use(target)
             for v in parse_expr(expr):
-                if v not in addr_list:
-                    addr_list.append(v)
+                use(v)
 
-            atomic_ops.append({
+            op = {
                 "op": "assign",
                 "target": target,
                 "expr": expr,
                 "block": bid
-            })
+            }
+            # init / step assignments of lowered for-loops
+            if "role" in blk.params:
+                op["role"] = blk.params["role"]
+            atomic_ops.append(op)
 
         elif btype == "while_loop":
-            cond = blk["params"]["cond"]
+            cond = blk.params["cond"]
             for v in parse_expr(cond):
-                if v not in addr_list:
-                    addr_list.append(v)
-            atomic_ops.append({
+                use(v)
+            op = {
                 "op": "while_cond",
                 "cond": cond,
                 "block": bid
-            })
+            }
+            # Lowered for-loops carry their induction variable and trip count
+            for key in ("loop_var", "trip_count"):
+                if key in blk.params:
+                    op[key] = blk.params[key]
+            atomic_ops.append(op)
 
         elif btype == "print":
-            var = blk["params"]["var"]
-            if var not in addr_list:
-                addr_list.append(var)
+            var = blk.params["var"]
+            use(var)
             atomic_ops.append({
                 "op": "print",
                 "var": var,
                 "block": bid
             })
 
-    # Control matrix M_global construction
-    n = len(blocks)
-    M_global = [[0]*n for _ in range(n)]
-    for conn in connections:
-        src = id_to_idx[conn["from"]]
-        dst = id_to_idx[conn["to"]]
-        M_global[src][dst] = 1
-
     # c_global may store per block expressions or constants
-    for blk in blocks:
-        if blk["type"] == "assign":
-            c_global.append(blk["params"]["expr"])
-        elif blk["type"] == "while_loop":
-            c_global.append(blk["params"]["cond"])
+    for blk in graph:
+        if blk.type == "assign":
+            c_global.append(blk.params["expr"])
+        elif blk.type == "while_loop":
+            c_global.append(blk.params["cond"])
         else:
             c_global.append("")
 
     expanded = {
         "addr_list": addr_list,
-        "M_global": M_global,
+        # Control matrix (CSR, M_global[src][dst] = 1)
+        "M_global": graph.control_matrix(),
         "c_global": c_global,
         "atomic_ops": atomic_ops,
-        "id_to_idx": id_to_idx
+        "id_to_idx": dict(graph.index)
     }
     return expanded
 
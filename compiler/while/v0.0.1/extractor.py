@@ -3,9 +3,21 @@
 extractor.py (fixed)
 Reads input C file and writes structured JSON (variables + statements).
 
+The source is tokenized in one pass (lex_lines) and parsed by recursive
+descent over token indices (StatementParser), so parsing is linear in the
+size of the input, nested loops included.
+
 Usage:
     python extractor.py input.c extracted.json
 
+    # every function of a file (or of every .c file under a directory),
+    # one JSON record per line, files spread over worker processes; functions
+    # whose body is unchanged since an existing functions.jsonl are copied
+    python extractor.py --functions <file.c|dir> functions.jsonl [workers]
+
+    # reuse the unchanged statements (and their ids) of an existing extracted.json
+    python extractor.py --incremental input.c extracted.json
+
 Output format:
 {
   "variables": [{"name":"x","type":"int","init":"0"}, ...],
@@ -14,36 +26,77 @@ Output format:
     {"id":"s1","type":"print","args":["x"]}
   ]
 }
+
+Function records (--functions) add "file" and "function" keys to the above.
 """
 import re
 import json
+import hashlib
+import os
 import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from vpl_common import load_artifact, save_artifact
 
 # -----------------------
-# Utilities
+# Lexer
 # -----------------------
-def remove_comments_and_directives(code: str) -> str:
-    code = re.sub(r'/\*.*?\*/', '', code, flags=re.S)   # block comments
-    code = re.sub(r'//.*?$', '', code, flags=re.M)      # line comments
-    lines = [ln for ln in code.splitlines() if not ln.strip().startswith('#')]
-    return "\n".join(lines)
+# gap: the whitespace before the token (comments and directives removed), so
+# the original text of any token range can be rebuilt without the source.
+Token = namedtuple("Token", "kind text gap")
 
-def find_matching(code: str, start_idx: int, open_ch: str, close_ch: str) -> int:
-    depth = 0
-    L = len(code)
-    for i in range(start_idx, L):
-        ch = code[i]
-        if ch == open_ch:
-            depth += 1
-        elif ch == close_ch:
-            depth -= 1
-            if depth == 0:
-                return i
-    raise ValueError(f"No match for {open_ch} starting at {start_idx}")
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<lcomment>//.*)
+  | (?P<bcomment>/\*)
+  | (?P<ident>[A-Za-z_]\w*)
+  | (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?\w*)
+  | (?P<str>"(?:\\.|[^"\\])*")
+  | (?P<char>'(?:\\.|[^'\\])*')
+  | (?P<punct>->|\+\+|--|<<=|>>=|<<|>>|&&|\|\||[-+*/%&|^!=<>]=?|[(){}\[\];,.?:~])
+  | (?P<other>\S)
+""", re.X)
+
+def lex_lines(lines):
+    """
+    Tokenize C source given as an iterable of lines (e.g. an open file) in a
+    single pass. Comments are skipped, preprocessor lines are dropped.
+    Yields Token(kind, text, gap).
+    """
+    gap = []
+    in_comment = False
+    for line in lines:
+        pos = 0
+        if in_comment:
+            end = line.find('*/')
+            if end == -1:
+                continue
+            in_comment = False
+            pos = end + 2
+        elif line.lstrip().startswith('#'):
+            continue
+        L = len(line)
+        while pos < L:
+            m = _TOKEN_RE.match(line, pos)
+            kind = m.lastgroup
+            pos = m.end()
+            if kind == 'ws':
+                gap.append(m.group())
+            elif kind == 'lcomment':
+                continue
+            elif kind == 'bcomment':
+                end = line.find('*/', pos)
+                if end == -1:
+                    in_comment = True
+                    break
+                pos = end + 2
+            else:
+                yield Token(kind, m.group(), "".join(gap))
+                gap = []
 
 class IDGen:
-    def __init__(self, prefix="s"):
-        self.n = 0
+    def __init__(self, prefix="s", start=0):
+        self.n = start
         self.pref = prefix
     def next(self):
         val = f"{self.pref}{self.n}"
@@ -53,41 +106,79 @@ class IDGen:
 # -----------------------
 # Parsing primitives
 # -----------------------
-def extract_main_body(code: str) -> str:
+DECL_TYPES = ("int", "float", "double")
+
+def tokens_text(tokens, lo, hi):
+    """Source text of tokens[lo:hi], without leading/trailing whitespace."""
+    if lo >= hi:
+        return ""
+    parts = [tokens[lo].text]
+    for k in range(lo + 1, hi):
+        parts.append(tokens[k].gap)
+        parts.append(tokens[k].text)
+    return "".join(parts)
+
+_CLOSERS = {'(': ')', '{': '}', '[': ']'}
+
+def tokens_hash(tokens, lo, hi):
+    """Content hash of tokens[lo:hi] (whitespace and comments do not count)."""
+    h = hashlib.sha1()
+    for k in range(lo, hi):
+        h.update(tokens[k].text.encode())
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+def match_brackets(tokens):
     """
-    Try to find the main() function body. If found, return the interior of braces.
-    Otherwise return the whole code.
+    One pass over the tokens pairing every (, { and [ with its closer.
+    Returns a list where match[i] is the index of the partner of tokens[i]
+    (-1 for non-bracket or unmatched tokens).
     """
-    m = re.search(r'\bint\s+main\b[^{]*\{', code)
-    if not m:
-        m = re.search(r'\bmain\b[^{]*\{', code)
-    if not m:
-        return code
-    brace_start = code.find('{', m.start())
-    brace_end = find_matching(code, brace_start, '{', '}')
-    return code[brace_start+1:brace_end]
-
-def collect_var_decls(body: str):
+    match = [-1] * len(tokens)
+    stack = []
+    for i, t in enumerate(tokens):
+        if t.kind != 'punct':
+            continue
+        if t.text in _CLOSERS:
+            stack.append(i)
+        elif t.text in (')', '}', ']'):
+            # pop to the nearest opener of the same kind (tolerates stray closers)
+            for k in range(len(stack) - 1, -1, -1):
+                if _CLOSERS[tokens[stack[k]].text] == t.text:
+                    o = stack[k]
+                    del stack[k:]
+                    match[o] = i
+                    match[i] = o
+                    break
+    return match
+
+def find_main_body(tokens, match):
     """
-    Collect declarations inside body like:
-      int x;
-      int x = 0;
-    Returns list of var dicts and body with these declarations removed.
+    Token range (lo, hi) of the main() body interior (match: see match_brackets).
+    If there is no main(), the whole token list.
     """
-    vars_found = []
-    # Match simple single declarations only (no comma lists)
-    pat = re.compile(r'\b(int|float|double)\s+([A-Za-z_]\w*)(\s*=\s*([^;]+))?\s*;')
-    def repl(m):
-        typ = m.group(1)
-        name = m.group(2)
-        init = m.group(4)
-        entry = {"name": name, "type": typ}
-        if init is not None:
-            entry["init"] = init.strip()
-        vars_found.append(entry)
-        return ''  # remove declaration from body
-    new_body = pat.sub(repl, body)
-    return vars_found, new_body
+    first = None
+    idx = None
+    for i, t in enumerate(tokens):
+        if t.kind == 'ident' and t.text == 'main':
+            if i > 0 and tokens[i - 1].text == 'int':
+                idx = i
+                break
+            if first is None:
+                first = i
+    if idx is None:
+        idx = first
+    if idx is None:
+        return 0, len(tokens)
+    for b in range(idx, len(tokens)):
+        if tokens[b].text == '{':
+            return b + 1, _matching(tokens, match, b)
+    return 0, len(tokens)
+
+def _matching(tokens, match, i):
+    if match[i] < 0:
+        raise ValueError(f"No match for {tokens[i].text} starting at token {i}")
+    return match[i]
 
 def parse_simple_statement(piece: str):
     piece = piece.strip()
@@ -118,118 +209,223 @@ def parse_simple_statement(piece: str):
     # fallback raw
     return {"type": "raw", "stmt": piece}
 
-def tokenize_statements(code: str, idgen: IDGen):
+class StatementParser:
     """
-    Tokenize the code inside a function body into sequential statements.
-    This handles:
+    Recursive-descent parser over token indices (no source slicing).
+    Handles:
       - while (...) { ... } (nested)
       - for (...) { ... } (skeleton)
-      - semicolon-terminated statements (respecting parentheses and string quotes)
-    Returns a list of statement dicts with 'id' fields assigned.
+      - int/float/double declarations (collected into self.variables)
+      - semicolon-terminated statements (respecting parentheses)
     """
-    stmts = []
-    i = 0
-    L = len(code)
-    while i < L:
-        # skip whitespace
-        while i < L and code[i].isspace():
-            i += 1
-        if i >= L:
-            break
-
-        # detect 'while' keyword
-        if code.startswith('while', i) and (i+5==L or not code[i+5].isalnum()):
-            paren_start = code.find('(', i)
-            if paren_start == -1:
-                raise SyntaxError("Malformed while: missing '('")
-            paren_end = find_matching(code, paren_start, '(', ')')
-            cond = code[paren_start+1:paren_end].strip()
-            # find body '{...}'
-            brace_start = code.find('{', paren_end)
-            if brace_start == -1:
-                raise SyntaxError("Malformed while: missing '{'")
-            brace_end = find_matching(code, brace_start, '{', '}')
-            body_code = code[brace_start+1:brace_end]
-            body_stmts = tokenize_statements(body_code, idgen)
-            stmts.append({"id": idgen.next(), "type": "while", "cond": cond, "body": body_stmts})
-            i = brace_end + 1
-            continue
 
-        # detect 'for' keyword (simple handling)
-        if code.startswith('for', i) and (i+3==L or not code[i+3].isalnum()):
-            paren_start = code.find('(', i)
-            if paren_start == -1:
-                raise SyntaxError("Malformed for: missing '('")
-            paren_end = find_matching(code, paren_start, '(', ')')
-            header = code[paren_start+1:paren_end].strip()
-            brace_start = code.find('{', paren_end)
-            if brace_start == -1:
-                raise SyntaxError("Malformed for: missing '{'")
-            brace_end = find_matching(code, brace_start, '{', '}')
-            body_code = code[brace_start+1:brace_end]
-            body_stmts = tokenize_statements(body_code, idgen)
-            stmts.append({"id": idgen.next(), "type": "for", "header": header, "body": body_stmts})
-            i = brace_end + 1
-            continue
+    def __init__(self, tokens, idgen: IDGen, match=None):
+        self.tokens = tokens
+        self.idgen = idgen
+        self.match = match if match is not None else match_brackets(tokens)
+        self.variables = []
+
+    def loop(self, i, hi, kind):
+        """Parse 'kind (header) { body }' at tokens[i]; returns (header, body, next index)."""
+        toks = self.tokens
+        p = i + 1
+        if p >= hi or toks[p].text != '(':
+            raise SyntaxError(f"Malformed {kind}: missing '('")
+        pe = _matching(toks, self.match, p)
+        b = pe + 1
+        if b >= hi or toks[b].text != '{':
+            raise SyntaxError(f"Malformed {kind}: missing '{{'")
+        be = _matching(toks, self.match, b)
+        body = self.statements(b + 1, be)
+        return tokens_text(toks, p + 1, pe), body, be + 1
 
-        # otherwise find semicolon that is top-level (not inside parentheses or string)
+    def declaration(self, i, hi):
+        """
+        Simple single declaration 'type name;' or 'type name = init;' at tokens[i].
+        Returns the index after it, or None if tokens[i] does not start one.
+        """
+        toks = self.tokens
+        if toks[i].text not in DECL_TYPES or i + 2 >= hi or toks[i + 1].kind != 'ident':
+            return None
+        entry = {"name": toks[i + 1].text, "type": toks[i].text}
+        j = i + 2
+        if toks[j].text == '=':
+            k = j + 1
+            while k < hi and toks[k].text != ';':
+                k += 1
+            if k >= hi or k == j + 1:
+                return None
+            entry["init"] = tokens_text(toks, j + 1, k)
+            j = k
+        if toks[j].text != ';':
+            return None
+        self.variables.append(entry)
+        return j + 1
+
+    def simple_end(self, i, hi):
+        """Index of the top-level ';' ending the statement at tokens[i] (or hi)."""
+        toks = self.tokens
         j = i
         paren_depth = 0
-        in_string = False
-        string_char = ''
-        while j < L:
-            ch = code[j]
-            if in_string:
-                if ch == string_char:
-                    in_string = False
-                    string_char = ''
-                # support escaped quotes "\""
-                elif ch == '\\' and j+1 < L:
-                    j += 2
-                    continue
-            else:
-                if ch == '"' or ch == "'":
-                    in_string = True
-                    string_char = ch
-                elif ch == '(':
+        while j < hi:
+            tt = toks[j]
+            if tt.kind == 'punct':
+                if tt.text == '(':
                     paren_depth += 1
-                elif ch == ')':
+                elif tt.text == ')':
                     if paren_depth > 0:
                         paren_depth -= 1
-                elif ch == ';' and paren_depth == 0:
+                elif tt.text == ';' and paren_depth == 0:
                     break
             j += 1
+        return j
+
+    def statement_end(self, i, hi):
+        """Index just past the (non-declaration) statement starting at tokens[i]."""
+        toks = self.tokens
+        if toks[i].kind == 'ident' and toks[i].text in ('while', 'for'):
+            p = i + 1
+            if p < hi and toks[p].text == '(' and self.match[p] + 1 < hi:
+                b = self.match[p] + 1
+                if toks[b].text == '{' and self.match[b] > 0:
+                    return self.match[b] + 1
+        return self.simple_end(i, hi) + 1
+
+    def statement(self, i, hi):
+        """Parse the statement at tokens[i]; returns (stmt dict or None, next index)."""
+        toks = self.tokens
+        t = toks[i]
+        if t.kind == 'ident' and t.text == 'while':
+            cond, body, i = self.loop(i, hi, 'while')
+            return {"id": self.idgen.next(), "type": "while", "cond": cond, "body": body}, i
+        if t.kind == 'ident' and t.text == 'for':
+            header, body, i = self.loop(i, hi, 'for')
+            return {"id": self.idgen.next(), "type": "for", "header": header, "body": body}, i
+
+        after_decl = self.declaration(i, hi)
+        if after_decl is not None:
+            return None, after_decl
+
+        # otherwise find semicolon that is top-level (not inside parentheses)
+        j = self.simple_end(i, hi)
+        piece = tokens_text(toks, i, j)
+        if not piece:
+            return None, j + 1
+        parsed = parse_simple_statement(piece)
+        parsed["id"] = self.idgen.next()
+        return parsed, j + 1  # skip the semicolon
 
-        if j >= L:
-            # trailing piece without semicolon
-            piece = code[i:].strip()
-            i = L
-        else:
-            piece = code[i:j].strip()
-            i = j + 1  # skip the semicolon
-
-        if piece:
-            parsed = parse_simple_statement(piece)
-            parsed["id"] = idgen.next()
-            stmts.append(parsed)
-        # continue loop
-    return stmts
+    def statements(self, lo, hi):
+        """Parse tokens[lo:hi] into a list of statement dicts with 'id' fields."""
+        stmts = []
+        i = lo
+        while i < hi:
+            stmt, i = self.statement(i, hi)
+            if stmt is not None:
+                stmts.append(stmt)
+        return stmts
+
+    def collect_declarations(self, lo, hi):
+        """Record the declarations inside tokens[lo:hi] without parsing statements."""
+        toks = self.tokens
+        i = lo
+        while i < hi:
+            if toks[i].text == '(':
+                # loop headers ('for (int i = 0; ...)') declare nothing
+                i = _matching(toks, self.match, i) + 1
+                continue
+            after_decl = self.declaration(i, hi)
+            i = after_decl if after_decl is not None else i + 1
+
+    def statements_incremental(self, lo, hi, previous):
+        """
+        Like statements(), but every top-level statement gets a "hash" of its
+        tokens, and statements whose hash appears in `previous`
+        ({hash: [stmt, ...]}) are reused as-is (ids included) instead of being
+        parsed again. Returns (stmts, ids of newly parsed statements).
+        """
+        toks = self.tokens
+        stmts = []
+        changed = []
+        i = lo
+        while i < hi:
+            after_decl = self.declaration(i, hi)
+            if after_decl is not None:
+                i = after_decl
+                continue
+            end = min(self.statement_end(i, hi), hi)
+            h = tokens_hash(toks, i, end)
+            reusable = previous.get(h)
+            if reusable:
+                stmt = reusable.pop(0)
+                self.collect_declarations(i, end)
+                i = end
+            else:
+                stmt, i = self.statement(i, hi)
+                if stmt is None:
+                    continue
+                changed.append(stmt["id"])
+            stmt["hash"] = h
+            stmts.append(stmt)
+        return stmts, changed
 
 # -----------------------
 # Top-level extract
 # -----------------------
 def extract_from_file(inpath: str):
     with open(inpath, 'r') as f:
-        raw = f.read()
-    cleaned = remove_comments_and_directives(raw)
-    main_body = extract_main_body(cleaned)
+        tokens = list(lex_lines(f))
+    return extract_from_tokens(tokens)
 
-    # collect variable declarations and remove them from main body
-    vars_found, body_no_decls = collect_var_decls(main_body)
+def extract_from_source(raw: str):
+    return extract_from_tokens(list(lex_lines(raw.splitlines(keepends=True))))
 
-    # tokenize statements with id generator
-    idgen = IDGen()
-    stmts = tokenize_statements(body_no_decls, idgen)
+def extract_from_tokens(tokens):
+    match = match_brackets(tokens)
+    lo, hi = find_main_body(tokens, match)
+    return program_from_tokens(tokens, lo, hi, match)
+
+def extract_incremental(inpath: str, previous=None):
+    """
+    Re-extract a file, reusing the unchanged top-level statements of a
+    previous incremental extraction together with their ids and subtrees.
+    Newly parsed statements get ids after the largest previous one.
+    The program gets a "hash" on every top-level statement and a "changed"
+    list with the ids of the statements that were parsed again.
+    """
+    with open(inpath, 'r') as f:
+        tokens = list(lex_lines(f))
+    match = match_brackets(tokens)
+    lo, hi = find_main_body(tokens, match)
+    return program_from_tokens(tokens, lo, hi, match, previous or {"statements": []})
+
+def _max_stmt_id(stmts):
+    top = -1
+    for s in stmts:
+        m = re.match(r'^s(\d+)$', s.get("id", ""))
+        if m:
+            top = max(top, int(m.group(1)))
+        top = max(top, _max_stmt_id(s.get("body", [])))
+    return top
+
+def program_from_tokens(tokens, lo, hi, match=None, previous=None):
+    """
+    Build the {"variables", "statements"} program for tokens[lo:hi].
+    With a previous program, parse incrementally (see extract_incremental).
+    """
+    if previous is None:
+        # parse statements, collecting variable declarations on the way
+        parser = StatementParser(tokens, IDGen(), match)
+        stmts = parser.statements(lo, hi)
+        changed = None
+    else:
+        by_hash = {}
+        for s in previous.get("statements", []):
+            if "hash" in s:
+                by_hash.setdefault(s["hash"], []).append(s)
+        parser = StatementParser(tokens, IDGen(start=_max_stmt_id(previous.get("statements", [])) + 1), match)
+        stmts, changed = parser.statements_incremental(lo, hi, by_hash)
+    vars_found = parser.variables
 
     # Ensure variables include assignment targets not declared
     names = {v["name"] for v in vars_found}
@@ -244,12 +440,158 @@ def extract_from_file(inpath: str):
                 names.add(s["target"])
 
     program = {"variables": vars_found, "statements": stmts}
+    if changed is not None:
+        program["changed"] = changed
     return program
 
+# -----------------------
+# Many functions / many files
+# -----------------------
+def iter_function_tokens(tokens):
+    """
+    Split a token stream into file-scope function definitions.
+    Yields (name, body_tokens) as soon as each function's closing brace is
+    read; only the current function is held in memory.
+    """
+    head = []        # tokens since the last file-scope ';' or '}'
+    body = None      # tokens of the current function body
+    name = None
+    depth = 0
+    for t in tokens:
+        if depth == 0:
+            if t.text == '{':
+                depth = 1
+                # 'name ( ... ) {' is a function, anything else (struct, initializer) is skipped
+                if head and head[-1].text == ')':
+                    p = next((k for k, h in enumerate(head) if h.text == '('), 0)
+                    if p > 0 and head[p - 1].kind == 'ident':
+                        name = head[p - 1].text
+                        body = []
+                head = []
+            elif t.text == ';':
+                head = []
+            else:
+                head.append(t)
+            continue
+
+        if t.text == '{':
+            depth += 1
+        elif t.text == '}':
+            depth -= 1
+            if depth == 0:
+                if body is not None:
+                    yield name, body
+                body = None
+                name = None
+                continue
+        if body is not None:
+            body.append(t)
+
+def iter_extract_functions(inpath: str, previous=None):
+    """
+    Stream one program record per function defined in a C file.
+    Each record carries a "hash" of the function body; with previous
+    ({(file, function name): record}) a function of this file whose hash is
+    unchanged is yielded from previous without being parsed.
+    """
+    previous = previous or {}
+    with open(inpath, 'r') as f:
+        for name, body in iter_function_tokens(lex_lines(f)):
+            h = tokens_hash(body, 0, len(body))
+            old = previous.get((inpath, name))
+            if old is not None and old.get("hash") == h:
+                yield old
+                continue
+            program = program_from_tokens(body, 0, len(body))
+            record = {"file": inpath, "function": name, "hash": h}
+            record.update(program)
+            yield record
+
+def _extract_file_lines(inpath, previous=None):
+    """Worker: all function records of one file, as JSON lines."""
+    try:
+        return [json.dumps(r) for r in iter_extract_functions(inpath, previous)]
+    except Exception as e:
+        return [json.dumps({"file": inpath, "error": f"{type(e).__name__}: {e}"})]
+
+def load_function_records(path):
+    """{(file, function): record} of an existing --functions output, {} if there is none."""
+    previous = {}
+    if not os.path.exists(path):
+        return previous
+    with open(path, 'r') as f:
+        for line in f:
+            record = json.loads(line)
+            if "function" in record:
+                previous[(record["file"], record["function"])] = record
+    return previous
+
+def c_files(path):
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for root, _, files in os.walk(path):
+        found.extend(os.path.join(root, f) for f in sorted(files) if f.endswith('.c'))
+    return sorted(found)
+
+def extract_functions(path, out, workers=None, previous=None):
+    """
+    Write every function of a C file / directory tree as JSON lines to out
+    (a writable text file). A single file is streamed record by record;
+    several files are spread over a process pool, one file per task.
+    previous ({(file, function): record}, see load_function_records) lets
+    unchanged functions be copied instead of parsed again.
+    Returns the number of records written.
+    """
+    previous = previous or {}
+    files = c_files(path)
+    n = 0
+    if len(files) == 1:
+        for record in iter_extract_functions(files[0], previous):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            n += 1
+        return n
+    by_file = {}
+    for key, record in previous.items():
+        by_file.setdefault(key[0], {})[key] = record
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_extract_file_lines, f, by_file.get(f)) for f in files]
+        for fut in as_completed(futures):
+            for line in fut.result():
+                out.write(line + "\n")
+                n += 1
+            out.flush()
+    return n
+
 # -----------------------
 # CLI
 # -----------------------
 if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--functions":
+        if len(sys.argv) < 4:
+            print("Usage: python extractor.py --functions <file.c|dir> functions.jsonl [workers]")
+            sys.exit(1)
+        workers = int(sys.argv[4]) if len(sys.argv) >= 5 else None
+        previous = load_function_records(sys.argv[3])
+        with open(sys.argv[3], "w") as out:
+            n = extract_functions(sys.argv[2], out, workers, previous)
+        print(f"[extractor] ✅ Wrote {sys.argv[3]} ({n} function records)")
+        sys.exit(0)
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "--incremental":
+        if len(sys.argv) < 4:
+            print("Usage: python extractor.py --incremental input.c extracted.json")
+            sys.exit(1)
+        infile, outfile = sys.argv[2], sys.argv[3]
+        previous = None
+        if os.path.exists(outfile):
+            previous = load_artifact(outfile)
+        prog = extract_incremental(infile, previous)
+        save_artifact(outfile, prog)
+        print(f"[extractor] ✅ Wrote {outfile} (statements: {len(prog['statements'])}, changed: {len(prog['changed'])})")
+        sys.exit(0)
+
     infile = "input.c"
     outfile = "extracted.json"
     if len(sys.argv) >= 2:
@@ -259,8 +601,7 @@ if __name__ == "__main__":
 
     try:
         prog = extract_from_file(infile)
-        with open(outfile, "w") as f:
-            json.dump(prog, f, indent=2)
+        save_artifact(outfile, prog)
         print(f"[extractor] ✅ Wrote {outfile} (variables: {len(prog['variables'])}, statements: {len(prog['statements'])})")
     except Exception as e:
         print(f"[extractor] ❌ Parse error: {e}")
@@ -1,26 +1,86 @@
-import json
+import sys
 import numpy as np
+from vpl_common import load_artifact
+from phasor_matrix import to_scipy
+from trajectory_store import TrajectoryBuffer
 
-def run_phasor_simulation(phasor_data, max_steps=1000, verbose=True):
+def load_phasor_system(phasor_data):
     """
-    Simulate execution using the linear phasor system:
-        X_{t+1} = M_full @ X_t + c_full
-    stopping when constraints in C_p, c_p are violated.
+    Return (M_full, c_full, C_p, c_p). The matrices are scipy CSR matrices so
+    each step costs O(nnz) instead of O(total_dim^2).
     """
-    M_full = np.array(phasor_data["M_full"], dtype=float)
+    total_dim = phasor_data["total_dim"]
+    M_full = to_scipy(phasor_data["M_full"], total_dim)
     c_full = np.array(phasor_data["c_full"], dtype=float)
-    C_p = np.array(phasor_data["C_p"], dtype=float) if phasor_data["C_p"] else np.zeros((0, M_full.shape[0]))
-    c_p = np.array(phasor_data["c_p"], dtype=float) if phasor_data["c_p"] else np.zeros(0)
+    C_p = to_scipy(phasor_data["C_p"], total_dim)
+    c_p = np.asarray(phasor_data["c_p"], dtype=float).reshape(-1)
+    return M_full, c_full, C_p, c_p
+
+STATE_DECIMALS = 6
+
+def quantize(X, decimals=STATE_DECIMALS):
+    """Round a state for exact comparison/hashing (-0.0 is folded into 0.0)."""
+    return np.round(X, decimals) + 0.0
+
+class CycleDetector:
+    """
+    Detect revisited states along a trajectory.
+
+    Quantized states are hashed into a table of at most `capacity` entries
+    (state -> first step seen); the oldest entries are evicted first, so each
+    observe() costs one hash of the state plus O(1) amortized table work.
+    observe() returns (entry_step, period) once a state repeats, else None.
+    A period of 1 is a steady state.
+    """
+
+    def __init__(self, decimals=STATE_DECIMALS, capacity=4096):
+        self.decimals = decimals
+        self.capacity = capacity
+        self.seen = {}
+
+    def observe(self, step, X):
+        key = quantize(X, self.decimals).tobytes()
+        first = self.seen.get(key)
+        if first is not None:
+            return first, step - first
+        self.seen[key] = step
+        if len(self.seen) > self.capacity:
+            del self.seen[next(iter(self.seen))]
+        return None
+
+def iter_phasor_simulation(phasor_data, max_steps=1000, verbose=True, X0=None,
+                           info=None, cycle_capacity=4096):
+    """
+    Step the linear phasor system
+        X_{t+1} = M_full @ X_t + c_full
+    and yield (step, X) for the initial state and every state after it.
+    No history is kept.
+
+    Stops when constraints in C_p, c_p are violated, or when a state repeats
+    (steady state or periodic orbit, found by a CycleDetector). If `info` is a
+    dict it is filled with "steps", "reason" ("guard", "steady", "cycle" or
+    "max_steps") and, for repeats, "cycle_entry" and "period".
+    """
+    M_full, c_full, C_p, c_p = load_phasor_system(phasor_data)
     total_dim = phasor_data["total_dim"]
 
     control_blocks = phasor_data["addr_list"]["control_blocks"]
     data_vars = phasor_data["addr_list"]["data_vars"]
 
     # Initial state vector
-    X = np.zeros(total_dim, dtype=float)
-    X[0] = 1.0   # Start at init_x (control block 0)
+    if X0 is None:
+        X = np.zeros(total_dim, dtype=float)
+        X[0] = 1.0   # Start at init_x (control block 0)
+    else:
+        X = np.array(X0, dtype=float)
+
+    if info is None:
+        info = {}
+    info.update({"steps": max_steps, "reason": "max_steps"})
+    detector = CycleDetector(capacity=cycle_capacity)
+    detector.observe(0, X)
 
-    trajectory = [X.copy()]
+    yield 0, X
 
     for step in range(max_steps):
         # Check constraints
@@ -29,30 +89,238 @@ def run_phasor_simulation(phasor_data, max_steps=1000, verbose=True):
             if violation:
                 if verbose:
                     print(f"⛔ Stopping at step {step} due to constraint violation.")
+                info.update({"steps": step, "reason": "guard"})
                 break
 
         # Linear update
         X = M_full @ X + c_full
-        trajectory.append(X.copy())
+        yield step + 1, X
 
         if verbose:
             ctrl_state = X[:len(control_blocks)]
             data_state = X[len(control_blocks):]
             print(f"Step {step+1}: Control={ctrl_state}, Data={data_state}")
 
-        # If control goes to terminal block (optional)
-        if np.allclose(X, trajectory[-2]):
-            # steady state reached
+        # Revisited state: steady state (period 1) or periodic orbit
+        repeat = detector.observe(step + 1, X)
+        if repeat:
+            entry, period = repeat
+            reason = "steady" if period == 1 else "cycle"
             if verbose:
-                print(f"✅ Steady state reached at step {step+1}")
+                if period == 1:
+                    print(f"✅ Steady state reached at step {step+1}")
+                else:
+                    print(f"🔁 Cycle of period {period} entered at step {entry} (detected at step {step+1})")
+            info.update({"steps": step + 1, "reason": reason,
+                         "cycle_entry": entry, "period": period})
             break
 
-    return np.array(trajectory)
+def run_phasor_simulation(phasor_data, max_steps=1000, verbose=True,
+                          sink=None, every=1, control_only=False, info=None):
+    """
+    Simulate execution using the linear phasor system:
+        X_{t+1} = M_full @ X_t + c_full
+    stopping when constraints in C_p, c_p are violated.
+
+    Without a sink the trajectory is kept in memory and returned as an array.
+    With a sink (e.g. trajectory_store.NpyTrajectoryWriter) every kept state
+    is passed to sink(step, X) instead and only the final state is returned,
+    so memory stays constant.
+    Decimation: every=k keeps every k-th state (the final state is always
+    kept); control_only=True keeps only the control part of each state.
+    `info` is filled as in iter_phasor_simulation.
+    """
+    if every < 1:
+        raise ValueError(f"every must be a positive number of steps, got {every}")
+    n_ctrl = len(phasor_data["addr_list"]["control_blocks"])
+    buffer = None
+    if sink is None:
+        # A known loop trip count bounds the trajectory length (at most one
+        # pass over every control block per iteration): size the buffer once
+        capacity = 1024
+        loops = phasor_data.get("metadata", {}).get("loops")
+        if loops:
+            capacity = (max(loop["trip_count"] for loop in loops) + 1) * n_ctrl + 1
+        buffer = TrajectoryBuffer(capacity=max(1, min(max_steps + 1, capacity)))
+        sink = buffer
+
+    last_step, X = 0, None
+    last_kept = -1
+    for step, X in iter_phasor_simulation(phasor_data, max_steps, verbose, info=info):
+        last_step = step
+        if step % every == 0:
+            sink(step, X[:n_ctrl] if control_only else X)
+            last_kept = step
+    if last_kept != last_step:
+        sink(last_step, X[:n_ctrl] if control_only else X)
+
+    if buffer is not None:
+        return buffer.array()
+    return X
+
+def run_phasor_simulation_batch(phasor_data, X0, max_steps=1000, verbose=True):
+    """
+    Simulate many trajectories of the same phasor system at once.
+
+    X0 is a (batch, total_dim) matrix of starting states. Every step advances
+    all still-running rows with a single matrix-matrix product; a row stops
+    when its C_p, c_p guard is violated or it reaches a steady state, and is
+    then left out of later products.
+
+    Returns (X_final, halt_steps): the (batch, total_dim) final states and the
+    step at which each row stopped (max_steps if it never did).
+    """
+    M_full, c_full, C_p, c_p = load_phasor_system(phasor_data)
+
+    X = np.array(X0, dtype=float, ndmin=2)
+    batch = X.shape[0]
+    halt_steps = np.full(batch, max_steps, dtype=int)
+    active = np.arange(batch)
+
+    for step in range(max_steps):
+        if active.size == 0:
+            break
+        X_active = X[active]
+
+        # Per-row guard check
+        if C_p.shape[0] > 0:
+            violated = np.any((C_p @ X_active.T).T + c_p > 0, axis=1)
+            if violated.any():
+                halt_steps[active[violated]] = step
+                active = active[~violated]
+                X_active = X_active[~violated]
+
+        # Linear update of the running rows only
+        X_next = (M_full @ X_active.T).T + c_full
+        X[active] = X_next
+
+        steady = np.all(quantize(X_next) == quantize(X_active), axis=1)
+        if steady.any():
+            halt_steps[active[steady]] = step + 1
+            active = active[~steady]
+
+        if verbose:
+            print(f"Step {step+1}: {active.size}/{batch} trajectories running")
+
+    if verbose:
+        print(f"✅ Batch finished: {batch - active.size}/{batch} trajectories halted")
+
+    return X, halt_steps
+
+def _step_to_halt(phasor_data, max_steps, X0):
+    """(X_final, steps) of a plain stepped run, as run_phasor_simulation would give."""
+    info = {}
+    X = None
+    for _, X in iter_phasor_simulation(phasor_data, max_steps, verbose=False, X0=X0, info=info):
+        pass
+    return X, info["steps"]
+
+def run_phasor_jump_ahead(phasor_data, max_steps=1000, X0=None, verbose=True):
+    """
+    Jump straight to the halting state of X_{t+1} = M_full @ X_t + c_full.
+
+    k steps of the simulator are one affine map, the k-th power of the
+    augmented matrix A = [[M_full, c_full], [0, 1]] (kept sparse). The powers
+    A^(2^j) are built by repeated squaring and the first stopping step is
+    found by binary search over them, so only O(log max_steps) matrix
+    products are needed.
+
+    The search assumes the stop condition is monotone along the trajectory:
+    once the C_p, c_p guard is violated (or a steady state is reached) it stays
+    that way, as it does for counter loops. States that overflow to inf/nan
+    count as stopped, so no jump goes through them. The result is checked
+    (the state found stops, the one before it does not); when the check fails,
+    or the trajectory does not stop within max_steps (where the stepper's
+    cycle detection decides), the system is stepped instead.
+
+    Returns (X_final, steps), the same final state and step count as
+    run_phasor_simulation.
+    """
+    from scipy import sparse
+
+    M_full, c_full, C_p, c_p = load_phasor_system(phasor_data)
+    total_dim = phasor_data["total_dim"]
+
+    # Augmented matrices acting on [X, 1]
+    one = sparse.csr_matrix(([1.0], ([0], [0])), shape=(1, 1))
+    A = sparse.bmat([[M_full, sparse.csr_matrix(c_full.reshape(-1, 1))],
+                     [None, one]], format="csr")
+    C_aug = sparse.hstack([C_p, sparse.csr_matrix(c_p.reshape(-1, 1))], format="csr")
+
+    Y = np.ones(total_dim + 1)
+    if X0 is None:
+        Y[:total_dim] = 0.0
+        Y[0] = 1.0
+    else:
+        Y[:total_dim] = X0
+
+    def violated(Y):
+        return C_aug.shape[0] > 0 and np.any(C_aug @ Y > 0)
+
+    def steady(Y):
+        return np.array_equal(quantize(A @ Y), quantize(Y))
+
+    def stopped(Y):
+        return not np.all(np.isfinite(Y)) or violated(Y) or steady(Y)
+
+    if max_steps <= 0:
+        return Y[:total_dim], 0
+
+    X0 = Y[:total_dim].copy()
+
+    def fall_back(why):
+        if verbose:
+            print(f"↩️ Jump-ahead {why}, stepping instead")
+        return _step_to_halt(phasor_data, max_steps, X0)
+
+    # Powers A^(2^j) covering the last step at which the guard is checked;
+    # squaring stops at the first power that overflows
+    last = max_steps - 1
+    powers = [A]
+    with np.errstate(over="ignore", invalid="ignore"):
+        while 2 ** len(powers) <= last:
+            P = powers[-1] @ powers[-1]
+            if not np.all(np.isfinite(P.data)):
+                break
+            powers.append(P)
+
+        # Binary lifting: advance t as far as possible without stopping
+        t = 0
+        if not stopped(Y):
+            for j in reversed(range(len(powers))):
+                if t + 2 ** j > last:
+                    continue
+                Y_jump = powers[j] @ Y
+                if not stopped(Y_jump):
+                    t += 2 ** j
+                    Y = Y_jump
+            if t == last:
+                return fall_back("found no stop within max_steps")
+            # The very next step is the first one that stops
+            Y = A @ Y
+            t += 1
+            if not stopped(Y):
+                return fall_back("could not confirm the stopping step")
+
+        if not np.all(np.isfinite(Y)):
+            return fall_back("overflowed")
+
+        if violated(Y):
+            steps = t
+            if verbose:
+                print(f"⛔ Stopping at step {steps} due to constraint violation.")
+        else:
+            Y_next = A @ Y
+            steps = t + 1
+            if verbose:
+                print(f"✅ Steady state reached at step {steps}")
+            Y = Y_next
+
+    return Y[:total_dim], steps
 
 
 if __name__ == "__main__":
-    with open("phasor_transformed.json", "r") as f:
-        phasor_data = json.load(f)
+    phasor_data = load_artifact(sys.argv[1] if len(sys.argv) > 1 else "phasor_transformed.json")
 
     traj = run_phasor_simulation(phasor_data, verbose=True)
 
@@ -1,14 +1,22 @@
-import json
+import sys
 import numpy as np
+from vpl_common import load_artifact
+from phasor_matrix import to_scipy
+from phasor_trace import Tracer, ConsoleSink, INFO, DEBUG
+
+def math_simulator_phasor_verbose(trace_file="phasor_output.json", max_steps=50, tracer=None):
+    """
+    Step-by-step phasor simulation reporting through a phasor_trace.Tracer.
+    By default the full trace is printed to the console; pass Tracer() (no
+    sinks) to run silently. Values that are only needed for the trace are
+    computed lazily, so they cost nothing when no sink consumes them.
+    Returns the final state vector.
+    """
+    if tracer is None:
+        tracer = Tracer([ConsoleSink()], level=DEBUG)
 
-def pretty_vector(vec, names):
-    """Helper: format vector with labels."""
-    return " | ".join([f"{name}:{val:.3f}" for name, val in zip(names, vec)])
-
-def math_simulator_phasor_verbose(trace_file="phasor_output.json", max_steps=50):
     # Load phasor transformer output
-    with open(trace_file, "r") as f:
-        data = json.load(f)
+    data = load_artifact(trace_file)
 
     control_blocks = data["addr_list"]["control_blocks"]
     data_vars = data["addr_list"]["data_vars"]
@@ -16,96 +24,56 @@ def math_simulator_phasor_verbose(trace_file="phasor_output.json", max_steps=50)
     n_data = data["n_data"]
     total_dim = data["total_dim"]
 
-    # Convert lists to NumPy arrays
-    M_full = np.array(data["M_full"], dtype=float)
+    # Convert to sparse matrices / NumPy vectors
+    M_full = to_scipy(data["M_full"], total_dim)
     c_full = np.array(data["c_full"], dtype=float).reshape((total_dim,))
-    C_p = np.array(data["C_p"], dtype=float)
+    C_p = to_scipy(data["C_p"], total_dim)
     c_p = np.array(data["c_p"], dtype=float).reshape((-1,))
 
-    # Build names for labeling the vector space
-    names = control_blocks + data_vars
-
     # Initialize X
     X = np.zeros((total_dim,))
     X[0] = 1.0  # start at init_x
     for i in range(n_data):
         X[n_ctrl + i] = 0.0
 
-    print("\n===================================================")
-    print("🔸 VPL PHASOR MATHEMATICAL SIMULATOR (FULL TRACE)")
-    print("===================================================")
-    print(f"Control blocks ({n_ctrl}): {control_blocks}")
-    print(f"Data variables ({n_data}): {data_vars}")
-    print(f"Total dimension of vector space: {total_dim}")
-    print("\nInitial state vector:")
-    print(f"X₀ = [{pretty_vector(X, names)}]")
-
-    print("\nM_full (transition matrix):")
-    print(M_full)
-    print("\nc_full (offset vector):")
-    print(c_full)
-    print("\nC_p (phasor guard matrix):")
-    print(C_p)
-    print("\nc_p (phasor guard offset):")
-    print(c_p)
-
-    print("\n====================================")
-    print("BEGIN SIMULATION")
-    print("====================================\n")
+    tracer.emit(INFO, "start", control_blocks=control_blocks, data_vars=data_vars,
+                total_dim=total_dim, X=X)
+    tracer.emit(DEBUG, "system", M_full=M_full, c_full=c_full, C_p=C_p, c_p=c_p)
 
     for step in range(max_steps):
-        print(f"\n--- STEP {step} ---")
-        print(f"Current state X_{step}:\n  {pretty_vector(X, names)}")
-
         # Active control block
-        active_idx = np.argmax(X[:n_ctrl])
-        active_block = control_blocks[active_idx]
-        print(f"🧭 Active control block: {active_block} (index {active_idx})")
+        if tracer.enabled(INFO):
+            active_idx = np.argmax(X[:n_ctrl])
+            tracer.emit(INFO, "step", step=step, X=X, active_idx=active_idx,
+                        active_block=control_blocks[active_idx])
 
         # Phasor guard evaluation
         guard_val = C_p @ X + c_p
-        print("\nGuard evaluation:")
-        print(f"C_p * X_{step} = {C_p @ X}")
-        print(f"C_p * X_{step} + c_p = {guard_val}")
+        tracer.emit(DEBUG, "guard", step=step, C_p_X=lambda: C_p @ X, guard=guard_val)
 
         if np.any(guard_val > 0):
-            print(f"⛔ Guard condition violated at step {step}. Halting.")
+            tracer.emit(INFO, "halt", step=step, reason="guard")
             break
 
         # Transition
-        print("\nComputing next state:")
-        print(f"M_full @ X_{step} = {M_full @ X}")
-        print(f"(M_full @ X_{step}) + c_full = {M_full @ X + c_full}")
         X_next = M_full @ X + c_full
-        print(f"X_{step+1} = {pretty_vector(X_next, names)}")
+        tracer.emit(DEBUG, "transition", step=step, M_X=lambda: M_full @ X, X_next=X_next)
 
         # Stabilization check
         if np.allclose(X, X_next):
-            print("\n✅ Reached steady state (no further evolution). Halting.")
+            tracer.emit(INFO, "halt", step=step, reason="steady")
             X = X_next
             break
 
         X = X_next
 
-    print("\n====================================")
-    print("🏁 FINAL STATE VECTOR")
-    print("====================================")
-    print(f"X_final = [{pretty_vector(X, names)}]")
-
     # Interpret final control state
     active_idx = np.argmax(X[:n_ctrl])
-    active_block = control_blocks[active_idx]
-    print(f"\nActive control block at halt: {active_block}")
-
-    # Print data variables
-    print("Final data variables:")
-    for i, var in enumerate(data_vars):
-        val = X[n_ctrl + i]
-        print(f"  {var} = {val}")
+    tracer.emit(INFO, "final", X=X, active_block=control_blocks[active_idx],
+                data=lambda: {var: X[n_ctrl + i] for i, var in enumerate(data_vars)})
 
-    print("====================================\n")
+    return X
 
 
 if __name__ == "__main__":
-    math_simulator_phasor_verbose("phasor_transformed.json")
-
+    math_simulator_phasor_verbose(sys.argv[1] if len(sys.argv) > 1 else "phasor_transformed.json")
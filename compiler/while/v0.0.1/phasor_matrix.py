@@ -0,0 +1,89 @@
+"""
+phasor_matrix.py
+Compressed sparse row (CSR) helpers for the phasor matrices (M_full, C_p, M_global).
+
+Serialized form used in phasor_transformed.json:
+    {"format": "csr", "shape": [rows, cols],
+     "data": [...], "indices": [...], "indptr": [...]}
+
+Dense list-of-lists matrices (older JSON files) are still accepted everywhere a
+matrix is read, so both forms can be passed to these helpers.
+"""
+
+def csr_from_rows(rows, n_rows, n_cols):
+    """
+    Build a CSR dict from {row: {col: value}}.
+    Zero entries are dropped; column indices are sorted within each row.
+    """
+    data = []
+    indices = []
+    indptr = [0]
+    for i in range(n_rows):
+        row = rows.get(i)
+        if row:
+            for j in sorted(row):
+                v = float(row[j])
+                if v != 0.0:
+                    indices.append(j)
+                    data.append(v)
+        indptr.append(len(data))
+    return {
+        "format": "csr",
+        "shape": [n_rows, n_cols],
+        "data": data,
+        "indices": indices,
+        "indptr": indptr
+    }
+
+def is_csr(mat):
+    return isinstance(mat, dict) and mat.get("format") == "csr"
+
+def matrix_shape(mat, n_cols=0):
+    """(rows, cols) of a CSR dict or dense list-of-lists (n_cols if it has no rows)."""
+    if is_csr(mat):
+        return tuple(mat["shape"])
+    if len(mat) == 0:
+        return (0, n_cols)
+    return (len(mat), len(mat[0]))
+
+def iter_row(mat, i):
+    """Yield (col, value) for the non-zeros of row i."""
+    if is_csr(mat):
+        indptr = mat["indptr"]
+        for k in range(indptr[i], indptr[i + 1]):
+            yield mat["indices"][k], mat["data"][k]
+    else:
+        for j, v in enumerate(mat[i]):
+            if v != 0:
+                yield j, v
+
+def iter_nonzeros(mat):
+    """Yield (row, col, value) for every non-zero entry."""
+    n_rows = matrix_shape(mat)[0]
+    for i in range(n_rows):
+        for j, v in iter_row(mat, i):
+            yield i, j, v
+
+def to_scipy(mat, n_cols=0):
+    """Convert a CSR dict or dense list-of-lists into a scipy.sparse.csr_matrix."""
+    # scipy is only needed by the simulators, not by the compiler stages
+    from scipy import sparse
+    import numpy as np
+
+    if is_csr(mat):
+        return sparse.csr_matrix(
+            (np.asarray(mat["data"], dtype=float),
+             np.asarray(mat["indices"], dtype=np.int64),
+             np.asarray(mat["indptr"], dtype=np.int64)),
+            shape=tuple(mat["shape"]))
+    if len(mat) == 0:
+        return sparse.csr_matrix((0, n_cols), dtype=float)
+    return sparse.csr_matrix(np.asarray(mat, dtype=float))
+
+def to_dense(mat):
+    """Return the matrix as a dense list-of-lists."""
+    n_rows, n_cols = matrix_shape(mat)
+    dense = [[0.0] * n_cols for _ in range(n_rows)]
+    for i, j, v in iter_nonzeros(mat):
+        dense[i][j] = v
+    return dense
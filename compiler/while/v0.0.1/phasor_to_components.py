@@ -1,4 +1,6 @@
-import json
+import sys
+from vpl_common import load_artifact
+from phasor_matrix import iter_row, matrix_shape
 import networkx as nx
 import matplotlib.pyplot as plt
 
@@ -8,8 +10,7 @@ def phasor_to_components(phasor_file):
     into an abstract list of analog components.
     """
 
-    with open(phasor_file, "r") as f:
-        data = json.load(f)
+    data = load_artifact(phasor_file)
 
     addr_list = data["addr_list"]
     control_blocks = addr_list["control_blocks"]
@@ -50,8 +51,7 @@ def phasor_to_components(phasor_file):
     # --- 3. VCVS for each equation in M_full
     for row in range(total_dim):
         expr_terms = []
-        for col in range(total_dim):
-            coeff = M[row][col]
+        for col, coeff in iter_row(M, row):
             if coeff != 0.0:
                 node = control_blocks[col] if col < n_ctrl else data_vars[col - n_ctrl]
                 expr_terms.append((coeff, node))
@@ -70,9 +70,9 @@ def phasor_to_components(phasor_file):
         })
 
     # --- 4. Comparator for halting conditions
-    for i, cond_row in enumerate(C_p):
+    for i in range(matrix_shape(C_p)[0]):
         terms = []
-        for j, coeff in enumerate(cond_row):
+        for j, coeff in iter_row(C_p, i):
             if coeff != 0.0:
                 node = control_blocks[j] if j < n_ctrl else data_vars[j - n_ctrl]
                 terms.append((coeff, node))
@@ -148,7 +148,7 @@ def draw_schematic_graph(G):
 
 if __name__ == "__main__":
     # 1. Convert phasor to component list
-    components = phasor_to_components("phasor_transformed.json")
+    components = phasor_to_components(sys.argv[1] if len(sys.argv) > 1 else "phasor_transformed.json")
 
     # 2. Print components to inspect
     for comp in components:
@@ -1,9 +1,10 @@
-import json
+import sys
+from vpl_common import load_artifact
+from phasor_matrix import iter_row, matrix_shape
 
 def phasor_to_ngspice(phasor_file, netlist_file="circuit.sp"):
     # Load the phasor-transformed JSON
-    with open(phasor_file, "r") as f:
-        data = json.load(f)
+    data = load_artifact(phasor_file)
 
     addr_list = data["addr_list"]
     control_blocks = addr_list["control_blocks"]
@@ -32,8 +33,7 @@ def phasor_to_ngspice(phasor_file, netlist_file="circuit.sp"):
     lines.append("* Controlled sources implementing M_full")
     for row in range(total_dim):
         expr_terms = []
-        for col in range(total_dim):
-            coeff = M[row][col]
+        for col, coeff in iter_row(M, row):
             if coeff != 0.0:
                 node = control_blocks[col] if col < n_ctrl else data_vars[col - n_ctrl]
                 expr_terms.append(f"{coeff}*V({node})")
@@ -50,9 +50,9 @@ def phasor_to_ngspice(phasor_file, netlist_file="circuit.sp"):
 
     # Phasor halting condition represented as a comparator
     lines.append("* Phasor halting condition")
-    for i, cond_row in enumerate(C_p):
+    for i in range(matrix_shape(C_p)[0]):
         terms = []
-        for j, coeff in enumerate(cond_row):
+        for j, coeff in iter_row(C_p, i):
             if coeff != 0.0:
                 node = control_blocks[j] if j < n_ctrl else data_vars[j - n_ctrl]
                 terms.append(f"{coeff}*V({node})")
@@ -80,5 +80,5 @@ def phasor_to_ngspice(phasor_file, netlist_file="circuit.sp"):
 
 if __name__ == "__main__":
     # Example usage:
-    phasor_to_ngspice("phasor_transformed.json", "circuit.sp")
+    phasor_to_ngspice(sys.argv[1] if len(sys.argv) > 1 else "phasor_transformed.json", "circuit.sp")
 
@@ -1,4 +1,7 @@
-import json
+import re
+import sys
+from vpl_common import load_artifact
+from phasor_matrix import iter_row
 
 def generate_verilog(phasor_json, module_name="vpl_circuit"):
     addr_list = phasor_json["addr_list"]
@@ -18,6 +21,16 @@ def generate_verilog(phasor_json, module_name="vpl_circuit"):
     verilog.append(f"module {module_name}(input clk, input reset, output reg halt);")
     verilog.append("")
 
+    # Statically known loop trip counts, one per loop block (several loops
+    # may share an induction variable)
+    loops = phasor_json.get("metadata", {}).get("loops", [])
+    for loop in loops:
+        name = re.sub(r'\W', '_', loop["block"])
+        comment = f"  // for-loop over {loop['var']}" if loop.get("var") else ""
+        verilog.append(f"  localparam integer TRIP_COUNT_{name} = {loop['trip_count']};{comment}")
+    if loops:
+        verilog.append("")
+
     # Declare registers for data vars
     for var in data_vars:
         verilog.append(f"  reg [31:0] {var};")
@@ -36,7 +49,7 @@ def generate_verilog(phasor_json, module_name="vpl_circuit"):
     for i, var in enumerate(data_vars):
         row_idx = data_start + i
         expr_terms = []
-        for j, col in enumerate(M_full[row_idx]):
+        for j, col in iter_row(M_full, row_idx):
             if col != 0.0:
                 # Check if source is control or data
                 if j < n_ctrl:
@@ -58,7 +71,7 @@ def generate_verilog(phasor_json, module_name="vpl_circuit"):
     # Example: C_p * X + c_p <= 0
     # We'll implement a single condition
     phasor_expr_terms = []
-    for j, coef in enumerate(C_p[0]):
+    for j, coef in iter_row(C_p, 0):
         if coef != 0.0:
             if j < n_ctrl:
                 phasor_expr_terms.append(str(int(coef)))
@@ -96,8 +109,7 @@ def generate_verilog(phasor_json, module_name="vpl_circuit"):
 
 
 if __name__ == "__main__":
-    with open("phasor_transformed.json", "r") as f:
-        phasor_json = json.load(f)
+    phasor_json = load_artifact(sys.argv[1] if len(sys.argv) > 1 else "phasor_transformed.json")
     verilog_code = generate_verilog(phasor_json, "vpl_loop")
     with open("vpl_loop.v", "w") as f:
         f.write(verilog_code)
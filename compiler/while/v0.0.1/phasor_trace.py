@@ -0,0 +1,178 @@
+"""
+phasor_trace.py
+Structured, level-gated tracing for the phasor simulators.
+
+A Tracer forwards events (a name plus keyword fields) to its sinks when the
+event level is enabled. Field values may be zero-argument callables; they are
+only called when at least one sink will consume the event, so expensive
+products (e.g. M_full @ X) and formatting cost nothing when tracing is off.
+
+Sinks:
+  - ConsoleSink: the human readable trace printed by math_simulator_phasor_verbose
+  - JsonLinesSink: one JSON object per event
+  - ColumnarSink: one .npy column per numeric event field (binary, streamed)
+A Tracer without sinks is the null tracer.
+
+Usage:
+    tracer = Tracer([JsonLinesSink("trace.jsonl")], level=INFO)
+    math_simulator_phasor_verbose("phasor_transformed.json", tracer=tracer)
+    tracer.close()
+"""
+import json
+import os
+import numpy as np
+from trajectory_store import NpyTrajectoryWriter
+
+OFF, INFO, DEBUG = 0, 1, 2
+
+def pretty_vector(vec, names):
+    """Helper: format vector with labels."""
+    return " | ".join([f"{name}:{val:.3f}" for name, val in zip(names, vec)])
+
+class Tracer:
+    def __init__(self, sinks=(), level=INFO):
+        self.sinks = list(sinks)
+        self.level = level
+
+    def enabled(self, level=INFO):
+        return bool(self.sinks) and level <= self.level
+
+    def emit(self, level, event, **fields):
+        if not self.enabled(level):
+            return
+        fields = {k: (v() if callable(v) else v) for k, v in fields.items()}
+        for sink in self.sinks:
+            sink.write(event, fields)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def _jsonable(value):
+    if hasattr(value, "tocsr"):
+        m = value.tocsr()
+        return {"format": "csr", "shape": list(m.shape), "data": m.data.tolist(),
+                "indices": m.indices.tolist(), "indptr": m.indptr.tolist()}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+class JsonLinesSink:
+    def __init__(self, path):
+        self.f = open(path, "w")
+
+    def write(self, event, fields):
+        record = {"event": event}
+        record.update({k: _jsonable(v) for k, v in fields.items()})
+        self.f.write(json.dumps(record) + "\n")
+
+    def close(self):
+        self.f.close()
+
+class ColumnarSink:
+    """
+    Binary columnar trace: each numeric field of each event is streamed into
+    its own <directory>/<event>.<field>.npy file (one row per event).
+    Non-numeric fields are skipped.
+    """
+
+    def __init__(self, directory, chunk_rows=4096):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.columns = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, event, fields):
+        for name, value in fields.items():
+            if hasattr(value, "tocsr"):
+                continue
+            arr = np.atleast_1d(np.asarray(value))
+            if arr.ndim != 1 or arr.dtype.kind not in "biuf":
+                continue
+            key = f"{event}.{name}"
+            if key not in self.columns:
+                path = os.path.join(self.directory, key + ".npy")
+                self.columns[key] = NpyTrajectoryWriter(path, chunk_rows=self.chunk_rows)
+            self.columns[key](0, arr)
+
+    def close(self):
+        for writer in self.columns.values():
+            writer.close()
+
+class ConsoleSink:
+    """Prints the full human readable simulator trace."""
+
+    def __init__(self):
+        self.names = []
+        self.started = False
+
+    def write(self, event, f):
+        getattr(self, "_" + event, lambda f: None)(f)
+
+    def close(self):
+        pass
+
+    def _start(self, f):
+        self.names = f["control_blocks"] + f["data_vars"]
+        print("\n===================================================")
+        print("🔸 VPL PHASOR MATHEMATICAL SIMULATOR (FULL TRACE)")
+        print("===================================================")
+        print(f"Control blocks ({len(f['control_blocks'])}): {f['control_blocks']}")
+        print(f"Data variables ({len(f['data_vars'])}): {f['data_vars']}")
+        print(f"Total dimension of vector space: {f['total_dim']}")
+        print("\nInitial state vector:")
+        print(f"X₀ = [{pretty_vector(f['X'], self.names)}]")
+
+    def _system(self, f):
+        print("\nM_full (transition matrix):")
+        print(f["M_full"])
+        print("\nc_full (offset vector):")
+        print(f["c_full"])
+        print("\nC_p (phasor guard matrix):")
+        print(f["C_p"])
+        print("\nc_p (phasor guard offset):")
+        print(f["c_p"])
+
+    def _step(self, f):
+        if not self.started:
+            self.started = True
+            print("\n====================================")
+            print("BEGIN SIMULATION")
+            print("====================================\n")
+        step = f["step"]
+        print(f"\n--- STEP {step} ---")
+        print(f"Current state X_{step}:\n  {pretty_vector(f['X'], self.names)}")
+        print(f"🧭 Active control block: {f['active_block']} (index {f['active_idx']})")
+
+    def _guard(self, f):
+        step = f["step"]
+        print("\nGuard evaluation:")
+        print(f"C_p * X_{step} = {f['C_p_X']}")
+        print(f"C_p * X_{step} + c_p = {f['guard']}")
+
+    def _transition(self, f):
+        step = f["step"]
+        print("\nComputing next state:")
+        print(f"M_full @ X_{step} = {f['M_X']}")
+        print(f"(M_full @ X_{step}) + c_full = {f['X_next']}")
+        print(f"X_{step+1} = {pretty_vector(f['X_next'], self.names)}")
+
+    def _halt(self, f):
+        if f["reason"] == "guard":
+            print(f"⛔ Guard condition violated at step {f['step']}. Halting.")
+        else:
+            print("\n✅ Reached steady state (no further evolution). Halting.")
+
+    def _final(self, f):
+        print("\n====================================")
+        print("🏁 FINAL STATE VECTOR")
+        print("====================================")
+        print(f"X_final = [{pretty_vector(f['X'], self.names)}]")
+        print(f"\nActive control block at halt: {f['active_block']}")
+        print("Final data variables:")
+        for var, val in f["data"].items():
+            print(f"  {var} = {val}")
+        print("====================================\n")
@@ -1,71 +1,134 @@
-import json
 import re
-from sympy import sympify, Symbol
-import sympy
+import sys
+from vpl_common import load_artifact, save_artifact, compile_expr, ExprError
+from phasor_matrix import csr_from_rows, iter_nonzeros, matrix_shape
 
-def parse_linear_expr(expr_str, var_name):
+# 'var < literal': a signed literal may be parenthesized, as dataflow substitutes
+# negative constants ('x < (-3)')
+_NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_GUARD_RE = re.compile(r'(\w+)\s*<\s*(?:\(\s*(' + _NUMBER + r')\s*\)|(' + _NUMBER + r'))')
+
+def _parse_linear_expr_polynomial(expr_str, var_name):
     """
-    Parse a simple linear expression like 'x + 2' or 'x - 3'.
-    Returns (coeff_for_var, constant_term).
+    (coeff_for_var, constant_term) of an expression that is a polynomial in
+    var_name alone (linear coefficient and value at 0); (0, 0) otherwise.
     """
     try:
-        expr = sympify(expr_str)
-        var = Symbol(var_name)
-        coeff = expr.coeff(var)
-        const = expr.subs(var, 0)
-        return float(coeff), float(const)
-    except Exception:
+        poly = compile_expr(expr_str).polynomial(var_name)
+        return float(poly.get(1, 0.0)), float(poly.get(0, 0.0))
+    except ExprError:
         # fallback: identity (no constant offset)
         return 0.0, 0.0
 
+def affine_row(expr_str, target):
+    """
+    Affine form ({var: coeff}, const) of the right-hand side of 'target = expr'.
+    Non-affine expressions fall back to their linear part in the target only
+    (identity coefficient when it cannot be determined).
+    """
+    try:
+        return compile_expr(expr_str).affine()
+    except ExprError:
+        coeff, const = _parse_linear_expr_polynomial(expr_str, target)
+        return {target: coeff if coeff != 0 else 1.0}, const
+
+def straight_line_runs(atomic_ops):
+    """
+    Split the assignments into runs of (target, expr) that execute in
+    sequence: consecutive assignments of one basic block ("block" of the op).
+    A loop header ends a run, and the init and step assignments of a lowered
+    for-loop ("role") form runs of their own, so no run crosses a loop
+    boundary.
+    """
+    runs, run, key = [], [], None
+    for op in atomic_ops:
+        if op["op"] == "while_cond":
+            key = None
+        if op["op"] != "assign":
+            continue
+        op_key = (op.get("block"), op.get("role"))
+        if run and (key is None or op_key != key or op_key[1] is not None):
+            runs.append(run)
+            run = []
+        key = op_key
+        run.append((op["target"], op["expr"]))
+    if run:
+        runs.append(run)
+    return runs
+
+def compose_assignments(assigns, known_vars):
+    """
+    Compose a straight-line sequence of (target, expr) assignments into one
+    affine update (see straight_line_runs).
+
+    Each assignment is rewritten in terms of the values at the start of the
+    sequence by substituting the rows of earlier assignments, so
+    'a = a + 1; b = 2*a' gives b = 2*a + 2. Variables not in known_vars are
+    dropped. Returns {target: ({var: coeff}, const)}.
+    """
+    composed = {}
+    for target, expr in assigns:
+        if target not in known_vars:
+            continue
+        coeffs, const = affine_row(expr, target)
+        row = {}
+        for v, c in coeffs.items():
+            prev = composed.get(v)
+            if prev is None:
+                if v in known_vars:
+                    row[v] = row.get(v, 0.0) + c
+            else:
+                prev_row, prev_const = prev
+                for w, cw in prev_row.items():
+                    row[w] = row.get(w, 0.0) + c * cw
+                const += c * prev_const
+        composed[target] = (row, const)
+    return composed
+
 def transform_to_phasor(expanded_data):
     """
     Transform expanded.json (linear + control flow info)
     into full phasor vector space matrices and vectors.
+    M_full and C_p are emitted in CSR form (see phasor_matrix.py).
     """
     id_to_idx = expanded_data["id_to_idx"]
     addr_list = expanded_data["addr_list"]
     M_global = expanded_data["M_global"]
-    c_global = expanded_data["c_global"]
     atomic_ops = expanded_data["atomic_ops"]
 
-    n_ctrl = len(M_global)
+    n_ctrl = matrix_shape(M_global)[0]
     n_data = len(addr_list)
     total_dim = n_ctrl + n_data
 
-    # Build full M (control + data)
-    M_full = [[0.0 for _ in range(total_dim)] for _ in range(total_dim)]
+    # Build full M (control + data) as sparse rows {row: {col: value}}
+    M_rows = {}
     c_full = [0.0 for _ in range(total_dim)]
 
     # Copy control block part
-    for i in range(n_ctrl):
-        for j in range(n_ctrl):
-            M_full[i][j] = float(M_global[i][j])
+    for i, j, v in iter_nonzeros(M_global):
+        M_rows.setdefault(i, {})[j] = float(v)
+
+    # Data variable name -> row/column in the full space
+    data_index = {name: n_ctrl + i for i, name in enumerate(addr_list)}
 
     # Handle data updates from atomic_ops
     for op in atomic_ops:
-        if op["op"] == "assign":
-            target = op["target"]
-            expr = op["expr"]
-
-            if target in addr_list:
-                data_idx = n_ctrl + addr_list.index(target)
-                # Initialize default to identity
-                M_full[data_idx][data_idx] = 1.0
-
-                # Attempt to parse linear part
-                coeff, const = parse_linear_expr(expr, target)
-                if coeff != 0:
-                    M_full[data_idx][data_idx] = coeff
-                if const != 0:
-                    c_full[data_idx] = const
-
-        elif op["op"] == "init":
+        if op["op"] == "init":
             target = op["var"]
             value = float(op["value"])
-            if target in addr_list:
-                data_idx = n_ctrl + addr_list.index(target)
-                c_full[data_idx] = value
+            if target in data_index:
+                c_full[data_index[target]] = value
+
+    # Each assigned variable gets a full affine row over all data variables.
+    # Assignments compose only within a straight-line run; across runs the
+    # last assignment to a variable wins, as every row is applied each step
+    rows = {}
+    for run in straight_line_runs(atomic_ops):
+        rows.update(compose_assignments(run, data_index))
+    for target, (row, const) in rows.items():
+        data_idx = data_index[target]
+        M_rows[data_idx] = {data_index[v]: c for v, c in row.items()}
+        c_full[data_idx] = const
 
     # Build constraint vectors (phasor conditions)
     C_p = []
@@ -73,14 +136,11 @@ def transform_to_phasor(expanded_data):
     for op in atomic_ops:
         if op["op"] == "while_cond":
             cond = op["cond"]
-            m = re.match(r"(\w+)\s*<\s*([0-9\.]+)", cond)
+            m = _GUARD_RE.match(cond)
             if m:
-                varname, threshold = m.group(1), float(m.group(2))
-                if varname in addr_list:
-                    vec = [0.0] * total_dim
-                    data_idx = n_ctrl + addr_list.index(varname)
-                    vec[data_idx] = 1.0
-                    C_p.append(vec)
+                varname, threshold = m.group(1), float(m.group(2) or m.group(3))
+                if varname in data_index:
+                    C_p.append({data_index[varname]: 1.0})
                     c_p.append(-threshold)
             else:
                 # fallback if more complex condition
@@ -91,6 +151,12 @@ def transform_to_phasor(expanded_data):
         "block_index": id_to_idx
     }
 
+    # Statically known trip counts of lowered for-loops
+    loops = [{"block": op["block"], "var": op.get("loop_var"), "trip_count": op["trip_count"]}
+             for op in atomic_ops if op["op"] == "while_cond" and "trip_count" in op]
+    if loops:
+        metadata["loops"] = loops
+
     phasor_data = {
         "addr_list": {
             "control_blocks": list(id_to_idx.keys()),
@@ -99,9 +165,9 @@ def transform_to_phasor(expanded_data):
         "total_dim": total_dim,
         "n_ctrl": n_ctrl,
         "n_data": n_data,
-        "M_full": M_full,
+        "M_full": csr_from_rows(M_rows, total_dim, total_dim),
         "c_full": c_full,
-        "C_p": C_p,
+        "C_p": csr_from_rows(dict(enumerate(C_p)), len(C_p), total_dim),
         "c_p": c_p,
         "metadata": metadata
     }
@@ -109,13 +175,14 @@ def transform_to_phasor(expanded_data):
     return phasor_data
 
 if __name__ == "__main__":
-    with open("expanded.json", "r") as f:
-        expanded_data = json.load(f)
+    # python phasor_transformer.py [expanded.json|.vplb] [phasor_transformed.json|.vplb]
+    in_path = sys.argv[1] if len(sys.argv) > 1 else "expanded.json"
+    out_path = sys.argv[2] if len(sys.argv) > 2 else "phasor_transformed.json"
+    expanded_data = load_artifact(in_path)
 
     phasor_data = transform_to_phasor(expanded_data)
 
-    with open("phasor_transformed.json", "w") as f:
-        json.dump(phasor_data, f, indent=2)
+    save_artifact(out_path, phasor_data)
 
-    print("✅ Phasor transformation complete -> phasor_transformed.json")
+    print(f"✅ Phasor transformation complete -> {out_path}")
 
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+stage_cache.py
+Content-addressed on-disk cache for the pure pipeline stages
+(extract_from_source, translate_program, expand_blocks, transform_to_phasor).
+
+An entry is keyed by the SHA-256 of the stage name, the stage version and the
+canonical JSON of the stage input. The version defaults to a hash of the
+source of the module defining the stage function and of every project module
+it imports, directly or transitively (phasor_matrix.py, block_graph.py,
+common/vpl_expr.py, ...), so editing any code a stage runs invalidates its
+entries automatically. Entries are JSON files under <root>/<stage>/<key>.json;
+the cache is bounded in bytes and evicts least recently used entries first (a
+hit refreshes the entry's mtime). The total size is tracked as entries are
+written; the directory is only rescanned when the bound is exceeded.
+
+Usage:
+    cache = StageCache(".vpl_cache")
+    extracted = cache.run("extract", extract_from_source, source)
+
+    python stage_cache.py [cache_dir] stats
+    python stage_cache.py [cache_dir] clear [stage]
+"""
+import ast
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import sys
+
+# compiler/: modules below it are project code and part of a stage's version
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_versions = {}
+
+def _module_file(name, root):
+    """Source file of module name if it is project code under root, else None."""
+    mod = sys.modules.get(name)
+    path = getattr(mod, "__file__", None)
+    if path is None:
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            spec = None
+        path = spec.origin if spec is not None else None
+    if not path or not path.endswith(".py"):
+        return None
+    path = os.path.abspath(path)
+    return path if path.startswith(os.path.join(os.path.abspath(root), "")) else None
+
+def _imported_names(source):
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+    return names
+
+def project_sources(module_name, root=PROJECT_ROOT):
+    """{path: source} of a module and of every project module it imports, transitively."""
+    sources = {}
+    stack = [module_name]
+    while stack:
+        path = _module_file(stack.pop(), root)
+        if path is None or path in sources:
+            continue
+        with open(path, "r") as f:
+            sources[path] = f.read()
+        stack.extend(_imported_names(sources[path]))
+    return sources
+
+def stage_version(fn, root=PROJECT_ROOT):
+    """Hash of the sources of the module defining fn and of the project modules it imports."""
+    key = (fn.__module__, root)
+    if key not in _versions:
+        sources = project_sources(fn.__module__, root)
+        h = hashlib.sha256()
+        if not sources:
+            h.update((fn.__module__ + "." + fn.__qualname__).encode())
+        for path in sorted(sources):
+            h.update(os.path.relpath(path, root).encode())
+            h.update(b"\0")
+            h.update(sources[path].encode())
+            h.update(b"\0")
+        _versions[key] = h.hexdigest()[:16]
+    return _versions[key]
+
+class StageCache:
+    def __init__(self, root=".vpl_cache", max_bytes=256 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.total = None      # bytes on disk, scanned once, then tracked by put()
+
+    def key(self, stage, version, data):
+        payload = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        h = hashlib.sha256()
+        for part in (stage, version, payload):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, stage, key):
+        return os.path.join(self.root, stage, key + ".json")
+
+    def get(self, stage, key):
+        path = self._path(stage, key)
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, stage, key, value):
+        path = self._path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.total is None:
+            self.total = sum(size for _, size, _ in self.entries())
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(value, f, separators=(",", ":"))
+            size = f.tell()
+        os.replace(tmp, path)
+        self.total += size - old_size
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def run(self, stage, fn, data, version=None):
+        """Return fn(data), reusing a cached result when the input is unchanged."""
+        key = self.key(stage, version or stage_version(fn), data)
+        value = self.get(stage, key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = fn(data)
+        self.put(stage, key, value)
+        return value
+
+    def entries(self):
+        """List (mtime, size, path) for every entry."""
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for stage in os.listdir(self.root):
+            stage_dir = os.path.join(self.root, stage)
+            if not os.path.isdir(stage_dir):
+                continue
+            for fname in os.listdir(stage_dir):
+                if not fname.endswith(".json"):
+                    continue
+                path = os.path.join(stage_dir, fname)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                out.append((st.st_mtime, st.st_size, path))
+        return out
+
+    def evict(self, low_water=0.9):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        The directory is rescanned (other processes may share it) and entries
+        are removed down to low_water * max_bytes, so the next writes do not
+        trigger another scan right away.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes * low_water:
+                    break
+        self.total = total
+
+    def invalidate(self, stage=None):
+        """Drop all entries of one stage, or the whole cache."""
+        target = os.path.join(self.root, stage) if stage else self.root
+        shutil.rmtree(target, ignore_errors=True)
+        self.total = None
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    root = ".vpl_cache"
+    if args and args[0] not in ("stats", "clear"):
+        root = args.pop(0)
+    cache = StageCache(root)
+    cmd = args[0] if args else "stats"
+    if cmd == "clear":
+        stage = args[1] if len(args) > 1 else None
+        cache.invalidate(stage)
+        print(f"[stage_cache] 🧹 Cleared {stage or 'all stages'} in {root}")
+    else:
+        entries = cache.entries()
+        total = sum(size for _, size, _ in entries)
+        print(f"[stage_cache] {len(entries)} entries, {total} bytes in {root}")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+sweep.py
+Runs the whole while-pipeline (extractor -> translator -> expander ->
+cfg_optimizer -> dataflow -> phasor_transformer -> math_simulator) over many C programs
+in parallel.
+
+Stages hand their dicts to each other in memory (no intermediate JSON), jobs
+are spread over a process pool and every result is appended to one JSON-lines
+results file as soon as it is ready.
+
+Usage:
+    # every *.c file in a directory
+    python sweep.py inputs/ results.jsonl
+
+    # one template with $name placeholders and parameter ranges
+    # (start:stop[:step] like range(), or a comma separated list)
+    python sweep.py template.c results.jsonl --param LIMIT=1:100 --param STEP=1,2,5
+
+Options: --workers N (default: all cores), --max-steps N (default: 1000),
+         --cache DIR (reuse unchanged stage results, see stage_cache.py),
+         --cache-mb N (cache size bound, default: 256)
+
+Each result line:
+{"name": "...", "params": {...}, "steps": 3, "reason": "guard",
+ "data": {"x": 6.0}, "final_state": [...]}
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from string import Template
+
+from extractor import extract_from_source
+from translator import translate_program
+from expander import expand_blocks
+from cfg_optimizer import optimize_cfg
+from dataflow import optimize_dataflow
+from phasor_transformer import transform_to_phasor
+from math_simulator import run_phasor_simulation
+from stage_cache import StageCache
+
+def _discard(step, X):
+    pass
+
+def run_pipeline(source, max_steps=1000, cache=None):
+    """
+    Run every stage on one C source string and summarize the simulation.
+    With a StageCache, stages whose input did not change are not recomputed.
+    """
+    if cache is None:
+        extracted = extract_from_source(source)
+        translated = translate_program(extracted)
+        expanded = optimize_dataflow(optimize_cfg(expand_blocks(translated)))
+        phasor = transform_to_phasor(expanded)
+    else:
+        extracted = cache.run("extract", extract_from_source, source)
+        translated = cache.run("translate", translate_program, extracted)
+        expanded = cache.run("expand", expand_blocks, translated)
+        expanded = cache.run("optimize", optimize_cfg, expanded)
+        expanded = cache.run("dataflow", optimize_dataflow, expanded)
+        phasor = cache.run("transform", transform_to_phasor, expanded)
+
+    info = {}
+    X = run_phasor_simulation(phasor, max_steps=max_steps, verbose=False,
+                              sink=_discard, info=info)
+    n_ctrl = phasor["n_ctrl"]
+    result = dict(info)
+    result["data"] = {var: float(X[n_ctrl + i])
+                      for i, var in enumerate(phasor["addr_list"]["data_vars"])}
+    result["final_state"] = X.tolist()
+    return result
+
+_caches = {}
+
+def _worker_cache(cache_dir, cache_bytes):
+    """One StageCache per worker process, so its size tracking carries over between jobs."""
+    key = (cache_dir, cache_bytes)
+    if key not in _caches:
+        _caches[key] = StageCache(cache_dir, cache_bytes)
+    return _caches[key]
+
+def _run_job(job):
+    name, params, source, max_steps, cache_dir, cache_bytes = job
+    record = {"name": name, "params": params}
+    cache = _worker_cache(cache_dir, cache_bytes) if cache_dir else None
+    try:
+        record.update(run_pipeline(source, max_steps, cache))
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+def parse_param(spec):
+    """'N=1:10:2' -> ('N', [1, 3, 5, 7, 9]); 'N=1,4' -> ('N', ['1', '4'])"""
+    name, _, values = spec.partition("=")
+    if not name or not values:
+        raise ValueError(f"Bad parameter spec '{spec}', expected NAME=start:stop[:step] or NAME=a,b,c")
+    if ":" in values:
+        return name, list(range(*[int(v) for v in values.split(":")]))
+    return name, [v.strip() for v in values.split(",")]
+
+def make_jobs(input_path, param_specs, max_steps, cache_dir=None, cache_bytes=0):
+    """Yield (name, params, source, max_steps, cache_dir, cache_bytes) jobs for a directory or a template."""
+    if os.path.isdir(input_path):
+        for fname in sorted(os.listdir(input_path)):
+            if fname.endswith(".c"):
+                with open(os.path.join(input_path, fname), "r") as f:
+                    yield fname, {}, f.read(), max_steps, cache_dir, cache_bytes
+        return
+
+    with open(input_path, "r") as f:
+        template = Template(f.read())
+    params = [parse_param(spec) for spec in param_specs]
+    names = [p[0] for p in params]
+    for values in itertools.product(*[p[1] for p in params]):
+        binding = dict(zip(names, values))
+        yield (os.path.basename(input_path), binding, template.substitute(binding),
+               max_steps, cache_dir, cache_bytes)
+
+def run_sweep(jobs, results_path, workers=None):
+    """Run jobs on a process pool, appending one JSON line per finished job."""
+    n_done = n_failed = 0
+    with open(results_path, "w") as out, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_job, job) for job in jobs]
+        for fut in as_completed(futures):
+            record = fut.result()
+            out.write(json.dumps(record) + "\n")
+            n_done += 1
+            if "error" in record:
+                n_failed += 1
+    return n_done, n_failed
+
+def main():
+    ap = argparse.ArgumentParser(description="Parallel parameter sweep over the while-pipeline")
+    ap.add_argument("input", help="directory of .c files or a single template .c file")
+    ap.add_argument("results", help="output JSON-lines results file")
+    ap.add_argument("--param", action="append", default=[], help="NAME=start:stop[:step] or NAME=a,b,c")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--max-steps", type=int, default=1000)
+    ap.add_argument("--cache", default=None, help="stage cache directory")
+    ap.add_argument("--cache-mb", type=int, default=256)
+    args = ap.parse_args()
+
+    jobs = make_jobs(args.input, args.param, args.max_steps,
+                     args.cache, args.cache_mb * 1024 * 1024)
+    n_done, n_failed = run_sweep(jobs, args.results, args.workers)
+    print(f"[sweep] ✅ {n_done} programs simulated ({n_failed} failed) -> {args.results}")
+    if n_done == 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+from block_graph import BlockGraph
+from math_simulator import run_phasor_simulation
+from translator import translate_program
+
+REDECLARED = """
+int main() {
+    int x = 0;
+    while (x < 5) {
+        int x = 1;
+        x = x + 2;
+    }
+    return 0;
+}
+"""
+
+def small_graph():
+    graph = BlockGraph()
+    for bid in ("a", "b", "c"):
+        graph.add(bid, "assign", {})
+    graph.connect("a", "c")
+    graph.connect("a", "b")
+    graph.connect("a", "c")
+    graph.connect("c", "a")
+    return graph
+
+def test_adjacency_is_sorted_and_deduplicated():
+    graph = small_graph()
+    assert graph.adjacency() == ([0, 2, 2, 3], [1, 2, 0])
+    assert graph.successors("a") == ["b", "c"]
+    assert graph.control_matrix()["indices"] == [1, 2, 0]
+
+def test_dict_round_trip():
+    graph = small_graph()
+    again = BlockGraph.from_dict(graph.to_dict())
+    assert again.to_dict() == graph.to_dict()
+    assert again.adjacency() == graph.adjacency()
+
+def test_repeated_ids_are_suffixed():
+    graph = BlockGraph()
+    assert graph.add("init_x", "init_var", {}) == "init_x"
+    assert graph.add("init_x", "init_var", {}) == "init_x_1"
+    assert graph.add("init_x", "init_var", {}) == "init_x_2"
+    assert len(graph) == 3
+
+def test_redeclared_variable_translates(compile_program):
+    translated = translate_program({"variables": [
+        {"name": "x", "type": "int", "init": "0"},
+        {"name": "x", "type": "int", "init": "1"}], "statements": []})
+    assert [b["id"] for b in translated["blocks"]] == ["init_x", "init_x_1"]
+
+    info = {}
+    run_phasor_simulation(compile_program(REDECLARED, optimize=False), verbose=False, info=info)
+    assert info["reason"] == "guard"
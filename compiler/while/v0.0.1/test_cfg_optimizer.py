@@ -0,0 +1,58 @@
+from cfg_optimizer import optimize_cfg
+from expander import expand_blocks
+from extractor import extract_from_source
+from math_simulator import run_phasor_simulation
+from phasor_matrix import csr_from_rows, iter_nonzeros
+from translator import translate_program
+
+def expanded_of(source):
+    return expand_blocks(translate_program(extract_from_source(source)))
+
+def test_counter_program(counter_source):
+    expanded = expanded_of(counter_source)
+    optimized = optimize_cfg(expanded)
+    # init_x folded, b_s3 (return) merged into the print block
+    assert optimized["id_to_idx"] == {"b_s1": 0, "b_s0": 1, "b_s2": 2}
+    assert optimized["merged_into"]["init_x"] is None
+    assert optimized["merged_into"]["b_s3"] == "b_s2"
+    assert sorted((i, j) for i, j, _ in iter_nonzeros(optimized["M_global"])) == [(0, 1), (0, 2), (1, 0)]
+
+def test_unreachable_blocks_and_their_ops_are_dropped():
+    ids = ["entry", "loop", "dead"]
+    expanded = {
+        "addr_list": ["x"],
+        "M_global": csr_from_rows({0: {1: 1.0}, 1: {0: 1.0}, 2: {1: 1.0}}, 3, 3),
+        "c_global": ["", "x < 3", "x + 1"],
+        "atomic_ops": [{"op": "while_cond", "cond": "x < 3", "block": "loop"},
+                       {"op": "assign", "target": "x", "expr": "x + 1", "block": "dead"}],
+        "id_to_idx": {bid: k for k, bid in enumerate(ids)},
+    }
+    optimized = optimize_cfg(expanded)
+    assert optimized["merged_into"]["dead"] is None
+    # the loop header is entry's only successor: merged into it
+    assert [op["block"] for op in optimized["atomic_ops"]] == ["entry"]
+
+def test_straight_line_chains_are_merged():
+    source = """
+    int main() {
+        int x = 0;
+        int y = 0;
+        while (x < 5) {
+            x = x + 1;
+            y = y + x;
+            y = y - 1;
+        }
+        return 0;
+    }
+    """
+    optimized = optimize_cfg(expanded_of(source))
+    body = [op for op in optimized["atomic_ops"] if op["op"] == "assign"]
+    assert len({op["block"] for op in body}) == 1
+    assert len(optimized["id_to_idx"]) == 3
+
+def test_optimized_program_reaches_the_same_data(compile_program, counter_source):
+    plain = compile_program(counter_source, optimize=False)
+    optimized = compile_program(counter_source)
+    X_plain = run_phasor_simulation(plain, verbose=False)[-1]
+    X_opt = run_phasor_simulation(optimized, verbose=False)[-1]
+    assert X_plain[plain["n_ctrl"]:].tolist() == X_opt[optimized["n_ctrl"]:].tolist()
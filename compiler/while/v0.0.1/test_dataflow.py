@@ -0,0 +1,61 @@
+from dataflow import find_constants, live_variables, optimize_dataflow, substituter
+from expander import expand_blocks
+from extractor import extract_from_source
+from math_simulator import run_phasor_simulation
+from translator import translate_program
+
+PROGRAM = """
+int main() {
+    int x = 0;
+    int limit = 5;
+    int step = 2;
+    int unused = 0;
+    while (x < limit) {
+        x = x + step;
+        unused = unused + 1;
+    }
+    printf("%d\\n", x);
+    return 0;
+}
+"""
+
+def test_find_constants():
+    ops = [{"op": "init", "var": "a", "value": "3"}, {"op": "init", "var": "b", "value": "0"},
+           {"op": "init", "var": "c", "value": "n + 1"},
+           {"op": "assign", "target": "b", "expr": "b + a"}]
+    assert find_constants(ops) == {"a": "3"}
+
+def test_substituter_replaces_whole_names_once():
+    subst = substituter({"n": "4", "m": "-1"})
+    assert subst("n + nn + m*n") == "4 + nn + (-1)*4"
+
+def test_live_variables_follow_assignments():
+    ops = [{"op": "while_cond", "cond": "x < 5"},
+           {"op": "assign", "target": "x", "expr": "x + y"},
+           {"op": "assign", "target": "y", "expr": "y + 1"},
+           {"op": "assign", "target": "z", "expr": "z + x"}]
+    assert live_variables(ops) == {"x", "y"}
+
+def test_optimize_dataflow():
+    expanded = expand_blocks(translate_program(extract_from_source(PROGRAM)))
+    optimized = optimize_dataflow(expanded)
+    assert optimized["addr_list"] == ["x"]
+    assert optimized["constants"] == {"limit": 5.0, "step": 2.0}
+    assert optimized["dead_vars"] == ["unused"]
+    assert [op["expr"] for op in optimized["atomic_ops"] if op["op"] == "assign"] == ["x + 2"]
+
+def test_optimized_program_halts_the_same(compile_program):
+    info = {}
+    phasor = compile_program(PROGRAM)
+    X = run_phasor_simulation(phasor, verbose=False, info=info)[-1]
+    assert (info["reason"], info["steps"]) == ("guard", 3)
+    assert X[phasor["n_ctrl"]:].tolist() == [6.0]
+
+def test_negative_constant_guard_is_kept(compile_program):
+    # the folded guard reads 'x < (-3)'
+    phasor = compile_program(PROGRAM.replace("int limit = 5;", "int limit = -3;"))
+    assert phasor["c_p"] == [3.0]
+    info = {}
+    run_phasor_simulation(phasor, verbose=False, info=info)
+    # x starts at 0, so the loop does not run
+    assert (info["reason"], info["steps"]) == ("guard", 0)
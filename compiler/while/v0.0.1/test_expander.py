@@ -0,0 +1,16 @@
+import re
+
+import pytest
+
+from expander import parse_expr
+
+@pytest.mark.parametrize("expr", ["x + 2", "a*b - a", "(i + 1) * step", "y < 20", "x == 0 && y != 1"])
+def test_parse_expr_matches_identifier_scan(expr):
+    # the regex scan parse_expr used before vpl_expr, as a set of names
+    assert set(parse_expr(expr)) == set(re.findall(r'[a-zA-Z_]\w*', expr))
+
+def test_parse_expr_skips_functions_and_constants():
+    assert parse_expr("sin(x) + PI*y + x") == ["x", "y"]
+
+def test_parse_expr_outside_the_grammar_falls_back_to_the_scan():
+    assert parse_expr("a[i] + b") == ["a", "i", "b"]
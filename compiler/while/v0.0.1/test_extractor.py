@@ -0,0 +1,144 @@
+import io
+import json
+import os
+
+import extractor
+from extractor import (extract_from_source, extract_functions, extract_incremental,
+                       iter_extract_functions, lex_lines, load_function_records)
+
+NESTED = """
+int main() {
+    int x = 0;
+    int y = 1; // comment
+    /* block
+       comment */
+    while (x < 5) {
+        for (int i = 0; i < 3; i++) {
+            y = y + i;
+        }
+        x = x + 1;
+        x++;
+    }
+    printf("%d %d\\n", x, y);
+    return 0;
+}
+"""
+
+TWO_FUNCTIONS = """
+struct point { int x; int y; };
+
+int helper(int a) {
+    int b = 0;
+    b = a + 1;
+    return b;
+}
+
+int main() {
+    int x = 0;
+    while (x < 5) {
+        x = x + 2;
+    }
+    return 0;
+}
+"""
+
+def strip_ids(stmts):
+    return [{k: (strip_ids(v) if k == "body" else v) for k, v in s.items() if k not in ("id", "hash")}
+            for s in stmts]
+
+def test_lexer_drops_comments():
+    texts = [t.text for t in lex_lines(["int x = 1; // c\n", "/* a\n", " b */ x++;\n"])]
+    assert texts == ["int", "x", "=", "1", ";", "x", "++", ";"]
+
+def test_nested_loops():
+    program = extract_from_source(NESTED)
+    assert program["variables"] == [{"name": "x", "type": "int", "init": "0"},
+                                    {"name": "y", "type": "int", "init": "1"}]
+    assert strip_ids(program["statements"]) == [
+        {"type": "while", "cond": "x < 5", "body": [
+            {"type": "for", "header": "int i = 0; i < 3; i++", "body": [
+                {"type": "assign", "target": "y", "expr": "y + i"}]},
+            {"type": "assign", "target": "x", "expr": "x + 1"},
+            {"type": "increment", "target": "x", "op": "++"}]},
+        {"type": "print", "args": ['"%d %d\\n"', "x", "y"]},
+        {"type": "raw", "stmt": "return 0"},
+    ]
+    ids = [s["id"] for s in program["statements"]]
+    assert len(set(ids)) == len(ids)
+
+def test_counter_matches_checked_in_extraction(counter_source):
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "extracted.json")) as f:
+        assert extract_from_source(counter_source) == json.load(f)
+
+def test_functions_are_streamed_per_definition(tmp_path):
+    path = tmp_path / "prog.c"
+    path.write_text(TWO_FUNCTIONS)
+    records = list(iter_extract_functions(str(path)))
+    assert [r["function"] for r in records] == ["helper", "main"]
+    assert records[0]["variables"] == [{"name": "b", "type": "int", "init": "0"}]
+    assert strip_ids(records[1]["statements"])[0]["cond"] == "x < 5"
+
+def test_functions_of_a_directory(tmp_path):
+    for name in ("a.c", "b.c"):
+        (tmp_path / name).write_text(TWO_FUNCTIONS)
+    out = io.StringIO()
+    assert extract_functions(str(tmp_path), out, workers=2) == 4
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert sorted((r["file"].rsplit("/", 1)[-1], r["function"]) for r in records) == [
+        ("a.c", "helper"), ("a.c", "main"), ("b.c", "helper"), ("b.c", "main")]
+
+def count_parses(monkeypatch):
+    parsed = []
+    original = extractor.program_from_tokens
+
+    def counting(tokens, lo, hi, *args, **kwargs):
+        parsed.append(hi - lo)
+        return original(tokens, lo, hi, *args, **kwargs)
+
+    monkeypatch.setattr(extractor, "program_from_tokens", counting)
+    return parsed
+
+def test_incremental_reparses_only_changed_statements(counter_source, tmp_path):
+    path = tmp_path / "prog.c"
+    path.write_text(counter_source)
+    first = extract_incremental(str(path))
+    assert len(first["changed"]) == len(first["statements"])
+
+    path.write_text(counter_source.replace("x + 2", "x + 3"))
+    second = extract_incremental(str(path), first)
+    kept = [s["id"] for s in first["statements"][1:]]
+    assert [s["id"] for s in second["statements"][1:]] == kept
+    assert second["changed"] == [second["statements"][0]["id"]]
+    assert second["statements"][0]["body"][0]["expr"] == "x + 3"
+
+def test_function_reuse_is_keyed_by_file(tmp_path, monkeypatch):
+    for name in ("a.c", "b.c"):
+        (tmp_path / name).write_text(TWO_FUNCTIONS)
+    out_path = tmp_path / "functions.jsonl"
+    with open(out_path, "w") as out:
+        extract_functions(str(tmp_path / "a.c"), out)
+    previous = load_function_records(str(out_path))
+    assert set(previous) == {(str(tmp_path / "a.c"), "helper"), (str(tmp_path / "a.c"), "main")}
+
+    parsed = count_parses(monkeypatch)
+    # same file, unchanged: nothing is parsed again
+    assert list(iter_extract_functions(str(tmp_path / "a.c"), previous)) == list(previous.values())
+    assert parsed == []
+    # same function names in another file are not taken from a.c's records
+    records = list(iter_extract_functions(str(tmp_path / "b.c"), previous))
+    assert len(parsed) == 2
+    assert {r["file"] for r in records} == {str(tmp_path / "b.c")}
+
+def test_changed_function_is_parsed_again(tmp_path, monkeypatch):
+    path = tmp_path / "prog.c"
+    path.write_text(TWO_FUNCTIONS)
+    previous = {(r["file"], r["function"]): r for r in iter_extract_functions(str(path))}
+    path.write_text(TWO_FUNCTIONS.replace("a + 1", "a + 2"))
+
+    parsed = count_parses(monkeypatch)
+    out = io.StringIO()
+    extract_functions(str(path), out, previous=previous)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert len(parsed) == 1
+    assert records[0]["statements"][0]["expr"] == "a + 2"
+    assert records[1] == previous[(str(path), "main")]
@@ -0,0 +1,113 @@
+import numpy as np
+
+from math_simulator import (CycleDetector, iter_phasor_simulation, run_phasor_jump_ahead,
+                            run_phasor_simulation, run_phasor_simulation_batch)
+from phasor_matrix import csr_from_rows
+
+def data_of(phasor, X):
+    return dict(zip(phasor["addr_list"]["data_vars"], X[phasor["n_ctrl"]:]))
+
+def final_state(phasor, X0=None, max_steps=1000):
+    """(X, info) at the end of a single stepped run."""
+    info = {}
+    X = None
+    for _, X in iter_phasor_simulation(phasor, max_steps, verbose=False, X0=X0, info=info):
+        pass
+    return X, info
+
+def start_states(phasor, x_values):
+    X0 = np.zeros((len(x_values), phasor["total_dim"]))
+    X0[:, 0] = 1.0
+    X0[:, phasor["n_ctrl"]] = x_values
+    return X0
+
+def test_counter_halts_on_guard(counter_phasor):
+    info = {}
+    traj = run_phasor_simulation(counter_phasor, verbose=False, info=info)
+    assert info["reason"] == "guard"
+    assert info["steps"] == 3
+    assert len(traj) == 4
+    assert data_of(counter_phasor, traj[-1])["x"] == 6.0
+
+def test_batch_matches_single_runs(counter_phasor):
+    X0 = start_states(counter_phasor, [0.0, 1.0, 4.0, 10.0])
+    X_final, halt_steps = run_phasor_simulation_batch(counter_phasor, X0, verbose=False)
+    for row in range(len(X0)):
+        X, info = final_state(counter_phasor, X0[row])
+        assert halt_steps[row] == info["steps"]
+        np.testing.assert_allclose(X_final[row], X)
+
+def test_batch_rows_stop_independently(counter_phasor):
+    X0 = start_states(counter_phasor, [0.0, 100.0])
+    _, halt_steps = run_phasor_simulation_batch(counter_phasor, X0, verbose=False)
+    assert list(halt_steps) == [3, 0]
+
+DOUBLING = """
+int main() {
+    int x = 1;
+    while (x < 1000) {
+        x = 2*x + %s;
+    }
+    return 0;
+}
+"""
+
+def test_jump_ahead_matches_stepper(compile_program, counter_phasor):
+    programs = [counter_phasor,
+                compile_program(DOUBLING % "1"),
+                compile_program(DOUBLING % "1", optimize=False),
+                compile_program(DOUBLING % "0"),
+                compile_program(DOUBLING % "0", optimize=False)]
+    for phasor in programs:
+        X, info = final_state(phasor, max_steps=100000)
+        X_jump, steps = run_phasor_jump_ahead(phasor, max_steps=100000, verbose=False)
+        assert np.all(np.isfinite(X_jump))
+        assert steps == info["steps"]
+        np.testing.assert_allclose(X_jump, X)
+
+def test_jump_ahead_skips_overflowing_powers():
+    # x' = 3x + 1 with the guard near the top of the float range: the
+    # powers of A that jump past it overflow
+    phasor = {"total_dim": 2, "n_ctrl": 1,
+              "addr_list": {"control_blocks": ["b"], "data_vars": ["x"]},
+              "M_full": csr_from_rows({0: {0: 1.0}, 1: {1: 3.0}}, 2, 2),
+              "c_full": [0.0, 1.0],
+              "C_p": csr_from_rows({0: {1: 1.0}}, 1, 2), "c_p": [-1e300]}
+    X, info = final_state(phasor, max_steps=2000)
+    X_jump, steps = run_phasor_jump_ahead(phasor, max_steps=2000, verbose=False)
+    assert info["reason"] == "guard"
+    assert steps == info["steps"]
+    np.testing.assert_allclose(X_jump, X)
+
+def affine_system(M_rows, c_full, n_ctrl=1):
+    dim = len(c_full)
+    return {"total_dim": dim, "n_ctrl": n_ctrl,
+            "addr_list": {"control_blocks": [f"b{i}" for i in range(n_ctrl)],
+                          "data_vars": [f"v{i}" for i in range(dim - n_ctrl)]},
+            "M_full": csr_from_rows(M_rows, dim, dim), "c_full": c_full,
+            "C_p": csr_from_rows({}, 0, dim), "c_p": []}
+
+def test_cycle_detector_reports_entry_and_period():
+    detector = CycleDetector()
+    states = [np.array([v]) for v in (5.0, 1.0, 2.0, 3.0, 1.0)]
+    assert [detector.observe(step, X) for step, X in enumerate(states)] == [None] * 4 + [(1, 3)]
+
+def test_cycle_detector_is_bounded():
+    detector = CycleDetector(capacity=3)
+    for step in range(10):
+        detector.observe(step, np.array([float(step)]))
+    assert len(detector.seen) == 3
+    assert detector.observe(10, np.array([0.0])) is None
+
+def test_simulation_stops_at_steady_state():
+    # x' = 0.5 x + 1 settles at 2 (to STATE_DECIMALS)
+    _, info = final_state(affine_system({0: {0: 1.0}, 1: {1: 0.5}}, [0.0, 1.0]))
+    assert info["reason"] == "steady"
+    assert info["period"] == 1
+    assert info["steps"] < 100
+
+def test_simulation_stops_on_cycle():
+    # two control blocks handing control back and forth
+    phasor = affine_system({0: {1: 1.0}, 1: {0: 1.0}}, [0.0, 0.0], n_ctrl=2)
+    _, info = final_state(phasor)
+    assert info == {"steps": 2, "reason": "cycle", "cycle_entry": 0, "period": 2}
@@ -0,0 +1,28 @@
+import numpy as np
+
+from phasor_matrix import csr_from_rows, iter_nonzeros, matrix_shape, to_dense, to_scipy
+from math_simulator import run_phasor_simulation
+
+def test_csr_from_rows_drops_zeros_and_sorts_columns():
+    csr = csr_from_rows({0: {2: 1.0, 0: 3.0, 1: 0.0}, 2: {1: -1.0}}, 3, 3)
+    assert csr["indptr"] == [0, 2, 2, 3]
+    assert csr["indices"] == [0, 2, 1]
+    assert csr["data"] == [3.0, 1.0, -1.0]
+    assert list(iter_nonzeros(csr)) == [(0, 0, 3.0), (0, 2, 1.0), (2, 1, -1.0)]
+
+def test_csr_and_dense_forms_agree():
+    dense = [[0.0, 2.0], [1.0, 0.0], [0.0, 0.0]]
+    csr = csr_from_rows({0: {1: 2.0}, 1: {0: 1.0}}, 3, 2)
+    assert matrix_shape(csr) == matrix_shape(dense) == (3, 2)
+    assert to_dense(csr) == dense
+    np.testing.assert_array_equal(to_scipy(csr).toarray(), to_scipy(dense).toarray())
+
+def test_empty_matrix_shape():
+    assert matrix_shape([], 4) == (0, 4)
+    assert to_scipy([], 4).shape == (0, 4)
+
+def test_simulation_accepts_dense_matrices(counter_phasor):
+    dense = dict(counter_phasor, M_full=to_dense(counter_phasor["M_full"]),
+                 C_p=to_dense(counter_phasor["C_p"]))
+    np.testing.assert_array_equal(run_phasor_simulation(counter_phasor, verbose=False),
+                                  run_phasor_simulation(dense, verbose=False))
@@ -0,0 +1,44 @@
+import json
+
+import numpy as np
+
+from math_simulator_phasor_verbose import math_simulator_phasor_verbose
+from phasor_trace import DEBUG, INFO, JsonLinesSink, Tracer
+from vpl_common import save_artifact
+
+class ListSink:
+    def __init__(self):
+        self.events = []
+
+    def write(self, event, fields):
+        self.events.append((event, fields))
+
+    def close(self):
+        pass
+
+def test_lazy_fields_are_not_computed_when_gated():
+    calls = []
+    sink = ListSink()
+    tracer = Tracer([sink], level=INFO)
+    tracer.emit(DEBUG, "guard", value=lambda: calls.append(1))
+    tracer.emit(INFO, "step", value=lambda: calls.append(2) or 7)
+    Tracer().emit(INFO, "step", value=lambda: calls.append(3))
+    assert calls == [2]
+    assert sink.events == [("step", {"value": 7})]
+
+def test_silent_and_traced_runs_agree(counter_phasor, tmp_path):
+    path = str(tmp_path / "phasor.json")
+    save_artifact(path, counter_phasor)
+    trace = str(tmp_path / "trace.jsonl")
+
+    X_silent = math_simulator_phasor_verbose(path, tracer=Tracer())
+    tracer = Tracer([JsonLinesSink(trace)], level=DEBUG)
+    X_traced = math_simulator_phasor_verbose(path, tracer=tracer)
+    tracer.close()
+
+    np.testing.assert_array_equal(X_silent, X_traced)
+    with open(trace) as f:
+        events = [json.loads(line) for line in f]
+    assert events[0]["event"] == "start"
+    assert {"event": "halt", "step": 3, "reason": "guard"} in events
+    assert events[-1]["event"] == "final"
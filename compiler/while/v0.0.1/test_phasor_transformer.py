@@ -0,0 +1,117 @@
+import pytest
+
+from math_simulator import run_phasor_simulation
+from phasor_transformer import (_parse_linear_expr_polynomial, affine_row, compose_assignments,
+                                straight_line_runs)
+
+def test_affine_row():
+    assert affine_row("x + 2", "x") == ({"x": 1.0}, 2.0)
+    assert affine_row("2*a - (b + 3)/2", "a") == ({"a": 2.0, "b": -0.5}, -1.5)
+    assert affine_row("x - x + 5", "x") == ({}, 5.0)
+
+def test_affine_row_non_affine_fallback():
+    # linear part of a polynomial in the target
+    assert affine_row("x*x + 3*x + 1", "x") == ({"x": 3.0}, 1.0)
+    # no usable linear part: identity
+    assert affine_row("x*y", "x") == ({"x": 1.0}, 0.0)
+    assert affine_row("x @ 2", "x") == ({"x": 1.0}, 0.0)
+    # constants that cannot be folded: identity instead of ZeroDivisionError
+    assert affine_row("5 % 0", "x") == ({"x": 1.0}, 0.0)
+    assert affine_row("x + 0 ** -1", "x") == ({"x": 1.0}, 0.0)
+
+def sympy_linear_expr(expr_str, var_name):
+    """The sympify-based parse_linear_expr this module used before vpl_expr."""
+    from sympy import Symbol, sympify
+    try:
+        expr = sympify(expr_str)
+        return float(expr.coeff(Symbol(var_name))), float(expr.subs(Symbol(var_name), 0))
+    except Exception:
+        return 0.0, 0.0
+
+@pytest.mark.parametrize("expr", ["x + 2", "x - 3", "3*x - 4", "2*(x + 1)", "x/2 + 1", "-x", "10",
+                                  "x + 0.5", "x*x + 3*x + 1", "x*y", "y + 1", "5 % 0"])
+def test_linear_parse_matches_sympy(expr):
+    pytest.importorskip("sympy")
+    assert _parse_linear_expr_polynomial(expr, "x") == sympy_linear_expr(expr, "x")
+
+def test_linear_parse_expands_powers():
+    # sympy's coeff() on the unexpanded (x + 1)**2 gave 0; the polynomial form expands it
+    assert _parse_linear_expr_polynomial("(x + 1)**2", "x") == (2.0, 1.0)
+
+LOOPS = """
+int main() {
+    int x = 0;
+    int y = 0;
+    for (int i = 0; i < 4; i = i + 1) {
+        x = x + 2;
+    }
+    y = 10;
+    while (y < 20) {
+        y = y + 1;
+    }
+    printf("%d\\n", x);
+    return 0;
+}
+"""
+
+WHILE_ONLY = """
+int main() {
+    int y = 0;
+    int z = 0;
+    y = 10;
+    while (y < 20) {
+        z = y;
+        y = y + 1;
+    }
+    return 0;
+}
+"""
+
+def halt(phasor, max_steps=200):
+    info = {}
+    X = run_phasor_simulation(phasor, max_steps, verbose=False, info=info)[-1]
+    return info, dict(zip(phasor["addr_list"]["data_vars"], X[phasor["n_ctrl"]:]))
+
+def test_straight_line_runs_stop_at_loop_boundaries():
+    ops = [
+        {"op": "assign", "target": "i", "expr": "0", "block": "b1", "role": "for_init"},
+        {"op": "while_cond", "cond": "i < 4", "block": "b2"},
+        {"op": "assign", "target": "a", "expr": "a + 1", "block": "b3"},
+        {"op": "assign", "target": "b", "expr": "2*a", "block": "b3"},
+        {"op": "assign", "target": "i", "expr": "i + 1", "block": "b3", "role": "for_step"},
+        {"op": "assign", "target": "y", "expr": "10", "block": "b4"},
+        {"op": "while_cond", "cond": "y < 20", "block": "b5"},
+        {"op": "assign", "target": "y", "expr": "y + 1", "block": "b6"},
+    ]
+    assert straight_line_runs(ops) == [
+        [("i", "0")],
+        [("a", "a + 1"), ("b", "2*a")],
+        [("i", "i + 1")],
+        [("y", "10")],
+        [("y", "y + 1")],
+    ]
+
+def test_assignments_compose_within_a_run():
+    composed = compose_assignments([("a", "a + 1"), ("b", "2*a")], {"a", "b"})
+    assert composed == {"a": ({"a": 1.0}, 1.0), "b": ({"a": 2.0}, 2.0)}
+
+def test_for_and_while_loops_run_to_the_halt(compile_program):
+    for optimize in (False, True):
+        info, data = halt(compile_program(LOOPS, optimize=optimize))
+        # the for-loop guard i < 4 fires first; every loop counter counts up
+        assert info["reason"] == "guard"
+        assert info["steps"] == 5
+        assert data == {"x": 10.0, "y": 5.0, "i": 5.0}
+
+def test_while_loop_counts_up_to_the_halt(compile_program):
+    for optimize in (False, True):
+        info, data = halt(compile_program(WHILE_ONLY, optimize=optimize))
+        assert info["reason"] == "guard"
+        assert info["steps"] == 21
+        assert data["y"] == 21.0
+
+def test_unfoldable_constant_compiles(compile_program):
+    source = WHILE_ONLY.replace("z = y;", "z = 5 % 0;")
+    info, data = halt(compile_program(source, optimize=False))
+    assert info["steps"] == 21
+    assert data["z"] == 0.0
@@ -0,0 +1,72 @@
+import os
+import sys
+import textwrap
+
+import stage_cache
+from stage_cache import StageCache, stage_version
+
+def write_module(directory, name, source):
+    with open(os.path.join(directory, name + ".py"), "w") as f:
+        f.write(textwrap.dedent(source))
+
+def test_run_reuses_results(tmp_path):
+    cache = StageCache(str(tmp_path))
+    calls = []
+
+    def stage(data):
+        calls.append(data)
+        return {"double": data["x"] * 2}
+
+    assert cache.run("double", stage, {"x": 2}, version="1") == {"double": 4}
+    assert cache.run("double", stage, {"x": 2}, version="1") == {"double": 4}
+    assert cache.run("double", stage, {"x": 2}, version="2") == {"double": 4}
+    assert len(calls) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_version_follows_transitive_imports(tmp_path, monkeypatch):
+    project = str(tmp_path)
+    write_module(project, "vc_stage", """
+        from vc_helper import helper
+        def stage(data):
+            return helper(data)
+    """)
+    write_module(project, "vc_helper", """
+        from vc_leaf import LEAF
+        def helper(data):
+            return data + LEAF
+    """)
+    write_module(project, "vc_leaf", "LEAF = 1\n")
+    monkeypatch.syspath_prepend(project)
+    monkeypatch.setattr(stage_cache, "_versions", {})
+    import vc_stage
+
+    before = stage_version(vc_stage.stage, root=project)
+    write_module(project, "vc_leaf", "LEAF = 2\n")
+    stage_cache._versions.clear()
+    assert stage_version(vc_stage.stage, root=project) != before
+    for name in ("vc_stage", "vc_helper", "vc_leaf"):
+        sys.modules.pop(name, None)
+
+def test_pipeline_stages_depend_on_shared_modules():
+    from phasor_transformer import transform_to_phasor
+    files = {os.path.basename(p) for p in stage_cache.project_sources(transform_to_phasor.__module__)}
+    assert {"phasor_transformer.py", "phasor_matrix.py", "vpl_expr.py"} <= files
+
+def test_size_is_tracked_and_bounded(tmp_path):
+    cache = StageCache(str(tmp_path), max_bytes=2000)
+    for i in range(50):
+        cache.put("s", f"k{i}", {"payload": "x" * 100, "i": i})
+    on_disk = sum(size for _, size, _ in cache.entries())
+    assert cache.total == on_disk
+    assert on_disk <= 2000
+    assert cache.get("s", "k49") is not None
+    assert cache.get("s", "k0") is None
+
+def test_put_does_not_rescan_below_the_bound(tmp_path, monkeypatch):
+    cache = StageCache(str(tmp_path), max_bytes=10 ** 6)
+    cache.put("s", "first", {"a": 1})
+    scans = []
+    monkeypatch.setattr(cache, "entries", lambda: scans.append(1) or [])
+    for i in range(10):
+        cache.put("s", f"k{i}", {"a": i})
+    assert scans == []
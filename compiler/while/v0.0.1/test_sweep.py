@@ -0,0 +1,29 @@
+import json
+
+from sweep import make_jobs, parse_param, run_pipeline, run_sweep
+
+def test_parse_param():
+    assert parse_param("N=1:10:4") == ("N", [1, 5, 9])
+    assert parse_param("N=1, 4") == ("N", ["1", "4"])
+
+def test_run_pipeline_summary(counter_source):
+    result = run_pipeline(counter_source)
+    assert result["reason"] == "guard"
+    assert result["steps"] == 3
+    assert result["data"] == {"x": 6.0}
+
+def test_template_sweep(counter_source, tmp_path):
+    template = tmp_path / "counter.c"
+    template.write_text(counter_source.replace("x < 5", "x < $LIMIT").replace("x + 2", "x + $STEP"))
+    results = tmp_path / "results.jsonl"
+
+    jobs = list(make_jobs(str(template), ["LIMIT=5,9", "STEP=1:3"], 100))
+    assert len(jobs) == 4
+    assert run_sweep(jobs, str(results), workers=2) == (4, 0)
+
+    with open(results) as f:
+        records = {(r["params"]["LIMIT"], r["params"]["STEP"]): r for r in map(json.loads, f)}
+    # x halts at the first value above LIMIT
+    assert records[("5", 2)]["data"]["x"] == 6.0
+    assert records[("9", 1)]["data"]["x"] == 10.0
+    assert records[("9", 2)]["data"]["x"] == 10.0
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from math_simulator import run_phasor_simulation
+from trajectory_store import NpyTrajectoryWriter, TrajectoryBuffer
+
+def test_buffer_grows_past_capacity():
+    buf = TrajectoryBuffer(capacity=2)
+    for step in range(5):
+        buf(step, np.full(3, step, dtype=float))
+    np.testing.assert_array_equal(buf.array()[:, 0], np.arange(5))
+
+def test_npy_writer_streams_across_chunks(tmp_path):
+    path = tmp_path / "traj.npy"
+    rows = np.arange(21, dtype=float).reshape(7, 3)
+    with NpyTrajectoryWriter(str(path), chunk_rows=3) as writer:
+        for step, X in enumerate(rows):
+            writer(step, X)
+    np.testing.assert_array_equal(np.load(path), rows)
+
+def test_simulation_to_disk_matches_memory(counter_phasor, tmp_path):
+    path = tmp_path / "traj.npy"
+    in_memory = run_phasor_simulation(counter_phasor, verbose=False)
+    with NpyTrajectoryWriter(str(path), chunk_rows=2) as writer:
+        X = run_phasor_simulation(counter_phasor, verbose=False, sink=writer)
+    np.testing.assert_array_equal(np.load(path), in_memory)
+    np.testing.assert_array_equal(X, in_memory[-1])
+
+def test_decimation_keeps_final_state(counter_phasor):
+    full = run_phasor_simulation(counter_phasor, verbose=False)
+    kept = run_phasor_simulation(counter_phasor, verbose=False, every=2, control_only=True)
+    n_ctrl = counter_phasor["n_ctrl"]
+    np.testing.assert_array_equal(kept, full[[0, 2, 3], :n_ctrl])
+
+@pytest.mark.parametrize("every", [0, -1])
+def test_decimation_needs_a_positive_step(counter_phasor, every):
+    with pytest.raises(ValueError):
+        run_phasor_simulation(counter_phasor, verbose=False, every=every)
@@ -0,0 +1,88 @@
+import re
+
+from phasor_to_rtl import generate_verilog
+from extractor import extract_incremental
+from translator import for_trip_count, parse_for_header, translate_program
+
+TWO_I_LOOPS = """
+int main() {
+    int x = 0;
+    for (int i = 0; i < 4; i++) {
+        x = x + 1;
+    }
+    for (int i = 0; i < 8; i += 1) {
+        x = x + 2;
+    }
+    return 0;
+}
+"""
+
+def test_parse_for_header():
+    assert parse_for_header("int i = 0; i < n; i++") == (("i", "0"), "i < n", ("i", "i + 1"))
+    assert parse_for_header("i = 10; i >= 0; --i") == (("i", "10"), "i >= 0", ("i", "i - 1"))
+    assert parse_for_header("i = 0; i < 9; i += 3") == (("i", "0"), "i < 9", ("i", "i + 3"))
+
+def test_for_trip_count():
+    assert for_trip_count(("i", "0"), "i < 10", ("i", "i + 3")) == 4
+    assert for_trip_count(("i", "0"), "i <= 10", ("i", "i + 2")) == 6
+    assert for_trip_count(("i", "10"), "i > 0", ("i", "i - 1")) == 10
+    assert for_trip_count(("i", "0"), "i < n", ("i", "i + 1"), {"n": 5}) == 5
+    assert for_trip_count(("i", "0"), "i < n", ("i", "i + 1")) is None
+    assert for_trip_count(("i", "0"), "i < 10", ("i", "i * 2")) is None
+
+def test_trip_count_ignores_loops_that_write_their_variable():
+    body = [{"type": "assign", "target": "x", "expr": "x + i"}]
+    assert for_trip_count(("i", "0"), "i < 10", ("i", "i + 1"), body=body) == 10
+    writes_i = body + [{"type": "increment", "target": "i", "op": "++"}]
+    assert for_trip_count(("i", "0"), "i < 10", ("i", "i + 1"), body=writes_i) is None
+    nested = [{"type": "while", "cond": "x < 3", "body": [{"type": "assign", "target": "i", "expr": "0"}]}]
+    assert for_trip_count(("i", "0"), "i < 10", ("i", "i + 1"), body=nested) is None
+
+def test_for_loop_lowering():
+    translated = translate_program({"variables": [], "statements": [
+        {"id": "s1", "type": "for", "header": "int i = 0; i < 3; i++", "body": [
+            {"id": "s0", "type": "assign", "target": "x", "expr": "x + i"}]}]})
+    blocks = {b["id"]: b for b in translated["blocks"]}
+    assert blocks["b_s1_init"]["params"] == {"target": "i", "expr": "0", "role": "for_init"}
+    assert blocks["b_s1"]["params"] == {"cond": "i < 3", "loop_var": "i", "trip_count": 3}
+    assert blocks["b_s1_step"]["params"] == {"target": "i", "expr": "i + 1", "role": "for_step"}
+    edges = {(c["from"], c["to"]) for c in translated["connections"]}
+    assert edges == {("b_s1_init", "b_s1"), ("b_s1", "b_s0"), ("b_s0", "b_s1_step"), ("b_s1_step", "b_s1")}
+
+def test_loops_sharing_a_variable_get_distinct_localparams(compile_program):
+    phasor = compile_program(TWO_I_LOOPS)
+    loops = phasor["metadata"]["loops"]
+    assert [(loop["var"], loop["trip_count"]) for loop in loops] == [("i", 4), ("i", 8)]
+    params = re.findall(r"localparam integer (\w+) = (\d+);", generate_verilog(phasor))
+    assert len(params) == 2
+    assert len({name for name, _ in params}) == 2
+    assert sorted(int(v) for _, v in params) == [4, 8]
+
+BOUND_LOOP = """
+int main() {
+    int N = 8;
+    int x = 0;
+    for (int i = 0; i < N; i++) {
+        x = x + 1;
+    }
+    return 0;
+}
+"""
+
+def test_incremental_translation_follows_a_changed_bound(tmp_path):
+    path = tmp_path / "prog.c"
+    path.write_text(BOUND_LOOP)
+    first = extract_incremental(str(path))
+    previous = translate_program(first)
+
+    path.write_text(BOUND_LOOP.replace("int N = 8;", "int N = 16;"))
+    second = extract_incremental(str(path), first)
+    assert second["changed"] == []
+    incremental = translate_program(second, previous)
+    fresh = translate_program(extract_incremental(str(path)))
+
+    loop_id = f"b_{second['statements'][0]['id']}"
+    blocks = {b["id"]: b for b in incremental["blocks"]}
+    assert blocks[loop_id]["params"]["trip_count"] == 16
+    assert incremental["blocks"] == fresh["blocks"]
+    assert loop_id in incremental["changed_blocks"]
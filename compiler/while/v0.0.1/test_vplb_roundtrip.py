@@ -0,0 +1,91 @@
+import numpy as np
+
+from conftest import compile_source
+from extractor import extract_from_source
+from translator import translate_program
+from expander import expand_blocks
+from cfg_optimizer import optimize_cfg
+from dataflow import optimize_dataflow
+from phasor_transformer import transform_to_phasor
+from math_simulator import run_phasor_jump_ahead, run_phasor_simulation, run_phasor_simulation_batch
+from math_simulator_phasor_verbose import math_simulator_phasor_verbose
+from phasor_trace import Tracer
+from phasor_to_rtl import generate_verilog
+from phasor_to_ngspice import phasor_to_ngspice
+from vpl_common import load_artifact, save_artifact
+
+N_GUARDS = 20
+
+def many_guards_source(n=N_GUARDS):
+    """One while loop (and so one C_p row) per variable: enough to store c_p as an array."""
+    decls = "\n".join(f"    int x{i} = 0;" for i in range(n))
+    loops = "\n".join(f"    while (x{i} < {i + 2}) {{ x{i} = x{i} + 1; }}" for i in range(n))
+    return f"int main() {{\n{decls}\n{loops}\n    return 0;\n}}\n"
+
+def reload(doc, tmp_path, name):
+    path = str(tmp_path / name)
+    save_artifact(path, doc)
+    return load_artifact(path)
+
+def test_reloaded_phasor_vectors_are_memory_mapped(tmp_path):
+    phasor = compile_source(many_guards_source(), optimize=False)
+    loaded = reload(phasor, tmp_path, "phasor.vplb")
+    assert len(phasor["c_p"]) == N_GUARDS
+    assert isinstance(loaded["c_p"], np.memmap)
+    assert isinstance(loaded["M_full"]["data"], np.memmap)
+
+def test_reloaded_phasor_simulates_like_the_original(tmp_path):
+    phasor = compile_source(many_guards_source(), optimize=False)
+    loaded = reload(phasor, tmp_path, "phasor.vplb")
+
+    info, info_loaded = {}, {}
+    traj = run_phasor_simulation(phasor, verbose=False, info=info)
+    traj_loaded = run_phasor_simulation(loaded, verbose=False, info=info_loaded)
+    assert info_loaded == info
+    np.testing.assert_array_equal(traj_loaded, traj)
+
+    X0 = np.zeros((3, phasor["total_dim"]))
+    X0[:, 0] = 1.0
+    X0[1, phasor["n_ctrl"]] = 1.0
+    X0[2, phasor["n_ctrl"]] = 5.0
+    X_final, steps = run_phasor_simulation_batch(phasor, X0, verbose=False)
+    X_final_loaded, steps_loaded = run_phasor_simulation_batch(loaded, X0, verbose=False)
+    np.testing.assert_array_equal(steps_loaded, steps)
+    np.testing.assert_array_equal(X_final_loaded, X_final)
+
+    X, jump_info = run_phasor_jump_ahead(phasor, verbose=False)
+    X_loaded, jump_info_loaded = run_phasor_jump_ahead(loaded, verbose=False)
+    assert jump_info_loaded == jump_info
+    np.testing.assert_array_equal(X_loaded, X)
+
+    verbose_final = math_simulator_phasor_verbose(str(tmp_path / "phasor.vplb"), tracer=Tracer())
+    np.testing.assert_array_equal(verbose_final, traj[-1])
+
+def test_backends_read_reloaded_phasor(tmp_path):
+    phasor = compile_source(many_guards_source(), optimize=False)
+    json_path = str(tmp_path / "phasor.json")
+    vplb_path = str(tmp_path / "phasor.vplb")
+    save_artifact(json_path, phasor)
+    save_artifact(vplb_path, phasor)
+
+    assert generate_verilog(load_artifact(vplb_path)) == generate_verilog(load_artifact(json_path))
+
+    phasor_to_ngspice(json_path, str(tmp_path / "from_json.sp"))
+    phasor_to_ngspice(vplb_path, str(tmp_path / "from_vplb.sp"))
+    assert (tmp_path / "from_vplb.sp").read_text() == (tmp_path / "from_json.sp").read_text()
+
+def test_every_stage_accepts_reloaded_input(tmp_path):
+    source = many_guards_source()
+    expected = compile_source(source)
+
+    extracted = reload(extract_from_source(source), tmp_path, "extracted.vplb")
+    translated = reload(translate_program(extracted), tmp_path, "translated.vplb")
+    expanded = reload(expand_blocks(translated), tmp_path, "expanded.vplb")
+    optimized = reload(optimize_dataflow(optimize_cfg(expanded)), tmp_path, "optimized.vplb")
+    phasor = reload(transform_to_phasor(optimized), tmp_path, "phasor.vplb")
+
+    info, info_expected = {}, {}
+    traj = run_phasor_simulation(phasor, verbose=False, info=info)
+    traj_expected = run_phasor_simulation(expected, verbose=False, info=info_expected)
+    assert info == info_expected
+    np.testing.assert_array_equal(traj, traj_expected)
@@ -0,0 +1,115 @@
+"""
+trajectory_store.py
+Sinks for simulator trajectories (see math_simulator.run_phasor_simulation).
+
+A sink is any callable sink(step, X). Two are provided:
+  - TrajectoryBuffer: keeps the states in memory in one growing array.
+  - NpyTrajectoryWriter: streams the states into a .npy file on disk through
+    preallocated memory-mapped chunks, so memory use does not grow with the
+    number of steps.
+
+Usage:
+    with NpyTrajectoryWriter("trajectory.npy") as writer:
+        run_phasor_simulation(phasor_data, sink=writer)
+    traj = np.load("trajectory.npy", mmap_mode="r")
+"""
+import struct
+import numpy as np
+
+class TrajectoryBuffer:
+    """In-memory sink backed by a preallocated array that doubles when full."""
+
+    def __init__(self, capacity=1024, dtype=float):
+        self.capacity = max(1, capacity)
+        self.dtype = dtype
+        self.buf = None
+        self.n = 0
+
+    def __call__(self, step, X):
+        if self.buf is None:
+            self.buf = np.empty((self.capacity, len(X)), dtype=self.dtype)
+        elif self.n == self.buf.shape[0]:
+            grown = np.empty((2 * self.buf.shape[0], self.buf.shape[1]), dtype=self.dtype)
+            grown[:self.n] = self.buf
+            self.buf = grown
+        self.buf[self.n] = X
+        self.n += 1
+
+    def array(self):
+        """Return the stored states as a (rows, width) array (no copy)."""
+        if self.buf is None:
+            return np.zeros((0, 0), dtype=self.dtype)
+        return self.buf[:self.n]
+
+
+class NpyTrajectoryWriter:
+    """
+    Disk sink writing a standard .npy file of shape (rows, width).
+
+    The file is grown chunk_rows rows at a time and only the current chunk is
+    memory-mapped. The .npy header has a fixed size, so it is written once up
+    front and rewritten with the real row count on close().
+    """
+
+    HEADER_BYTES = 128
+
+    def __init__(self, path, chunk_rows=4096, dtype=float):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.dtype = np.dtype(dtype)
+        self.width = None
+        self.rows = 0
+        self.chunk = None
+        self.chunk_start = 0
+        self.f = open(path, "wb+")
+        self._write_header()
+
+    def _write_header(self):
+        shape = (self.rows, self.width or 0)
+        header = repr({
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": shape,
+        })
+        # magic (6) + version (2) + header length (2) + padded header ending in '\n'
+        header_len = self.HEADER_BYTES - 10
+        header = header.ljust(header_len - 1) + "\n"
+        self.f.seek(0)
+        self.f.write(np.lib.format.magic(1, 0))
+        self.f.write(struct.pack("<H", header_len))
+        self.f.write(header.encode("latin1"))
+
+    def _next_chunk(self):
+        if self.chunk is not None:
+            self.chunk.flush()
+        row_bytes = self.width * self.dtype.itemsize
+        self.chunk_start = self.rows
+        offset = self.HEADER_BYTES + self.chunk_start * row_bytes
+        self.f.truncate(offset + self.chunk_rows * row_bytes)
+        self.chunk = np.memmap(self.f, dtype=self.dtype, mode="r+", offset=offset,
+                               shape=(self.chunk_rows, self.width))
+
+    def __call__(self, step, X):
+        if self.width is None:
+            self.width = len(X)
+        if self.chunk is None or self.rows - self.chunk_start == self.chunk_rows:
+            self._next_chunk()
+        self.chunk[self.rows - self.chunk_start] = X
+        self.rows += 1
+
+    def close(self):
+        if self.f.closed:
+            return
+        if self.chunk is not None:
+            self.chunk.flush()
+            self.chunk = None
+        row_bytes = (self.width or 0) * self.dtype.itemsize
+        self.f.truncate(self.HEADER_BYTES + self.rows * row_bytes)
+        self._write_header()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,74 +1,218 @@
-import json
+import math
+import re
 import sys
+from vpl_common import load_artifact, save_artifact
+
+from block_graph import BlockGraph
 
 def load_extracted_json(file_path):
     """Load the JSON file produced by the extractor stage."""
-    with open(file_path, 'r') as f:
-        return json.load(f)
+    return load_artifact(file_path)
+
+def add_block(graph, block_id, block_type, params, prev_block_id=None):
+    """Add a block to the graph, connected from prev_block_id if given; returns its ID."""
+    block_id = graph.add(block_id, block_type, params)
+    if prev_block_id:
+        graph.connect(prev_block_id, block_id)
+    return block_id
+
+def split_top_level(text, sep):
+    """Split text on sep, ignoring separators inside parentheses."""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return parts
+
+def parse_for_header(header):
+    """
+    Split a for header 'init; cond; step' into its three parts.
+    init and step are returned as (target, expr) assignments or None:
+      'int i = 0' -> ('i', '0'), 'i++' -> ('i', 'i + 1'), 'i += 2' -> ('i', 'i + 2')
+    """
+    parts = split_top_level(header, ';')
+    if len(parts) != 3:
+        raise SyntaxError(f"Malformed for header: '{header}'")
+    init_s, cond, step_s = parts
+
+    init = None
+    m = re.match(r'^(?:(?:int|float|double)\s+)?([A-Za-z_]\w*)\s*=\s*(.+)$', init_s)
+    if m:
+        init = (m.group(1), m.group(2).strip())
+
+    step = None
+    m = re.match(r'^(?:([A-Za-z_]\w*)\s*(\+\+|--)|(\+\+|--)\s*([A-Za-z_]\w*))$', step_s)
+    if m:
+        var = m.group(1) or m.group(4)
+        op = m.group(2) or m.group(3)
+        step = (var, f"{var} {op[0]} 1")
+    else:
+        m = re.match(r'^([A-Za-z_]\w*)\s*([-+*/])=\s*(.+)$', step_s)
+        if m:
+            step = (m.group(1), f"{m.group(1)} {m.group(2)} {m.group(3).strip()}")
+        else:
+            m = re.match(r'^([A-Za-z_]\w*)\s*=\s*(.+)$', step_s)
+            if m:
+                step = (m.group(1), m.group(2).strip())
+    return init, cond, step
+
+def _const_value(text, consts):
+    text = text.strip()
+    if re.match(r'^[-+]?\d+$', text):
+        return int(text)
+    return consts.get(text)
 
-def create_block(block_id, block_type, params):
-    """Create a block dictionary with a unique ID, type, and parameters."""
-    return {"id": block_id, "type": block_type, "params": params}
+def assigned_vars(stmts):
+    """Variables written anywhere in stmts (assignments, increments, for headers), nested bodies included."""
+    assigned = set()
+    for s in stmts:
+        if s.get("type") in ("assign", "increment"):
+            assigned.add(s["target"])
+        elif s.get("type") == "for":
+            try:
+                init, _, step = parse_for_header(s.get("header", ""))
+            except SyntaxError:
+                init = step = None
+            assigned.update(a[0] for a in (init, step) if a)
+        assigned |= assigned_vars(s.get("body", []))
+    return assigned
 
-def translate_statement(stmt_obj, blocks, connections, prev_block_id=None):
+def for_trip_count(init, cond, step, consts=None, body=()):
     """
-    Recursively translate statements into block graph.
+    Number of iterations of 'for (var = a; var OP b; var = var +/- k)' when
+    a, b and k are integer constants (literals or names in consts) and the
+    loop body does not write var, else None.
+    """
+    consts = consts or {}
+    if init is None or step is None:
+        return None
+    if init[0] in assigned_vars(body):
+        return None
+    var, a = init[0], _const_value(init[1], consts)
+    m = re.match(r'^([A-Za-z_]\w*)\s*(<=|>=|!=|<|>)\s*(.+)$', cond)
+    s = re.match(r'^([A-Za-z_]\w*)\s*([-+])\s*(.+)$', step[1])
+    if a is None or not m or not s or m.group(1) != var or step[0] != var or s.group(1) != var:
+        return None
+    b = _const_value(m.group(3), consts)
+    k = _const_value(s.group(3), consts)
+    if b is None or not k:
+        return None
+    k = k if s.group(2) == '+' else -k
+    op = m.group(2)
+    if op == '<' and k > 0:
+        return max(0, math.ceil((b - a) / k))
+    if op == '<=' and k > 0:
+        return max(0, (b - a) // k + 1)
+    if op == '>' and k < 0:
+        return max(0, math.ceil((a - b) / -k))
+    if op == '>=' and k < 0:
+        return max(0, (a - b) // -k + 1)
+    if op == '!=' and (b - a) % k == 0 and (b - a) // k >= 0:
+        return (b - a) // k
+    return None
+
+def constant_vars(extracted):
+    """Variables with an integer literal init that are never assigned afterwards."""
+    assigned = assigned_vars(extracted.get("statements", []))
+    consts = {}
+    for var in extracted.get("variables", []):
+        init = str(var.get("init", "")).strip()
+        if var["name"] not in assigned and re.match(r'^[-+]?\d+$', init):
+            consts[var["name"]] = int(init)
+    return consts
+
+def translate_statement(stmt_obj, graph, prev_block_id=None, consts=None):
+    """
+    Recursively translate statements into the block graph (block_graph.BlockGraph).
     Returns the ID of the last block generated in this sequence.
+    consts: known constant variables, used for for-loop trip counts.
     """
     stmt_type = stmt_obj.get("type")
-    stmt_id = stmt_obj.get("id", f"auto_{len(blocks)}")
+    stmt_id = stmt_obj.get("id", f"auto_{len(graph)}")
     last_id = None
 
     # Assignment
     if stmt_type == "assign":
-        b = create_block(f"b_{stmt_id}", "assign", {
+        last_id = add_block(graph, f"b_{stmt_id}", "assign", {
             "target": stmt_obj["target"],
             "expr": stmt_obj["expr"]
-        })
-        blocks.append(b)
-        if prev_block_id:
-            connections.append({"from": prev_block_id, "to": b["id"]})
-        last_id = b["id"]
+        }, prev_block_id)
+
+    # Increment / decrement (x++ / x--) as an assignment
+    elif stmt_type == "increment":
+        target = stmt_obj["target"]
+        last_id = add_block(graph, f"b_{stmt_id}", "assign", {
+            "target": target,
+            "expr": f"{target} {stmt_obj['op'][0]} 1"
+        }, prev_block_id)
 
     # Print
     elif stmt_type == "print":
         args = stmt_obj.get("args", [])
         varname = args[-1] if len(args) > 0 else ""
-        b = create_block(f"b_{stmt_id}", "print", {"var": varname})
-        blocks.append(b)
-        if prev_block_id:
-            connections.append({"from": prev_block_id, "to": b["id"]})
-        last_id = b["id"]
+        last_id = add_block(graph, f"b_{stmt_id}", "print", {"var": varname}, prev_block_id)
 
     # While loop
     elif stmt_type == "while":
         cond = stmt_obj.get("cond", "")
-        loop_block = create_block(f"b_{stmt_id}", "while_loop", {"cond": cond})
-        blocks.append(loop_block)
-        if prev_block_id:
-            connections.append({"from": prev_block_id, "to": loop_block["id"]})
+        loop_id = add_block(graph, f"b_{stmt_id}", "while_loop", {"cond": cond}, prev_block_id)
 
         # Translate body recursively
-        body_stmts = stmt_obj.get("body", [])
-        prev = loop_block["id"]
-        last_body_id = loop_block["id"]
-        for s in body_stmts:
-            last_body_id = translate_statement(s, blocks, connections, prev)
-            prev = last_body_id
+        prev = loop_id
+        for s in stmt_obj.get("body", []):
+            prev = translate_statement(s, graph, prev, consts)
 
         # Connect body back to while loop for iteration
-        if last_body_id:
-            connections.append({"from": last_body_id, "to": loop_block["id"]})
+        if prev:
+            graph.connect(prev, loop_id)
+
+        last_id = loop_id
+
+    # For loop: lowered to init; while (cond) { body; step }
+    elif stmt_type == "for":
+        init, cond, step = parse_for_header(stmt_obj.get("header", ""))
+        prev = prev_block_id
+        if init:
+            prev = add_block(graph, f"b_{stmt_id}_init", "assign", {
+                "target": init[0],
+                "expr": init[1],
+                "role": "for_init"
+            }, prev)
 
-        last_id = loop_block["id"]
+        params = {"cond": cond}
+        if init:
+            params["loop_var"] = init[0]
+        trip_count = for_trip_count(init, cond, step, consts, stmt_obj.get("body", []))
+        if trip_count is not None:
+            params["trip_count"] = trip_count
+        loop_id = add_block(graph, f"b_{stmt_id}", "while_loop", params, prev)
+
+        prev = loop_id
+        for s in stmt_obj.get("body", []):
+            prev = translate_statement(s, graph, prev, consts)
+
+        if step:
+            prev = add_block(graph, f"b_{stmt_id}_step", "assign", {
+                "target": step[0],
+                "expr": step[1],
+                "role": "for_step"
+            }, prev)
+
+        # Connect body back to the loop block for iteration
+        if prev:
+            graph.connect(prev, loop_id)
+
+        last_id = loop_id
 
     # Raw (fallback)
     elif stmt_type == "raw":
-        b = create_block(f"b_{stmt_id}", "raw", {"stmt": stmt_obj.get("stmt", "")})
-        blocks.append(b)
-        if prev_block_id:
-            connections.append({"from": prev_block_id, "to": b["id"]})
-        last_id = b["id"]
+        last_id = add_block(graph, f"b_{stmt_id}", "raw", {"stmt": stmt_obj.get("stmt", "")}, prev_block_id)
 
     else:
         # Unknown statement type — ignore or warn
@@ -76,49 +220,110 @@ def translate_statement(stmt_obj, blocks, connections, prev_block_id=None):
 
     return last_id
 
-def translate_program(extracted):
-    """Main translation function: converts extracted structure into block graph."""
-    blocks = []
-    connections = []
+def _subtree_block_ids(stmt_obj, out):
+    """Block ids translate_statement may create for stmt_obj, in creation order."""
+    is_for = stmt_obj.get("type") == "for"
+    if is_for:
+        out.append(f"b_{stmt_obj['id']}_init")
+    out.append(f"b_{stmt_obj['id']}")
+    for s in stmt_obj.get("body", []):
+        _subtree_block_ids(s, out)
+    if is_for:
+        out.append(f"b_{stmt_obj['id']}_step")
+    return out
+
+def _trip_counts_current(stmt_obj, previous, consts):
+    """
+    True when every for-loop in stmt_obj has the trip count of its block in
+    the previous translation under the current consts (a changed constant
+    declaration is not a changed statement, but changes the count).
+    """
+    if stmt_obj.get("type") == "for":
+        init, cond, step = parse_for_header(stmt_obj.get("header", ""))
+        count = for_trip_count(init, cond, step, consts, stmt_obj.get("body", []))
+        blk = previous.get(f"b_{stmt_obj['id']}")
+        if blk is None or blk.params.get("trip_count") != count:
+            return False
+    return all(_trip_counts_current(s, previous, consts) for s in stmt_obj.get("body", []))
+
+def reuse_statement(stmt_obj, previous, graph, prev_block_id=None):
+    """
+    Copy the blocks and internal connections of an unchanged statement from a
+    previous translation (a BlockGraph) instead of translating it again.
+    Returns the ID of its last block.
+    """
+    ids = [bid for bid in _subtree_block_ids(stmt_obj, []) if bid in previous]
+    for bid in ids:
+        blk = previous.get(bid)
+        graph.add(bid, blk.type, blk.params)
+    inside = set(ids)
+    for bid in ids:
+        for dst in previous.successors(bid):
+            if dst in inside:
+                graph.connect(bid, dst)
+    if prev_block_id:
+        graph.connect(prev_block_id, ids[0])
+    return f"b_{stmt_obj['id']}"
+
+def translate_program(extracted, previous=None):
+    """
+    Main translation function: converts extracted structure into block graph.
+
+    With the previous translation of an incremental extraction (see
+    extractor.extract_incremental), top-level statements not listed in
+    extracted["changed"] reuse their previous blocks (unless a for-loop trip
+    count changed with a constant), and the result gets a
+    "changed_blocks" list of the blocks that were translated again.
+    """
+    graph = BlockGraph()
+
+    consts = constant_vars(extracted)
+
+    reuse = previous is not None and "changed" in extracted
+    if reuse:
+        changed = set(extracted["changed"])
+        prev_graph = BlockGraph.from_dict(previous)
 
     # Handle variables
+    prev_block_id = None
     for var in extracted.get("variables", []):
-        b = create_block(f"init_{var['name']}", "init_var", {
+        prev_block_id = graph.add(f"init_{var['name']}", "init_var", {
             "name": var["name"],
             "type": var["type"],
             "init": var["init"]
         })
-        blocks.append(b)
-
-    # Translate statements
-    prev_block_id = None
-    # If there are variables, start after the last init block
-    if blocks:
-        prev_block_id = blocks[-1]["id"]
 
+    # Translate statements, starting after the last init block
+    reused = set()
     for stmt in extracted.get("statements", []):
-        prev_block_id = translate_statement(stmt, blocks, connections, prev_block_id)
+        if (reuse and stmt["id"] not in changed and f"b_{stmt['id']}" in prev_graph
+                and _trip_counts_current(stmt, prev_graph, consts)):
+            n_before = len(graph)
+            prev_block_id = reuse_statement(stmt, prev_graph, graph, prev_block_id)
+            reused.update(b.id for b in graph.blocks[n_before:])
+        else:
+            prev_block_id = translate_statement(stmt, graph, prev_block_id, consts)
 
-    return {
-        "blocks": blocks,
-        "connections": connections
-    }
+    translated = graph.to_dict()
+    if reuse:
+        translated["changed_blocks"] = [b.id for b in graph if b.id not in reused]
+    return translated
 
 def save_translated_json(output_path, translated):
-    """Save the translated block graph to JSON file."""
-    with open(output_path, 'w') as f:
-        json.dump(translated, f, indent=2)
+    """Save the translated block graph (JSON, or binary IR for .vplb paths)."""
+    save_artifact(output_path, translated)
 
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python translator.py <input_extracted.json> <output_translated.json>")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python translator.py <input_extracted.json> <output_translated.json> [previous_translated.json]")
         sys.exit(1)
 
     input_path = sys.argv[1]
     output_path = sys.argv[2]
 
     extracted = load_extracted_json(input_path)
-    translated = translate_program(extracted)
+    previous = load_extracted_json(sys.argv[3]) if len(sys.argv) == 4 else None
+    translated = translate_program(extracted, previous)
     save_translated_json(output_path, translated)
     print(f"✅ Translation completed. Output saved to {output_path}")
 